@@ -0,0 +1,43 @@
+"""add analytics covering indexes
+
+Revision ID: 011_add_analytics_covering_indexes
+Revises: 010_add_notifications
+Create Date: 2024-01-29 10:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '011_add_analytics_covering_indexes'
+down_revision = '010_add_notifications'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Adiciona índices compostos de cobertura para as queries de analytics.
+
+    - receipts (user_id, emitted_at) INCLUDE (total_value, store_name):
+      filtros por usuário/período de get_monthly_summary e compare_store_prices
+    - receipt_items (receipt_id, product_id) INCLUDE (...):
+      joins e agregações sobre itens sem acessar o heap (index-only scan)
+    """
+    op.create_index(
+        'ix_receipts_user_id_emitted_at',
+        'receipts',
+        ['user_id', 'emitted_at'],
+        postgresql_include=['total_value', 'store_name'],
+    )
+    op.create_index(
+        'ix_receipt_items_receipt_id_product_id',
+        'receipt_items',
+        ['receipt_id', 'product_id'],
+        postgresql_include=['unit_price', 'quantity', 'total_price', 'description'],
+    )
+
+
+def downgrade():
+    """Remove índices de cobertura de analytics"""
+    op.drop_index('ix_receipt_items_receipt_id_product_id', table_name='receipt_items')
+    op.drop_index('ix_receipts_user_id_emitted_at', table_name='receipts')
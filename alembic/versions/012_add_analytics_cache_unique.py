@@ -0,0 +1,41 @@
+"""add unique constraint to analytics cache
+
+Revision ID: 012_add_analytics_cache_unique
+Revises: 011_add_analytics_covering_indexes
+Create Date: 2024-01-30 10:00:00.000000
+
+"""
+from alembic import op
+from sqlalchemy import text
+
+# revision identifiers, used by Alembic.
+revision = '012_add_analytics_cache_unique'
+down_revision = '011_add_analytics_covering_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Garante uma única entrada de cache por (user_id, month),
+    permitindo upsert (INSERT ... ON CONFLICT) em get_monthly_summary.
+    """
+    # Remover duplicatas antigas, mantendo a entrada mais recente
+    op.execute(text("""
+        DELETE FROM analytics_cache a
+        USING analytics_cache b
+        WHERE a.user_id = b.user_id
+          AND a.month = b.month
+          AND (a.created_at, a.id::text) < (b.created_at, b.id::text);
+    """))
+
+    op.create_unique_constraint(
+        'uq_analytics_cache_user_id_month',
+        'analytics_cache',
+        ['user_id', 'month']
+    )
+
+
+def downgrade():
+    """Remove unique constraint do cache de analytics"""
+    op.drop_constraint('uq_analytics_cache_user_id_month', 'analytics_cache', type_='unique')
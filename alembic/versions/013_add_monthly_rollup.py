@@ -0,0 +1,301 @@
+"""add monthly rollup tables maintained by triggers
+
+Revision ID: 013_add_monthly_rollup
+Revises: 012_add_analytics_cache_unique
+Create Date: 2024-01-31 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import UUID
+
+# revision identifiers, used by Alembic.
+revision = '013_add_monthly_rollup'
+down_revision = '012_add_analytics_cache_unique'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Adiciona agregados mensais mantidos incrementalmente por triggers:
+
+    - monthly_rollup: total gasto e número de notas por (usuário, mês)
+    - monthly_category_totals: total por categoria
+    - monthly_item_totals: totais por descrição de item (top itens via ORDER BY/LIMIT)
+
+    Triggers em receipts, receipt_items e products aplicam deltas (+/-) com
+    INSERT ... ON CONFLICT, e os dados existentes são carregados no upgrade.
+    """
+    op.create_table(
+        'monthly_rollup',
+        sa.Column('user_id', UUID(as_uuid=True), nullable=False),
+        sa.Column('month', sa.String(7), nullable=False),
+        sa.Column('total', sa.Numeric(14, 2), nullable=False, server_default='0'),
+        sa.Column('receipt_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('user_id', 'month'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    )
+
+    op.create_table(
+        'monthly_category_totals',
+        sa.Column('user_id', UUID(as_uuid=True), nullable=False),
+        sa.Column('month', sa.String(7), nullable=False),
+        sa.Column('category_id', UUID(as_uuid=True), nullable=False),
+        sa.Column('total', sa.Numeric(14, 2), nullable=False, server_default='0'),
+        sa.Column('item_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('user_id', 'month', 'category_id'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ondelete='CASCADE'),
+    )
+
+    op.create_table(
+        'monthly_item_totals',
+        sa.Column('user_id', UUID(as_uuid=True), nullable=False),
+        sa.Column('month', sa.String(7), nullable=False),
+        sa.Column('description', sa.String(255), nullable=False),
+        sa.Column('total_quantity', sa.Numeric(14, 3), nullable=False, server_default='0'),
+        sa.Column('total_spent', sa.Numeric(14, 2), nullable=False, server_default='0'),
+        sa.Column('purchase_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('user_id', 'month', 'description'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    )
+    op.create_index(
+        'ix_monthly_item_totals_user_id_month_total_spent',
+        'monthly_item_totals',
+        ['user_id', 'month', 'total_spent'],
+    )
+
+    # Funções de aplicação de deltas (sign = +1 ou -1)
+    op.execute(text("""
+        CREATE OR REPLACE FUNCTION rollup_apply_receipt(
+            p_user_id uuid, p_month varchar, p_total numeric, p_sign integer
+        ) RETURNS void AS $$
+        BEGIN
+            INSERT INTO monthly_rollup AS m (user_id, month, total, receipt_count)
+            VALUES (p_user_id, p_month, p_sign * p_total, p_sign)
+            ON CONFLICT (user_id, month) DO UPDATE SET
+                total = m.total + EXCLUDED.total,
+                receipt_count = m.receipt_count + EXCLUDED.receipt_count;
+        END;
+        $$ LANGUAGE plpgsql;
+    """))
+
+    op.execute(text("""
+        CREATE OR REPLACE FUNCTION rollup_apply_category(
+            p_user_id uuid, p_month varchar, p_category_id uuid, p_total numeric, p_count integer
+        ) RETURNS void AS $$
+        BEGIN
+            INSERT INTO monthly_category_totals AS c (user_id, month, category_id, total, item_count)
+            VALUES (p_user_id, p_month, p_category_id, p_total, p_count)
+            ON CONFLICT (user_id, month, category_id) DO UPDATE SET
+                total = c.total + EXCLUDED.total,
+                item_count = c.item_count + EXCLUDED.item_count;
+        END;
+        $$ LANGUAGE plpgsql;
+    """))
+
+    op.execute(text("""
+        CREATE OR REPLACE FUNCTION rollup_apply_item(
+            p_user_id uuid, p_month varchar, p_product_id uuid, p_description varchar,
+            p_quantity numeric, p_total numeric, p_sign integer
+        ) RETURNS void AS $$
+        DECLARE
+            v_category_id uuid;
+        BEGIN
+            INSERT INTO monthly_item_totals AS t
+                (user_id, month, description, total_quantity, total_spent, purchase_count)
+            VALUES (p_user_id, p_month, p_description, p_sign * p_quantity, p_sign * p_total, p_sign)
+            ON CONFLICT (user_id, month, description) DO UPDATE SET
+                total_quantity = t.total_quantity + EXCLUDED.total_quantity,
+                total_spent = t.total_spent + EXCLUDED.total_spent,
+                purchase_count = t.purchase_count + EXCLUDED.purchase_count;
+
+            IF p_product_id IS NOT NULL THEN
+                SELECT category_id INTO v_category_id FROM products WHERE id = p_product_id;
+                IF v_category_id IS NOT NULL THEN
+                    PERFORM rollup_apply_category(p_user_id, p_month, v_category_id, p_sign * p_total, p_sign);
+                END IF;
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql;
+    """))
+
+    # Trigger em receipt_items: usuário/mês vêm da nota
+    op.execute(text("""
+        CREATE OR REPLACE FUNCTION receipt_items_rollup() RETURNS trigger AS $$
+        DECLARE
+            v_user_id uuid;
+            v_month varchar(7);
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                SELECT user_id, to_char(emitted_at, 'YYYY-MM') INTO v_user_id, v_month
+                FROM receipts WHERE id = OLD.receipt_id;
+                -- Nota já removida: a trigger de receipts já descontou o item
+                IF FOUND THEN
+                    PERFORM rollup_apply_item(v_user_id, v_month, OLD.product_id, OLD.description,
+                                              OLD.quantity, OLD.total_price, -1);
+                END IF;
+            END IF;
+
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                SELECT user_id, to_char(emitted_at, 'YYYY-MM') INTO v_user_id, v_month
+                FROM receipts WHERE id = NEW.receipt_id;
+                IF FOUND THEN
+                    PERFORM rollup_apply_item(v_user_id, v_month, NEW.product_id, NEW.description,
+                                              NEW.quantity, NEW.total_price, 1);
+                END IF;
+            END IF;
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """))
+
+    # Trigger em receipts: total da nota e, ao mudar mês/usuário ou remover, seus itens
+    op.execute(text("""
+        CREATE OR REPLACE FUNCTION receipts_rollup() RETURNS trigger AS $$
+        DECLARE
+            item record;
+            v_old_month varchar(7);
+            v_new_month varchar(7);
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                v_old_month := to_char(OLD.emitted_at, 'YYYY-MM');
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                v_new_month := to_char(NEW.emitted_at, 'YYYY-MM');
+            END IF;
+
+            IF TG_OP = 'INSERT' THEN
+                PERFORM rollup_apply_receipt(NEW.user_id, v_new_month, NEW.total_value, 1);
+                RETURN NULL;
+            END IF;
+
+            IF TG_OP = 'DELETE' THEN
+                -- BEFORE DELETE: desconta a nota e os itens que ainda existirem
+                PERFORM rollup_apply_receipt(OLD.user_id, v_old_month, OLD.total_value, -1);
+                FOR item IN
+                    SELECT product_id, description, quantity, total_price
+                    FROM receipt_items WHERE receipt_id = OLD.id
+                LOOP
+                    PERFORM rollup_apply_item(OLD.user_id, v_old_month, item.product_id, item.description,
+                                              item.quantity, item.total_price, -1);
+                END LOOP;
+                RETURN OLD;
+            END IF;
+
+            PERFORM rollup_apply_receipt(OLD.user_id, v_old_month, OLD.total_value, -1);
+            PERFORM rollup_apply_receipt(NEW.user_id, v_new_month, NEW.total_value, 1);
+
+            IF OLD.user_id IS DISTINCT FROM NEW.user_id OR v_old_month IS DISTINCT FROM v_new_month THEN
+                FOR item IN
+                    SELECT product_id, description, quantity, total_price
+                    FROM receipt_items WHERE receipt_id = NEW.id
+                LOOP
+                    PERFORM rollup_apply_item(OLD.user_id, v_old_month, item.product_id, item.description,
+                                              item.quantity, item.total_price, -1);
+                    PERFORM rollup_apply_item(NEW.user_id, v_new_month, item.product_id, item.description,
+                                              item.quantity, item.total_price, 1);
+                END LOOP;
+            END IF;
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """))
+
+    # Trigger em products: mudança de categoria move os totais entre categorias
+    op.execute(text("""
+        CREATE OR REPLACE FUNCTION products_rollup() RETURNS trigger AS $$
+        DECLARE
+            agg record;
+        BEGIN
+            FOR agg IN
+                SELECT r.user_id, to_char(r.emitted_at, 'YYYY-MM') AS month,
+                       SUM(ri.total_price) AS total, COUNT(*)::integer AS item_count
+                FROM receipt_items ri
+                JOIN receipts r ON r.id = ri.receipt_id
+                WHERE ri.product_id = NEW.id
+                GROUP BY r.user_id, to_char(r.emitted_at, 'YYYY-MM')
+            LOOP
+                IF OLD.category_id IS NOT NULL THEN
+                    PERFORM rollup_apply_category(agg.user_id, agg.month, OLD.category_id, -agg.total, -agg.item_count);
+                END IF;
+                IF NEW.category_id IS NOT NULL THEN
+                    PERFORM rollup_apply_category(agg.user_id, agg.month, NEW.category_id, agg.total, agg.item_count);
+                END IF;
+            END LOOP;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """))
+
+    op.execute(text("""
+        CREATE TRIGGER trg_receipts_rollup
+        AFTER INSERT OR UPDATE OF user_id, emitted_at, total_value ON receipts
+        FOR EACH ROW EXECUTE FUNCTION receipts_rollup();
+
+        CREATE TRIGGER trg_receipts_rollup_delete
+        BEFORE DELETE ON receipts
+        FOR EACH ROW EXECUTE FUNCTION receipts_rollup();
+
+        CREATE TRIGGER trg_receipt_items_rollup
+        AFTER INSERT OR UPDATE OF receipt_id, product_id, description, quantity, total_price OR DELETE
+        ON receipt_items
+        FOR EACH ROW EXECUTE FUNCTION receipt_items_rollup();
+
+        CREATE TRIGGER trg_products_rollup
+        AFTER UPDATE OF category_id ON products
+        FOR EACH ROW
+        WHEN (OLD.category_id IS DISTINCT FROM NEW.category_id)
+        EXECUTE FUNCTION products_rollup();
+    """))
+
+    # Carga inicial a partir dos dados existentes
+    op.execute(text("""
+        INSERT INTO monthly_rollup (user_id, month, total, receipt_count)
+        SELECT user_id, to_char(emitted_at, 'YYYY-MM'), SUM(total_value), COUNT(*)
+        FROM receipts
+        GROUP BY user_id, to_char(emitted_at, 'YYYY-MM');
+    """))
+    op.execute(text("""
+        INSERT INTO monthly_category_totals (user_id, month, category_id, total, item_count)
+        SELECT r.user_id, to_char(r.emitted_at, 'YYYY-MM'), p.category_id,
+               SUM(ri.total_price), COUNT(*)
+        FROM receipt_items ri
+        JOIN receipts r ON r.id = ri.receipt_id
+        JOIN products p ON p.id = ri.product_id
+        WHERE p.category_id IS NOT NULL
+        GROUP BY r.user_id, to_char(r.emitted_at, 'YYYY-MM'), p.category_id;
+    """))
+    op.execute(text("""
+        INSERT INTO monthly_item_totals
+            (user_id, month, description, total_quantity, total_spent, purchase_count)
+        SELECT r.user_id, to_char(r.emitted_at, 'YYYY-MM'), ri.description,
+               SUM(ri.quantity), SUM(ri.total_price), COUNT(*)
+        FROM receipt_items ri
+        JOIN receipts r ON r.id = ri.receipt_id
+        GROUP BY r.user_id, to_char(r.emitted_at, 'YYYY-MM'), ri.description;
+    """))
+
+
+def downgrade():
+    """Remove agregados mensais, triggers e funções"""
+    op.execute(text("""
+        DROP TRIGGER IF EXISTS trg_products_rollup ON products;
+        DROP TRIGGER IF EXISTS trg_receipt_items_rollup ON receipt_items;
+        DROP TRIGGER IF EXISTS trg_receipts_rollup_delete ON receipts;
+        DROP TRIGGER IF EXISTS trg_receipts_rollup ON receipts;
+        DROP FUNCTION IF EXISTS products_rollup();
+        DROP FUNCTION IF EXISTS receipts_rollup();
+        DROP FUNCTION IF EXISTS receipt_items_rollup();
+        DROP FUNCTION IF EXISTS rollup_apply_item(uuid, varchar, uuid, varchar, numeric, numeric, integer);
+        DROP FUNCTION IF EXISTS rollup_apply_category(uuid, varchar, uuid, numeric, integer);
+        DROP FUNCTION IF EXISTS rollup_apply_receipt(uuid, varchar, numeric, integer);
+    """))
+    op.drop_index('ix_monthly_item_totals_user_id_month_total_spent', table_name='monthly_item_totals')
+    op.drop_table('monthly_item_totals')
+    op.drop_table('monthly_category_totals')
+    op.drop_table('monthly_rollup')
@@ -0,0 +1,206 @@
+"""add product store stats maintained by triggers
+
+Revision ID: 014_add_product_store_stats
+Revises: 013_add_monthly_rollup
+Create Date: 2024-02-01 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import UUID
+
+# revision identifiers, used by Alembic.
+revision = '014_add_product_store_stats'
+down_revision = '013_add_monthly_rollup'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Adiciona product_store_stats: preços por (usuário, produto, loja),
+    usada por compare_store_prices sem GROUP BY/ORDER BY sobre receipt_items.
+
+    Notas sem loja ficam em store_name = '' (entram no menor preço global,
+    mas não na lista por supermercado). Cada alteração em receipt_items ou
+    receipts recalcula apenas os grupos afetados, mantendo min/max exatos
+    mesmo após remoções.
+    """
+    op.create_table(
+        'product_store_stats',
+        sa.Column('user_id', UUID(as_uuid=True), nullable=False),
+        sa.Column('product_id', UUID(as_uuid=True), nullable=False),
+        sa.Column('store_name', sa.String(255), nullable=False),
+        sa.Column('avg_price', sa.Numeric(), nullable=False),
+        sa.Column('min_price', sa.Numeric(10, 2), nullable=False),
+        sa.Column('max_price', sa.Numeric(10, 2), nullable=False),
+        sa.Column('purchase_count', sa.Integer(), nullable=False),
+        sa.Column('min_price_emitted_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_emitted_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('user_id', 'product_id', 'store_name'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    )
+
+    # Recalcula um grupo (usuário, produto, loja) a partir das notas.
+    # O advisory lock serializa transações concorrentes no mesmo grupo: a que
+    # espera recalcula já vendo os itens commitados pela outra, e o upsert
+    # (ON CONFLICT, como na migration 013) não falha com unique violation.
+    op.execute(text("""
+        CREATE OR REPLACE FUNCTION refresh_product_store_stats(
+            p_user_id uuid, p_product_id uuid, p_store_name varchar
+        ) RETURNS void AS $$
+        DECLARE
+            v_avg_price numeric;
+            v_min_price numeric;
+            v_max_price numeric;
+            v_purchase_count integer;
+            v_last_emitted_at timestamptz;
+            v_min_price_emitted_at timestamptz;
+        BEGIN
+            IF p_user_id IS NULL OR p_product_id IS NULL THEN
+                RETURN;
+            END IF;
+
+            PERFORM pg_advisory_xact_lock(hashtextextended(
+                p_user_id::text || '|' || p_product_id::text || '|' || p_store_name, 0
+            ));
+
+            SELECT AVG(ri.unit_price), MIN(ri.unit_price), MAX(ri.unit_price),
+                   COUNT(*), MAX(r.emitted_at)
+            INTO v_avg_price, v_min_price, v_max_price, v_purchase_count, v_last_emitted_at
+            FROM receipt_items ri
+            JOIN receipts r ON r.id = ri.receipt_id
+            WHERE r.user_id = p_user_id
+              AND ri.product_id = p_product_id
+              AND COALESCE(r.store_name, '') = p_store_name;
+
+            IF v_purchase_count = 0 THEN
+                DELETE FROM product_store_stats
+                WHERE user_id = p_user_id AND product_id = p_product_id AND store_name = p_store_name;
+                RETURN;
+            END IF;
+
+            SELECT MAX(r.emitted_at) INTO v_min_price_emitted_at
+            FROM receipt_items ri
+            JOIN receipts r ON r.id = ri.receipt_id
+            WHERE r.user_id = p_user_id
+              AND ri.product_id = p_product_id
+              AND COALESCE(r.store_name, '') = p_store_name
+              AND ri.unit_price = v_min_price;
+
+            INSERT INTO product_store_stats (
+                user_id, product_id, store_name, avg_price, min_price, max_price,
+                purchase_count, min_price_emitted_at, last_emitted_at
+            )
+            VALUES (
+                p_user_id, p_product_id, p_store_name, v_avg_price, v_min_price, v_max_price,
+                v_purchase_count, v_min_price_emitted_at, v_last_emitted_at
+            )
+            ON CONFLICT (user_id, product_id, store_name) DO UPDATE SET
+                avg_price = EXCLUDED.avg_price,
+                min_price = EXCLUDED.min_price,
+                max_price = EXCLUDED.max_price,
+                purchase_count = EXCLUDED.purchase_count,
+                min_price_emitted_at = EXCLUDED.min_price_emitted_at,
+                last_emitted_at = EXCLUDED.last_emitted_at;
+        END;
+        $$ LANGUAGE plpgsql;
+    """))
+
+    op.execute(text("""
+        CREATE OR REPLACE FUNCTION receipt_items_store_stats() RETURNS trigger AS $$
+        DECLARE
+            v_user_id uuid;
+            v_store_name varchar;
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.product_id IS NOT NULL THEN
+                SELECT user_id, COALESCE(store_name, '') INTO v_user_id, v_store_name
+                FROM receipts WHERE id = OLD.receipt_id;
+                IF FOUND THEN
+                    PERFORM refresh_product_store_stats(v_user_id, OLD.product_id, v_store_name);
+                END IF;
+            END IF;
+
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.product_id IS NOT NULL THEN
+                SELECT user_id, COALESCE(store_name, '') INTO v_user_id, v_store_name
+                FROM receipts WHERE id = NEW.receipt_id;
+                IF FOUND THEN
+                    PERFORM refresh_product_store_stats(v_user_id, NEW.product_id, v_store_name);
+                END IF;
+            END IF;
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """))
+
+    op.execute(text("""
+        CREATE OR REPLACE FUNCTION receipts_store_stats() RETURNS trigger AS $$
+        DECLARE
+            v_product_id uuid;
+        BEGIN
+            FOR v_product_id IN
+                SELECT DISTINCT product_id FROM receipt_items
+                WHERE receipt_id = NEW.id AND product_id IS NOT NULL
+            LOOP
+                PERFORM refresh_product_store_stats(OLD.user_id, v_product_id, COALESCE(OLD.store_name, ''));
+                PERFORM refresh_product_store_stats(NEW.user_id, v_product_id, COALESCE(NEW.store_name, ''));
+            END LOOP;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """))
+
+    op.execute(text("""
+        CREATE TRIGGER trg_receipt_items_store_stats
+        AFTER INSERT OR UPDATE OF receipt_id, product_id, unit_price OR DELETE
+        ON receipt_items
+        FOR EACH ROW EXECUTE FUNCTION receipt_items_store_stats();
+
+        CREATE TRIGGER trg_receipts_store_stats
+        AFTER UPDATE OF user_id, store_name, emitted_at ON receipts
+        FOR EACH ROW EXECUTE FUNCTION receipts_store_stats();
+    """))
+
+    # Carga inicial a partir dos dados existentes
+    op.execute(text("""
+        INSERT INTO product_store_stats (
+            user_id, product_id, store_name, avg_price, min_price, max_price,
+            purchase_count, min_price_emitted_at, last_emitted_at
+        )
+        WITH items AS (
+            SELECT r.user_id, ri.product_id, COALESCE(r.store_name, '') AS store_name,
+                   ri.unit_price, r.emitted_at
+            FROM receipt_items ri
+            JOIN receipts r ON r.id = ri.receipt_id
+            WHERE ri.product_id IS NOT NULL
+        ), agg AS (
+            SELECT user_id, product_id, store_name,
+                   AVG(unit_price) AS avg_price, MIN(unit_price) AS min_price,
+                   MAX(unit_price) AS max_price, COUNT(*) AS purchase_count,
+                   MAX(emitted_at) AS last_emitted_at
+            FROM items
+            GROUP BY user_id, product_id, store_name
+        )
+        SELECT agg.user_id, agg.product_id, agg.store_name, agg.avg_price, agg.min_price,
+               agg.max_price, agg.purchase_count,
+               (SELECT MAX(i.emitted_at) FROM items i
+                WHERE i.user_id = agg.user_id AND i.product_id = agg.product_id
+                  AND i.store_name = agg.store_name AND i.unit_price = agg.min_price),
+               agg.last_emitted_at
+        FROM agg;
+    """))
+
+
+def downgrade():
+    """Remove product_store_stats, triggers e funções"""
+    op.execute(text("""
+        DROP TRIGGER IF EXISTS trg_receipts_store_stats ON receipts;
+        DROP TRIGGER IF EXISTS trg_receipt_items_store_stats ON receipt_items;
+        DROP FUNCTION IF EXISTS receipts_store_stats();
+        DROP FUNCTION IF EXISTS receipt_items_store_stats();
+        DROP FUNCTION IF EXISTS refresh_product_store_stats(uuid, uuid, varchar);
+    """))
+    op.drop_table('product_store_stats')
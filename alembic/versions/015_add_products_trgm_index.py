@@ -0,0 +1,36 @@
+"""add pg_trgm index on products.normalized_name
+
+Revision ID: 015_add_products_trgm_index
+Revises: 014_add_product_store_stats
+Create Date: 2024-02-02 10:00:00.000000
+
+"""
+from alembic import op
+from sqlalchemy import text
+
+# revision identifiers, used by Alembic.
+revision = '015_add_products_trgm_index'
+down_revision = '014_add_product_store_stats'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Habilita pg_trgm e cria índice GIN (gin_trgm_ops) em products.normalized_name,
+    usado por match_product para filtrar (operador %) e ordenar por similarity()
+    no banco em vez de pontuar todos os produtos do usuário em Python.
+    """
+    op.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    op.create_index(
+        'ix_products_normalized_name_trgm',
+        'products',
+        ['normalized_name'],
+        postgresql_using='gin',
+        postgresql_ops={'normalized_name': 'gin_trgm_ops'},
+    )
+
+
+def downgrade():
+    """Remove índice trigram de products (a extensão pg_trgm é mantida)"""
+    op.drop_index('ix_products_normalized_name_trgm', table_name='products')
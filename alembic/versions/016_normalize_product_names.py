@@ -0,0 +1,49 @@
+"""store products.normalized_name fully normalized
+
+Revision ID: 016_normalize_product_names
+Revises: 015_add_products_trgm_index
+Create Date: 2024-02-03 10:00:00.000000
+
+"""
+from alembic import op
+from sqlalchemy import text
+
+# revision identifiers, used by Alembic.
+revision = '016_normalize_product_names'
+down_revision = '015_add_products_trgm_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Normaliza products.normalized_name já gravados com a mesma função usada
+    nos eventos before_insert/before_update de Product (normalize_name), para
+    que linhas migradas e novas coincidam na busca exata, e adiciona CHECK
+    para manter o invariante (apenas [a-z0-9] separados por um espaço).
+    """
+    from app.services.product_matcher import normalize_name
+
+    conn = op.get_bind()
+    rows = conn.execute(text("SELECT id, normalized_name FROM products")).fetchall()
+    updates = [
+        {"id": product_id, "normalized_name": normalize_name(name or "")}
+        for product_id, name in rows
+        if normalize_name(name or "") != name
+    ]
+    if updates:
+        conn.execute(
+            text("UPDATE products SET normalized_name = :normalized_name WHERE id = :id"),
+            updates,
+        )
+
+    op.create_check_constraint(
+        'ck_products_normalized_name_normalized',
+        'products',
+        "normalized_name ~ '^([a-z0-9]+( [a-z0-9]+)*)?$'",
+    )
+
+
+def downgrade():
+    """Remove o CHECK de normalized_name (os valores normalizados são mantidos)"""
+    op.drop_constraint('ck_products_normalized_name_normalized', 'products', type_='check')
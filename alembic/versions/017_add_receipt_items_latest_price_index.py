@@ -0,0 +1,36 @@
+"""add receipt_items (product_id, created_at DESC) index for latest prices
+
+Revision ID: 017_add_receipt_items_latest_price_index
+Revises: 016_normalize_product_names
+Create Date: 2024-02-04 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '017_add_receipt_items_latest_price_index'
+down_revision = '016_normalize_product_names'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Adiciona índice composto receipt_items (product_id, created_at DESC)
+    INCLUDE (total_price, quantity, receipt_id), na mesma ordem do
+    DISTINCT ON de get_latest_prices: o item mais recente de cada produto é
+    o primeiro da faixa do índice, sem sort. O join com receipts usa o
+    índice já existente em receipt_items.receipt_id.
+    """
+    op.create_index(
+        'ix_receipt_items_product_id_created_at',
+        'receipt_items',
+        ['product_id', sa.text('created_at DESC')],
+        postgresql_include=['total_price', 'quantity', 'receipt_id'],
+    )
+
+
+def downgrade():
+    """Remove índice de último preço por produto"""
+    op.drop_index('ix_receipt_items_product_id_created_at', table_name='receipt_items')
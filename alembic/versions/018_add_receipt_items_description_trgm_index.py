@@ -0,0 +1,36 @@
+"""add pg_trgm index on receipt_items.description
+
+Revision ID: 018_add_receipt_items_description_trgm_index
+Revises: 017_add_receipt_items_latest_price_index
+Create Date: 2024-02-05 10:00:00.000000
+
+"""
+from alembic import op
+from sqlalchemy import text
+
+# revision identifiers, used by Alembic.
+revision = '018_add_receipt_items_description_trgm_index'
+down_revision = '017_add_receipt_items_latest_price_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Cria índice GIN (gin_trgm_ops) em receipt_items.description para os
+    ILIKE '%descrição%' de match_product/estimate_items_prices, que sem ele
+    fazem seq scan em todos os itens de nota.
+    """
+    op.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    op.create_index(
+        'ix_receipt_items_description_trgm',
+        'receipt_items',
+        ['description'],
+        postgresql_using='gin',
+        postgresql_ops={'description': 'gin_trgm_ops'},
+    )
+
+
+def downgrade():
+    """Remove índice trigram de receipt_items (a extensão pg_trgm é mantida)"""
+    op.drop_index('ix_receipt_items_description_trgm', table_name='receipt_items')
@@ -0,0 +1,53 @@
+"""add receipts.qr_hash for QR idempotency lookups
+
+Revision ID: 019_add_receipts_qr_hash
+Revises: 018_add_receipt_items_description_trgm_index
+Create Date: 2024-02-06 10:00:00.000000
+
+"""
+import hashlib
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+# revision identifiers, used by Alembic.
+revision = '019_add_receipts_qr_hash'
+down_revision = '018_add_receipt_items_description_trgm_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Adiciona receipts.qr_hash (sha256 do QR em claro) com índice, usado por
+    check_qr_text_exists no lugar de descriptografar todas as notas.
+
+    Notas existentes são preenchidas descriptografando raw_qr_text com a
+    ENCRYPTION_KEY atual; as que não puderem ser lidas ficam com qr_hash NULL.
+    """
+    from app.utils.encryption import decrypt_sensitive_data
+
+    op.add_column('receipts', sa.Column('qr_hash', sa.String(64), nullable=True))
+
+    conn = op.get_bind()
+    rows = conn.execute(text(
+        "SELECT id, raw_qr_text FROM receipts WHERE raw_qr_text IS NOT NULL"
+    )).fetchall()
+    updates = []
+    for receipt_id, raw_qr_text in rows:
+        qr_text = decrypt_sensitive_data(raw_qr_text)
+        if qr_text:
+            updates.append({
+                "id": receipt_id,
+                "qr_hash": hashlib.sha256(qr_text.encode()).hexdigest(),
+            })
+    if updates:
+        conn.execute(text("UPDATE receipts SET qr_hash = :qr_hash WHERE id = :id"), updates)
+
+    op.create_index('ix_receipts_qr_hash', 'receipts', ['qr_hash'])
+
+
+def downgrade():
+    """Remove receipts.qr_hash e seu índice"""
+    op.drop_index('ix_receipts_qr_hash', table_name='receipts')
+    op.drop_column('receipts', 'qr_hash')
@@ -0,0 +1,60 @@
+"""drop analytics_cache table
+
+Revision ID: 020_drop_analytics_cache
+Revises: 019_add_receipts_qr_hash
+Create Date: 2024-02-07 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '020_drop_analytics_cache'
+down_revision = '019_add_receipts_qr_hash'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Remove analytics_cache: os resumos mensais vêm de monthly_rollup
+    (migration 013) e ficam em cache no Redis; a tabela não é mais lida
+    nem escrita. Policies de RLS e índices caem junto com a tabela.
+    """
+    op.drop_table('analytics_cache')
+
+
+def downgrade():
+    """Recria analytics_cache (estrutura das migrations 001, 006 e 012), sem dados"""
+    op.create_table(
+        'analytics_cache',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('month', sa.String(7), nullable=False),
+        sa.Column('data', postgresql.JSON, nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.UniqueConstraint('user_id', 'month', name='uq_analytics_cache_user_id_month'),
+    )
+    op.create_index('ix_analytics_cache_id', 'analytics_cache', ['id'])
+    op.create_index('ix_analytics_cache_user_id', 'analytics_cache', ['user_id'])
+    op.create_index('ix_analytics_cache_month', 'analytics_cache', ['month'])
+
+    op.execute(text("""
+        ALTER TABLE analytics_cache ENABLE ROW LEVEL SECURITY;
+
+        CREATE POLICY "users_select_own_analytics_cache" ON analytics_cache
+        FOR SELECT
+        USING (user_id::text = auth.uid()::text);
+
+        CREATE POLICY "users_insert_own_analytics_cache" ON analytics_cache
+        FOR INSERT
+        WITH CHECK (user_id::text = auth.uid()::text);
+
+        CREATE POLICY "users_update_own_analytics_cache" ON analytics_cache
+        FOR UPDATE
+        USING (user_id::text = auth.uid()::text)
+        WITH CHECK (user_id::text = auth.uid()::text);
+    """))
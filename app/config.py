@@ -32,6 +32,10 @@ class Settings(BaseSettings):
     PROVIDER_APP_SECRET: Optional[str] = None
     PROVIDER_TIMEOUT: int = 10
     PROVIDER_MONTHLY_LIMIT: Optional[int] = None  # Limite mensal de requisições ao provider (None = sem limite)
+    PROVIDER_RATE_LIMIT_PER_MINUTE: Optional[int] = None  # Requisições/minuto ao provider por processo (None = sem limite)
+    PROVIDER_MAX_RESPONSE_BYTES: int = 10 * 1024 * 1024  # Respostas do provider acima disso são rejeitadas
+    PROVIDER_CACHE_TTL_SECONDS: int = 3600  # Notas já buscadas ficam em cache no Redis (0 = sem cache)
+    PROVIDER_NOT_FOUND_TTL_SECONDS: int = 300  # Chaves que o provider não encontrou (0 = sem cache negativo)
     WHITELIST_DOMAINS: str = ""  # Domínios permitidos separados por vírgula
     
     # Vector DB (Supabase) - Opcional
@@ -50,6 +54,10 @@ class Settings(BaseSettings):
     CELERY_BROKER_URL: str = "redis://localhost:6379/0"
     CELERY_RESULT_BACKEND: str = "redis://localhost:6379/0"
     
+    # PDF
+    PDF_WORKERS: Optional[int] = None  # Processos para gerar PDFs (None = número de CPUs)
+    PDF_CACHE_TTL_SECONDS: int = 7 * 24 * 3600  # PDFs renderizados ficam em cache no Redis
+    
     # Rate Limiting
     RATE_LIMIT_PER_IP: str = "30/minute"
     RATE_LIMIT_PER_USER: str = "30/minute"  # Limite para endpoint /scan
@@ -3,11 +3,13 @@ Conexão Redis para rate limiting e cache
 """
 import logging
 import redis.asyncio as redis
+from redis import Redis as SyncRedis
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
 redis_client = None
+sync_redis_clients = {}
 
 
 async def get_redis():
@@ -36,11 +38,40 @@ async def get_redis():
     return redis_client
 
 
+def get_sync_redis(decode_responses: bool = True):
+    """
+    Retorna cliente Redis síncrono singleton.
+    Usado por código síncrono (services e eventos do ORM).
+    Use decode_responses=False para valores binários (ex: PDFs).
+    Retorna None se o Redis estiver indisponível.
+    """
+    client = sync_redis_clients.get(decode_responses)
+
+    if client is None:
+        try:
+            client = SyncRedis.from_url(
+                settings.REDIS_URL,
+                encoding="utf-8",
+                decode_responses=decode_responses,
+                socket_connect_timeout=1,
+                socket_timeout=1
+            )
+        except Exception as e:
+            logger.error(f"Failed to create sync Redis client: {e}")
+            return None
+        sync_redis_clients[decode_responses] = client
+
+    return client
+
+
 async def close_redis():
-    """Fecha conexão Redis."""
+    """Fecha conexões Redis."""
     global redis_client
     if redis_client:
         await redis_client.close()
         redis_client = None
         logger.info("Redis connection closed")
+    for client in sync_redis_clients.values():
+        client.close()
+    sync_redis_clients.clear()
 
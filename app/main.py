@@ -45,6 +45,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.on_event("startup")
+async def on_startup():
+    """Inicializa o pool de processos de geração de PDF"""
+    from app.services.pdf_generator import start_pdf_pool
+    start_pdf_pool()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """Encerra o pool de processos de geração de PDF e o cliente HTTP do provider"""
+    from app.services.pdf_generator import shutdown_pdf_pool
+    from app.services.provider_client import close_async_client
+    shutdown_pdf_pool()
+    await close_async_client()
+
+
 # Incluir routers
 app.include_router(receipts.router, prefix=settings.API_V1_PREFIX, tags=["receipts"])
 app.include_router(user.router, prefix=settings.API_V1_PREFIX, tags=["user"])
@@ -4,7 +4,8 @@ from app.models.category import Category
 from app.models.product import Product
 from app.models.receipt import Receipt
 from app.models.receipt_item import ReceiptItem
-from app.models.analytics_cache import AnalyticsCache
+from app.models.monthly_rollup import MonthlyRollup, MonthlyCategoryTotal, MonthlyItemTotal
+from app.models.product_store_stats import ProductStoreStats
 from app.models.credit_usage import CreditUsage
 from app.models.unit import Unit
 from app.models.shopping_list import ShoppingList, ShoppingListItem
@@ -18,7 +19,10 @@ __all__ = [
     "Product",
     "Receipt",
     "ReceiptItem",
-    "AnalyticsCache",
+    "MonthlyRollup",
+    "MonthlyCategoryTotal",
+    "MonthlyItemTotal",
+    "ProductStoreStats",
     "CreditUsage",
     "Unit",
     "ShoppingList",
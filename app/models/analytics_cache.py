@@ -1,20 +0,0 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey
-from sqlalchemy.dialects.postgresql import UUID, JSON
-from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
-import uuid
-from app.database import Base
-
-
-class AnalyticsCache(Base):
-    __tablename__ = "analytics_cache"
-
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
-    month = Column(String(7), nullable=False, index=True)  # Formato: YYYY-MM
-    data = Column(JSON, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-
-    # Relationships
-    user = relationship("User", backref="analytics_cache")
-
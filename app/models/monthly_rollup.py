@@ -0,0 +1,41 @@
+from sqlalchemy import Column, String, Integer, Numeric, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import UUID
+from app.database import Base
+
+
+# Agregados mensais mantidos por triggers no banco (ver migration 013).
+# Somente leitura na aplicação.
+
+
+class MonthlyRollup(Base):
+    __tablename__ = "monthly_rollup"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(String(7), primary_key=True)  # Formato: YYYY-MM
+    total = Column(Numeric(14, 2), nullable=False, default=0)
+    receipt_count = Column(Integer, nullable=False, default=0)
+
+
+class MonthlyCategoryTotal(Base):
+    __tablename__ = "monthly_category_totals"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(String(7), primary_key=True)
+    category_id = Column(UUID(as_uuid=True), ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    total = Column(Numeric(14, 2), nullable=False, default=0)
+    item_count = Column(Integer, nullable=False, default=0)
+
+
+class MonthlyItemTotal(Base):
+    __tablename__ = "monthly_item_totals"
+    __table_args__ = (
+        # Top itens do mês: ORDER BY total_spent DESC LIMIT N
+        Index("ix_monthly_item_totals_user_id_month_total_spent", "user_id", "month", "total_spent"),
+    )
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(String(7), primary_key=True)
+    description = Column(String(255), primary_key=True)
+    total_quantity = Column(Numeric(14, 3), nullable=False, default=0)
+    total_spent = Column(Numeric(14, 2), nullable=False, default=0)
+    purchase_count = Column(Integer, nullable=False, default=0)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey
+from sqlalchemy import Column, String, DateTime, ForeignKey, Index, CheckConstraint, event, inspect
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -8,6 +8,20 @@ from app.database import Base
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        # Índice trigram (pg_trgm) para similarity() em match_product
+        Index(
+            "ix_products_normalized_name_trgm",
+            "normalized_name",
+            postgresql_using="gin",
+            postgresql_ops={"normalized_name": "gin_trgm_ops"},
+        ),
+        # normalized_name já normalizado: apenas [a-z0-9] separados por um espaço
+        CheckConstraint(
+            "normalized_name ~ '^([a-z0-9]+( [a-z0-9]+)*)?$'",
+            name="ck_products_normalized_name_normalized",
+        ),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     normalized_name = Column(String(255), nullable=False, index=True)
@@ -18,3 +32,19 @@ class Product(Base):
     # Relationships
     category = relationship("Category", backref="products")
 
+
+def _normalize_product_name(mapper, connection, target):
+    """
+    Garante que normalized_name seja gravado normalizado (normalize_name),
+    para que as leituras comparem o valor direto, sem renormalizar.
+    """
+    from app.services.product_matcher import normalize_name
+
+    if target.normalized_name is None:
+        return
+    if inspect(target).attrs.normalized_name.history.has_changes():
+        target.normalized_name = normalize_name(target.normalized_name)
+
+
+event.listen(Product, "before_insert", _normalize_product_name)
+event.listen(Product, "before_update", _normalize_product_name)
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, String, Integer, Numeric, DateTime, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+from app.database import Base
+
+
+class ProductStoreStats(Base):
+    """
+    Preços de um produto por (usuário, loja), mantidos por triggers no banco
+    (ver migration 014). Notas sem loja ficam em store_name = ''.
+    """
+    __tablename__ = "product_store_stats"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    store_name = Column(String(255), primary_key=True)
+    avg_price = Column(Numeric, nullable=False)
+    min_price = Column(Numeric(10, 2), nullable=False)
+    max_price = Column(Numeric(10, 2), nullable=False)
+    purchase_count = Column(Integer, nullable=False)
+    min_price_emitted_at = Column(DateTime(timezone=True), nullable=True)  # nota mais recente com min_price
+    last_emitted_at = Column(DateTime(timezone=True), nullable=True)
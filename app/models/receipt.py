@@ -1,6 +1,6 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Numeric
+from sqlalchemy import Column, String, DateTime, ForeignKey, Numeric, Index, event, inspect
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, Session, object_session
 from sqlalchemy.sql import func
 import uuid
 from app.database import Base
@@ -8,11 +8,22 @@ from app.database import Base
 
 class Receipt(Base):
     __tablename__ = "receipts"
+    __table_args__ = (
+        # Índice de cobertura para os filtros de analytics (usuário + período)
+        Index(
+            "ix_receipts_user_id_emitted_at",
+            "user_id",
+            "emitted_at",
+            postgresql_include=["total_value", "store_name"],
+        ),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
     access_key = Column(String(255), nullable=False, index=True)
     raw_qr_text = Column(String(500), nullable=True)
+    # sha256 do QR em claro: idempotência sem descriptografar raw_qr_text
+    qr_hash = Column(String(64), nullable=True, index=True)
     total_value = Column(Numeric(10, 2), nullable=False)
     subtotal = Column(Numeric(10, 2), nullable=False)
     total_tax = Column(Numeric(10, 2), nullable=False)
@@ -25,3 +36,70 @@ class Receipt(Base):
     user = relationship("User", backref="receipts")
     items = relationship("ReceiptItem", back_populates="receipt", cascade="all, delete-orphan")
 
+
+# ---------------------------------------------------------------------------
+# Invalidação do cache de analytics por (usuário, mês) e de sugestões por usuário
+# ---------------------------------------------------------------------------
+
+_PENDING_ANALYTICS_KEY = "pending_analytics_invalidation"
+
+
+def _affected_analytics_keys(target: Receipt) -> set:
+    """
+    Retorna os pares (user_id, YYYY-MM) afetados por uma alteração na nota.
+    Em updates que mudam emitted_at/user_id, inclui também o mês/usuário antigos.
+    """
+    from app.services.analytics_cache import affected_month_keys
+
+    state = inspect(target)
+    user_ids = {target.user_id}
+    emitted = {target.emitted_at}
+    user_ids.update(state.attrs.user_id.history.deleted or ())
+    emitted.update(state.attrs.emitted_at.history.deleted or ())
+
+    return {
+        (user_id, month_key)
+        for user_id in user_ids if user_id is not None
+        for emitted_at in emitted if emitted_at is not None
+        for month_key in affected_month_keys(emitted_at)
+    }
+
+
+def _invalidate_analytics_cache(mapper, connection, target):
+    """
+    Agenda a remoção no Redis dos resumos afetados para depois do commit
+    (evita repopular o cache com dados antigos). Os agregados mensais no
+    banco são mantidos por triggers (migration 013).
+    """
+    keys = _affected_analytics_keys(target)
+    if not keys:
+        return
+
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_ANALYTICS_KEY, set()).update(keys)
+
+
+event.listen(Receipt, "after_insert", _invalidate_analytics_cache)
+event.listen(Receipt, "after_update", _invalidate_analytics_cache)
+event.listen(Receipt, "after_delete", _invalidate_analytics_cache)
+
+
+@event.listens_for(Session, "after_commit")
+def _flush_analytics_invalidation(session):
+    """
+    Após o commit, remove do Redis os resumos afetados e as sugestões de
+    economia dos usuários envolvidos.
+    """
+    keys = session.info.pop(_PENDING_ANALYTICS_KEY, None)
+    if keys:
+        from app.services.analytics_cache import invalidate_summaries
+        from app.services.savings_cache import invalidate_suggestions
+        invalidate_summaries(keys)
+        invalidate_suggestions({user_id for user_id, _ in keys})
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_analytics_invalidation(session):
+    """Em rollback nada mudou: descarta invalidações pendentes."""
+    session.info.pop(_PENDING_ANALYTICS_KEY, None)
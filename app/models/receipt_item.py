@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Numeric
+from sqlalchemy import Column, String, DateTime, ForeignKey, Numeric, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -8,6 +8,29 @@ from app.database import Base
 
 class ReceiptItem(Base):
     __tablename__ = "receipt_items"
+    __table_args__ = (
+        # Índice de cobertura para joins/agregações de analytics
+        Index(
+            "ix_receipt_items_receipt_id_product_id",
+            "receipt_id",
+            "product_id",
+            postgresql_include=["unit_price", "quantity", "total_price", "description"],
+        ),
+        # Último preço por produto (DISTINCT ON de get_latest_prices)
+        Index(
+            "ix_receipt_items_product_id_created_at",
+            "product_id",
+            text("created_at DESC"),
+            postgresql_include=["total_price", "quantity", "receipt_id"],
+        ),
+        # Índice trigram (pg_trgm) para os ILIKE '%descrição%' do price engine
+        Index(
+            "ix_receipt_items_description_trgm",
+            "description",
+            postgresql_using="gin",
+            postgresql_ops={"description": "gin_trgm_ops"},
+        ),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     receipt_id = Column(UUID(as_uuid=True), ForeignKey("receipts.id"), nullable=False, index=True)
@@ -18,6 +18,7 @@ from app.models.receipt import Receipt
 from app.models.receipt_item import ReceiptItem
 from app.models.product import Product
 from app.services.product_matcher import normalize_name, get_or_create_product_from_item
+from app.services.receipt_service import qr_text_hash
 from app.utils.encryption import encrypt_sensitive_data
 
 logger = logging.getLogger(__name__)
@@ -154,6 +155,7 @@ async def force_create_receipt(
             user_id=user_id,
             access_key=access_key,
             raw_qr_text=encrypt_sensitive_data(fake_qr_text),
+            qr_hash=qr_text_hash(fake_qr_text),
             total_value=total_value,
             subtotal=subtotal,
             total_tax=total_tax,
@@ -176,7 +178,8 @@ async def force_create_receipt(
                     "description": item_data.name,
                     "barcode": None,
                     "category_id": None  # TODO: buscar categoria por nome se necessário
-                }
+                },
+                commit=False
             )
             
             # Calcular valores do item
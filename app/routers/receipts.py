@@ -12,7 +12,7 @@ from app.database import get_db
 from app.services.supabase_auth import get_current_user
 from app.dependencies.auth import get_or_create_user_from_supabase
 from app.utils.qr_extractor import extract_key_or_url
-from app.services.provider_client import fetch_by_url, fetch_by_key, ProviderError
+from app.services.provider_client import fetch_by_url_async, fetch_by_key_async, ProviderError
 from app.services.receipt_parser import parse_note
 from app.services.receipt_service import (
     check_receipt_exists,
@@ -170,9 +170,9 @@ async def scan_receipt(
         # 2. Consultar provider
         try:
             if url:
-                raw_note = fetch_by_url(url)
+                raw_note = await fetch_by_url_async(url)
             else:
-                raw_note = fetch_by_key(access_key)
+                raw_note = await fetch_by_key_async(access_key)
             logger.info("provider_fetch_ok")
         except ProviderError as e:
             logger.error(f"provider_fetch_fail: {str(e)}")
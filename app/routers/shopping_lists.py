@@ -22,17 +22,17 @@ from app.schemas.shopping_list import (
     ShoppingListSyncResponse,
     ItemComparisonResponse,
 )
-from app.services.price_engine import estimate_item_price
+from app.services.price_engine import estimate_items_prices
 from app.services.list_sync import (
-    find_best_match_for_list_item,
-    compare_quantities_and_price,
+    match_all,
+    bulk_compare,
     build_item_comparison,
     build_unplanned_item_comparison,
 )
 from app.models.shopping_list_execution import ShoppingListExecution
 from app.models.receipt import Receipt
 from app.models.notification import Notification
-from app.services.pdf_generator import generate_sync_pdf
+from app.services.pdf_generator import generate_sync_pdf_async
 from fastapi.responses import StreamingResponse
 
 logger = logging.getLogger(__name__)
@@ -291,12 +291,12 @@ async def estimate_shopping_list(
                 items=[]
             )
 
-        # Estimar preço para cada item
+        # Estimar preço de todos os itens de uma vez (queries em lote)
+        estimates = estimate_items_prices(items, db, user_id)
         estimated_items = []
         total_estimate = Decimal('0.0')
 
-        for item in items:
-            estimate = estimate_item_price(item, db, user_id)
+        for item, estimate in zip(items, estimates):
             
             estimated_items.append(ShoppingListItemEstimateResponse(
                 id=item.id,
@@ -389,36 +389,33 @@ async def sync_shopping_list_with_receipt(
 
         logger.info(f"Sincronizando lista {list_id} com nota {receipt_id}: {len(list_items)} itens planejados, {len(receipt_items)} itens na nota")
 
-        # Lista de itens da nota já mapeados (para evitar duplicação)
+        # Mapear todos os itens da lista de uma vez (scores calculados em lote)
+        matches = match_all(list_items, receipt_items)
+
+        # Comparar quantidades e preços de todos os pares mapeados em lote
+        matched_pairs = [
+            (list_item, matched_item)
+            for list_item, (matched_item, score) in zip(list_items, matches)
+            if matched_item and score > 0
+        ]
+        comparison_results = iter(bulk_compare(
+            [list_item for list_item, _ in matched_pairs],
+            [matched_item for _, matched_item in matched_pairs]
+        ))
+
+        # Itens da nota já mapeados (para listar os não planejados)
         matched_receipt_items = set()
         
         # Array de comparações
         comparisons = []
         
         # Processar cada item da lista
-        for list_item in list_items:
-            # Buscar melhor match entre receipt_items não mapeados
-            available_receipt_items = [
-                ri for idx, ri in enumerate(receipt_items)
-                if idx not in matched_receipt_items
-            ]
-            
-            matched_item, score = find_best_match_for_list_item(
-                list_item,
-                available_receipt_items,
-                db,
-                user_id
-            )
-            
+        for list_item, (matched_item, score) in zip(list_items, matches):
             if matched_item and score > 0:
-                # Encontrar índice do item mapeado
-                matched_idx = receipt_items.index(matched_item)
-                matched_receipt_items.add(matched_idx)
-                
-                # Comparar quantidades e preços
-                comparison_data = compare_quantities_and_price(list_item, matched_item)
+                matched_receipt_items.add(matched_item)
                 
                 # Construir comparação
+                comparison_data = next(comparison_results)
                 comparison = build_item_comparison(list_item, matched_item, comparison_data)
                 comparisons.append(comparison)
             else:
@@ -427,8 +424,8 @@ async def sync_shopping_list_with_receipt(
                 comparisons.append(comparison)
 
         # Processar itens da nota não mapeados (itens extras)
-        for idx, receipt_item in enumerate(receipt_items):
-            if idx not in matched_receipt_items:
+        for receipt_item in receipt_items:
+            if receipt_item not in matched_receipt_items:
                 comparison = build_unplanned_item_comparison(receipt_item)
                 comparisons.append(comparison)
 
@@ -646,8 +643,8 @@ async def get_execution_pdf(
                 detail="Execução não encontrada ou não pertence ao usuário"
             )
 
-        # Gerar PDF
-        pdf_bytes = generate_sync_pdf(execution)
+        # Gerar PDF no pool de processos (não bloqueia o event loop)
+        pdf_bytes = await generate_sync_pdf_async(execution)
 
         logger.info(f"PDF gerado para execução {execution_id}: {len(pdf_bytes)} bytes")
 
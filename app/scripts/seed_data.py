@@ -22,6 +22,7 @@ from app.models.receipt import Receipt
 from app.models.receipt_item import ReceiptItem
 from app.models.category import Category
 from app.services.product_matcher import get_or_create_product_from_item
+from app.services.receipt_service import qr_text_hash
 from app.utils.encryption import encrypt_sensitive_data
 
 # Configurações
@@ -157,6 +158,7 @@ def create_receipt(
         user_id=user.id,
         access_key=access_key,
         raw_qr_text=encrypt_sensitive_data(fake_qr_text),
+        qr_hash=qr_text_hash(fake_qr_text),
         total_value=total_value,
         subtotal=subtotal,
         total_tax=total_tax,
@@ -181,7 +183,8 @@ def create_receipt(
                 "description": item_data["name"],
                 "barcode": None,
                 "category_id": category_id
-            }
+            },
+            commit=False
         )
         
         # Criar receipt item
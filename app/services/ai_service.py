@@ -11,6 +11,7 @@ from app.models.receipt import Receipt
 from app.models.receipt_item import ReceiptItem
 from app.models.product import Product
 from app.services.product_matcher import normalize_name, fuzzy_match_name
+from app.services.savings_cache import get_cached_suggestions, set_cached_suggestions
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +19,8 @@ logger = logging.getLogger(__name__)
 def generate_savings_suggestions(
     db: Session,
     user_id: UUID,
-    limit: int = 5
+    limit: int = 5,
+    use_cache: bool = True
 ) -> List[Dict[str, Any]]:
     """
     Gera sugestões de economia para o usuário.
@@ -30,10 +32,17 @@ def generate_savings_suggestions(
         db: Sessão do banco de dados
         user_id: ID do usuário
         limit: Número máximo de sugestões (padrão: 5)
+        use_cache: Se deve usar cache (por usuário e dia, invalidado ao salvar notas)
         
     Returns:
         Lista de sugestões com produto atual, alternativa, economia estimada e rationale
     """
+    if use_cache:
+        cached = get_cached_suggestions(user_id, "ai", limit)
+        if cached is not None:
+            logger.info("Using cached savings suggestions for user %s", user_id)
+            return cached
+    
     suggestions = []
     
     # 1. Identificar top produtos mais caros comprados frequentemente
@@ -203,6 +212,9 @@ def generate_savings_suggestions(
     # Ordenar por economia mensal estimada (maior primeiro)
     suggestions.sort(key=lambda x: x["savings"]["monthly_estimated"], reverse=True)
     
+    if use_cache:
+        set_cached_suggestions(user_id, "ai", limit, suggestions)
+    
     return suggestions
 
 
@@ -0,0 +1,98 @@
+"""
+Cache de analytics em Redis com invalidação por (usuário, mês)
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Dict, Any, Optional, Iterable
+from uuid import UUID
+from app.database.redis import get_sync_redis
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = "analytics"
+# Rede de segurança: alterações que não passam pelos eventos de Receipt
+# (itens, categorias, leitura concorrente com um commit) expiram sozinhas
+CACHE_TTL_SECONDS = 3600
+
+
+def month_key_for(value: datetime) -> str:
+    """Retorna a chave de mês (YYYY-MM) para uma data."""
+    return value.strftime("%Y-%m")
+
+
+def affected_month_keys(value: datetime) -> tuple:
+    """
+    Meses cujo resumo muda quando uma nota de `value` muda: o próprio mês
+    e o seguinte (variacao_vs_mes_anterior usa o total do mês anterior).
+    """
+    if value.month == 12:
+        next_month = f"{value.year + 1}-01"
+    else:
+        next_month = f"{value.year}-{value.month + 1:02d}"
+    return month_key_for(value), next_month
+
+
+def analytics_cache_key(user_id: UUID, month_key: str) -> str:
+    """Monta a chave Redis do resumo mensal: analytics:{user_id}:{YYYY-MM}."""
+    return f"{CACHE_KEY_PREFIX}:{user_id}:{month_key}"
+
+
+def get_cached_summary(user_id: UUID, month_key: str) -> Optional[Dict[str, Any]]:
+    """
+    Busca resumo mensal no Redis.
+
+    Returns:
+        Dict com o resumo ou None se não houver cache (ou Redis indisponível)
+    """
+    client = get_sync_redis()
+    if client is None:
+        return None
+
+    try:
+        raw = client.get(analytics_cache_key(user_id, month_key))
+    except Exception as e:
+        logger.warning(f"Redis unavailable for analytics cache read: {e}")
+        return None
+
+    return json.loads(raw) if raw else None
+
+
+def set_cached_summary(user_id: UUID, month_key: str, data: Dict[str, Any]) -> bool:
+    """
+    Salva resumo mensal no Redis, invalidado por eventos de Receipt e com
+    TTL limitado (CACHE_TTL_SECONDS) para o que escapa da invalidação.
+
+    Returns:
+        True se salvou, False se o Redis estiver indisponível
+    """
+    client = get_sync_redis()
+    if client is None:
+        return False
+
+    try:
+        client.set(analytics_cache_key(user_id, month_key), json.dumps(data), ex=CACHE_TTL_SECONDS)
+        return True
+    except Exception as e:
+        logger.warning(f"Redis unavailable for analytics cache write: {e}")
+        return False
+
+
+def invalidate_summaries(keys: Iterable[tuple]) -> None:
+    """
+    Remove do Redis os resumos dos pares (user_id, month_key) informados.
+    Falhas são apenas logadas para não quebrar a transação do chamador.
+    """
+    redis_keys = [analytics_cache_key(user_id, month_key) for user_id, month_key in keys]
+    if not redis_keys:
+        return
+
+    client = get_sync_redis()
+    if client is None:
+        return
+
+    try:
+        client.delete(*redis_keys)
+        logger.debug(f"Invalidated analytics cache keys: {redis_keys}")
+    except Exception as e:
+        logger.warning(f"Failed to invalidate analytics cache {redis_keys}: {e}")
@@ -2,7 +2,6 @@
 Serviço de analytics com queries otimizadas e cache
 """
 import logging
-from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
 from uuid import UUID
 from decimal import Decimal
@@ -13,10 +12,15 @@ from app.models.receipt import Receipt
 from app.models.receipt_item import ReceiptItem
 from app.models.product import Product
 from app.models.category import Category
-from app.models.analytics_cache import AnalyticsCache
+from app.models.monthly_rollup import MonthlyRollup, MonthlyCategoryTotal, MonthlyItemTotal
+from app.models.product_store_stats import ProductStoreStats
+from app.services.analytics_cache import get_cached_summary, set_cached_summary
 
 logger = logging.getLogger(__name__)
 
+# Tamanho do lote ao consumir resultados agregados do cursor (yield_per)
+RESULT_BATCH_SIZE = 500
+
 
 def get_monthly_summary(
     db: Session,
@@ -27,7 +31,8 @@ def get_monthly_summary(
 ) -> Dict[str, Any]:
     """
     Retorna resumo mensal de gastos do usuário.
-    Usa cache se disponível.
+    Lê os agregados mensais mantidos por triggers (monthly_rollup e tabelas
+    auxiliares) e usa cache Redis se disponível.
     
     Args:
         db: Sessão do banco de dados
@@ -43,55 +48,45 @@ def get_monthly_summary(
     
     # Verificar cache
     if use_cache:
-        cache = db.query(AnalyticsCache).filter(
-            and_(
-                AnalyticsCache.user_id == user_id,
-                AnalyticsCache.month == month_key
-            )
-        ).first()
-        
-        if cache:
+        cached = get_cached_summary(user_id, month_key)
+        if cached is not None:
             logger.info(f"Using cached analytics for {month_key}")
-            return cache.data
+            return cached
     
-    # Calcular dados
-    start_date = datetime(year, month, 1)
-    if month == 12:
-        end_date = datetime(year + 1, 1, 1)
-    else:
-        end_date = datetime(year, month + 1, 1)
+    # Mês anterior
+    prev_month = month - 1
+    prev_year = year
+    if prev_month == 0:
+        prev_month = 12
+        prev_year = year - 1
+    prev_month_key = f"{prev_year}-{prev_month:02d}"
     
-    # Total do mês
-    total_mes_result = db.query(
-        func.sum(Receipt.total_value).label('total')
+    # Total do mês e do mês anterior (mesma consulta)
+    totals = dict(db.query(
+        MonthlyRollup.month,
+        MonthlyRollup.total
     ).filter(
         and_(
-            Receipt.user_id == user_id,
-            Receipt.emitted_at >= start_date,
-            Receipt.emitted_at < end_date
+            MonthlyRollup.user_id == user_id,
+            MonthlyRollup.month.in_([month_key, prev_month_key])
         )
-    ).scalar()
+    ).all())
     
-    total_mes = float(total_mes_result) if total_mes_result else 0.0
+    total_mes = float(totals.get(month_key) or 0)
+    prev_total = float(totals.get(prev_month_key) or 0)
     
     # Total por categoria
     total_por_categoria = db.query(
         Category.name,
-        func.sum(ReceiptItem.total_price).label('total')
+        MonthlyCategoryTotal.total
     ).join(
-        Product, ReceiptItem.product_id == Product.id
-    ).join(
-        Category, Product.category_id == Category.id
-    ).join(
-        Receipt, ReceiptItem.receipt_id == Receipt.id
+        Category, MonthlyCategoryTotal.category_id == Category.id
     ).filter(
         and_(
-            Receipt.user_id == user_id,
-            Receipt.emitted_at >= start_date,
-            Receipt.emitted_at < end_date
+            MonthlyCategoryTotal.user_id == user_id,
+            MonthlyCategoryTotal.month == month_key,
+            MonthlyCategoryTotal.item_count > 0
         )
-    ).group_by(
-        Category.name
     ).all()
     
     total_por_categoria_dict = {
@@ -101,22 +96,18 @@ def get_monthly_summary(
     
     # Top 10 itens
     top_items = db.query(
-        ReceiptItem.description,
-        func.sum(ReceiptItem.quantity).label('total_quantity'),
-        func.sum(ReceiptItem.total_price).label('total_spent'),
-        func.count(ReceiptItem.id).label('purchase_count')
-    ).join(
-        Receipt, ReceiptItem.receipt_id == Receipt.id
+        MonthlyItemTotal.description,
+        MonthlyItemTotal.total_quantity,
+        MonthlyItemTotal.total_spent,
+        MonthlyItemTotal.purchase_count
     ).filter(
         and_(
-            Receipt.user_id == user_id,
-            Receipt.emitted_at >= start_date,
-            Receipt.emitted_at < end_date
+            MonthlyItemTotal.user_id == user_id,
+            MonthlyItemTotal.month == month_key,
+            MonthlyItemTotal.purchase_count > 0
         )
-    ).group_by(
-        ReceiptItem.description
     ).order_by(
-        func.sum(ReceiptItem.total_price).desc()
+        MonthlyItemTotal.total_spent.desc()
     ).limit(10).all()
     
     top_10_itens = [
@@ -130,30 +121,6 @@ def get_monthly_summary(
     ]
     
     # Variação vs mês anterior
-    prev_month = month - 1
-    prev_year = year
-    if prev_month == 0:
-        prev_month = 12
-        prev_year = year - 1
-    
-    prev_start = datetime(prev_year, prev_month, 1)
-    if prev_month == 12:
-        prev_end = datetime(prev_year + 1, 1, 1)
-    else:
-        prev_end = datetime(prev_year, prev_month + 1, 1)
-    
-    prev_total_result = db.query(
-        func.sum(Receipt.total_value).label('total')
-    ).filter(
-        and_(
-            Receipt.user_id == user_id,
-            Receipt.emitted_at >= prev_start,
-            Receipt.emitted_at < prev_end
-        )
-    ).scalar()
-    
-    prev_total = float(prev_total_result) if prev_total_result else 0.0
-    
     variacao_vs_mes_anterior = 0.0
     if prev_total > 0:
         variacao_vs_mes_anterior = ((total_mes - prev_total) / prev_total) * 100
@@ -166,27 +133,8 @@ def get_monthly_summary(
         "month": month_key
     }
     
-    # Salvar no cache (atualizar se já existir)
     if use_cache:
-        existing_cache = db.query(AnalyticsCache).filter(
-            and_(
-                AnalyticsCache.user_id == user_id,
-                AnalyticsCache.month == month_key
-            )
-        ).first()
-        
-        if existing_cache:
-            existing_cache.data = result
-        else:
-            cache = AnalyticsCache(
-                user_id=user_id,
-                month=month_key,
-                data=result
-            )
-            db.add(cache)
-        
-        db.commit()
-        logger.info(f"Cached analytics for {month_key}")
+        set_cached_summary(user_id, month_key, result)
     
     return result
 
@@ -207,6 +155,7 @@ def get_top_items(
     Returns:
         Lista de itens ordenados por total gasto
     """
+    # yield_per: linhas consumidas em lotes direto do cursor, sem buffer .all()
     top_items = db.query(
         ReceiptItem.description,
         func.sum(ReceiptItem.quantity).label('total_quantity'),
@@ -221,7 +170,7 @@ def get_top_items(
         ReceiptItem.description
     ).order_by(
         func.sum(ReceiptItem.total_price).desc()
-    ).limit(limit).all()
+    ).limit(limit).yield_per(RESULT_BATCH_SIZE)
     
     return [
         {
@@ -251,87 +200,65 @@ def compare_store_prices(
     Returns:
         Dict com preço médio por supermercado e menor preço encontrado
     """
-    # Buscar produto
-    product = db.query(Product).filter(Product.id == product_id).first()
-    
-    if not product:
-        raise ValueError(f"Product not found: {product_id}")
-    
-    # Preço médio por supermercado
-    store_prices = db.query(
-        Receipt.store_name,
-        func.avg(ReceiptItem.unit_price).label('avg_price'),
-        func.min(ReceiptItem.unit_price).label('min_price'),
-        func.max(ReceiptItem.unit_price).label('max_price'),
-        func.count(ReceiptItem.id).label('purchase_count')
-    ).join(
-        Receipt, ReceiptItem.receipt_id == Receipt.id
-    ).filter(
+    # Estatísticas por loja mantidas por triggers (product_store_stats),
+    # unidas ao produto (LEFT JOIN) para trazer o nome na mesma consulta
+    rows = db.query(
+        Product.normalized_name,
+        ProductStoreStats.store_name,
+        ProductStoreStats.avg_price,
+        ProductStoreStats.min_price,
+        ProductStoreStats.max_price,
+        ProductStoreStats.purchase_count,
+        ProductStoreStats.min_price_emitted_at
+    ).outerjoin(
+        ProductStoreStats,
         and_(
-            Receipt.user_id == user_id,
-            ReceiptItem.product_id == product_id,
-            Receipt.store_name.isnot(None),
-            Receipt.store_name != ''
+            ProductStoreStats.product_id == Product.id,
+            ProductStoreStats.user_id == user_id
         )
-    ).group_by(
-        Receipt.store_name
+    ).filter(
+        Product.id == product_id
     ).order_by(
-        func.avg(ReceiptItem.unit_price).asc()
+        ProductStoreStats.avg_price.asc()
     ).all()
     
+    if not rows:
+        raise ValueError(f"Product not found: {product_id}")
+    
+    stats = [row for row in rows if row.min_price is not None]
+    
+    # Preço médio por supermercado (apenas lojas identificadas)
     preco_medio_por_supermercado = [
         {
-            "store_name": store.store_name,
-            "avg_price": float(store.avg_price),
-            "min_price": float(store.min_price),
-            "max_price": float(store.max_price),
-            "purchase_count": store.purchase_count
+            "store_name": row.store_name,
+            "avg_price": float(row.avg_price),
+            "min_price": float(row.min_price),
+            "max_price": float(row.max_price),
+            "purchase_count": row.purchase_count
         }
-        for store in store_prices
+        for row in stats
+        if row.store_name
     ]
     
-    # Menor preço encontrado
-    menor_preco_result = db.query(
-        func.min(ReceiptItem.unit_price).label('min_price')
-    ).join(
-        Receipt, ReceiptItem.receipt_id == Receipt.id
-    ).filter(
-        and_(
-            Receipt.user_id == user_id,
-            ReceiptItem.product_id == product_id
-        )
-    ).scalar()
+    # Menor preço (considera todas as notas, mesmo sem loja);
+    # em empate, vale a loja da nota mais recente
+    menor_preco_row = min(
+        stats,
+        key=lambda row: (
+            row.min_price,
+            -row.min_price_emitted_at.timestamp() if row.min_price_emitted_at else float('inf')
+        ),
+        default=None
+    )
     
-    menor_preco = float(menor_preco_result) if menor_preco_result else None
-    
-    # Buscar loja com menor preço
-    menor_preco_store = None
-    if menor_preco:
-        menor_preco_item = db.query(
-            Receipt.store_name,
-            ReceiptItem.unit_price,
-            Receipt.emitted_at
-        ).join(
-            Receipt, ReceiptItem.receipt_id == Receipt.id
-        ).filter(
-            and_(
-                Receipt.user_id == user_id,
-                ReceiptItem.product_id == product_id,
-                ReceiptItem.unit_price == menor_preco_result
-            )
-        ).order_by(
-            Receipt.emitted_at.desc()
-        ).first()
-        
-        if menor_preco_item:
-            menor_preco_store = menor_preco_item.store_name
+    menor_preco = float(menor_preco_row.min_price) if menor_preco_row and menor_preco_row.min_price else None
+    menor_preco_store = (menor_preco_row.store_name or None) if menor_preco else None
     
     return {
         "product_id": str(product_id),
-        "product_name": product.normalized_name,
+        "product_name": rows[0].normalized_name,
         "preco_medio_por_supermercado": preco_medio_por_supermercado,
         "menor_preco_encontrado": menor_preco,
         "loja_menor_preco": menor_preco_store,
         "total_comparacoes": len(preco_medio_por_supermercado)
     }
-
@@ -3,22 +3,37 @@ List Sync Service - Serviço para sincronizar listas de compras com notas fiscai
 """
 import logging
 from decimal import Decimal
+from functools import lru_cache
 from typing import Optional, Tuple, Dict, List
 from sqlalchemy.orm import Session
 from uuid import UUID
 from app.models.shopping_list import ShoppingListItem
 from app.models.receipt_item import ReceiptItem
 from app.models.product import Product
-import unicodedata
+from app.utils.text import fold_accents
+from rapidfuzz import process, fuzz
+import numpy as np
 import re
 
 logger = logging.getLogger(__name__)
 
 # Tolerance values
-PRICE_TOLERANCE_PERCENT = Decimal('2.0')
-QUANTITY_TOLERANCE_PERCENT = Decimal('5.0')
+PRICE_TOLERANCE_PERCENT = 2.0
+QUANTITY_TOLERANCE_PERCENT = 5.0
 
+# Casas decimais para eliminar ruído de float: quantidade (3) x preço (2)
+# tem no máximo 5 casas, então o arredondamento reproduz o valor exato
+TOTAL_DECIMALS = 5
+PERCENT_DECIMALS = 6
 
+# Score mínimo do token_set_ratio (0-100) para considerar match fuzzy
+FUZZY_SCORE_CUTOFF = 60
+
+# Regex pré-compilada para normalização
+_STRIP_PUNCT = re.compile(r'[^a-z0-9\s]+')
+
+
+@lru_cache(maxsize=4096)
 def normalize_text(s: str) -> str:
     """
     Normaliza texto removendo acentos, convertendo para minúsculas
@@ -28,20 +43,104 @@ def normalize_text(s: str) -> str:
     if not s:
         return ""
     
-    # Remover acentos
-    nfd = unicodedata.normalize('NFD', s)
-    text = ''.join(char for char in nfd if unicodedata.category(char) != 'Mn')
-    
-    # Converter para minúsculas
-    text = text.lower()
+    # Remover acentos e converter para minúsculas (tabela pré-calculada)
+    text = fold_accents(s)
     
-    # Remover caracteres especiais, manter apenas letras, números e espaços
-    text = re.sub(r'[^a-z0-9\s]', '', text)
+    # Remover caracteres especiais e espaços múltiplos em uma passada de regex
+    return ' '.join(_STRIP_PUNCT.sub('', text).split())
+
+
+def _score_matrix(
+    list_items: List[ShoppingListItem],
+    receipt_items: List[ReceiptItem]
+) -> List[List[float]]:
+    """
+    Calcula a matriz de scores (lista x nota) com os mesmos níveis de
+    find_best_match_for_list_item. O nível fuzzy é calculado em lote com
+    rapidfuzz.process.cdist (token_set_ratio), fora do interpretador.
+    """
+    list_descs = [normalize_text(li.description) for li in list_items]
+    receipt_descs = [normalize_text(ri.description) for ri in receipt_items]
+
+    fuzzy = process.cdist(
+        list_descs,
+        receipt_descs,
+        scorer=fuzz.token_set_ratio,
+        processor=None,
+        score_cutoff=FUZZY_SCORE_CUTOFF
+    )
+
+    matrix = []
+    for i, list_item in enumerate(list_items):
+        list_desc = list_descs[i]
+        row = []
+        for j, receipt_item in enumerate(receipt_items):
+            receipt_desc = receipt_descs[j]
+            if list_item.product_id and receipt_item.product_id == list_item.product_id:
+                score = 1.0
+            elif not list_desc or not receipt_desc:
+                score = 0.0
+            elif list_desc == receipt_desc:
+                score = 0.95
+            elif list_desc in receipt_desc or receipt_desc in list_desc:
+                score = 0.85
+            else:
+                score = float(fuzzy[i][j]) / 100.0 * 0.8
+            row.append(score)
+        matrix.append(row)
+
+    return matrix
+
+
+def match_all(
+    list_items: List[ShoppingListItem],
+    receipt_items: List[ReceiptItem]
+) -> List[Tuple[Optional[ReceiptItem], float]]:
+    """
+    Mapeia todos os itens da lista para itens da nota de uma vez.
     
-    # Remover espaços múltiplos
-    text = re.sub(r'\s+', ' ', text).strip()
+    Cada item da lista (na ordem recebida) fica com o receipt_item de maior
+    score ainda não mapeado, evitando que um item da nota seja usado duas vezes.
     
-    return text
+    Args:
+        list_items: Itens da lista de compras
+        receipt_items: Itens da nota fiscal
+        
+    Returns:
+        Lista paralela a list_items com (matched_receipt_item, score);
+        (None, 0.0) quando não há match
+    """
+    if not list_items:
+        return []
+    if not receipt_items:
+        return [(None, 0.0) for _ in list_items]
+
+    matrix = _score_matrix(list_items, receipt_items)
+
+    matched = set()
+    results = []
+    for list_item, row in zip(list_items, matrix):
+        # Maior score possível para o item: ao atingi-lo, nenhum outro
+        # receipt_item pode superá-lo e a varredura da linha termina
+        ceiling = 1.0 if list_item.product_id else 0.95
+        best_index = -1
+        best_score = 0.0
+        for j, score in enumerate(row):
+            if score > best_score and j not in matched:
+                best_score = score
+                best_index = j
+                if score >= ceiling:
+                    break
+
+        if best_index >= 0:
+            matched.add(best_index)
+            best_match = receipt_items[best_index]
+            logger.debug(f"Match: {list_item.description} -> {best_match.description} (score: {best_score})")
+            results.append((best_match, best_score))
+        else:
+            results.append((None, 0.0))
+
+    return results
 
 
 def find_best_match_for_list_item(
@@ -57,9 +156,11 @@ def find_best_match_for_list_item(
     1. Se list_item.product_id existe: buscar receipt_item com mesmo product_id (score=1.0)
     2. Match exato de descrição (normalizada): score 0.95
     3. Match por substring: score 0.85
-    4. Match por overlap de palavras: score = overlap_ratio (0..0.8)
+    4. Match fuzzy (token_set_ratio do rapidfuzz): score proporcional (0..0.8)
     5. Caso contrário, sem match (None, score 0)
     
+    Para vários itens, prefira match_all, que calcula todos os scores em lote.
+    
     Args:
         list_item: Item da lista de compras
         receipt_items: Lista de receipt_items disponíveis (não marcados como matched)
@@ -69,54 +170,7 @@ def find_best_match_for_list_item(
     Returns:
         Tuple (matched_receipt_item, score)
     """
-    if not receipt_items:
-        return None, 0.0
-    
-    best_match = None
-    best_score = 0.0
-    best_index = -1
-    
-    normalized_list_desc = normalize_text(list_item.description)
-    list_words = set(normalized_list_desc.split())
-    
-    # Estratégia 1: Match por product_id
-    if list_item.product_id:
-        for idx, receipt_item in enumerate(receipt_items):
-            if receipt_item.product_id == list_item.product_id:
-                logger.debug(f"Match por product_id: {list_item.description} -> {receipt_item.description}")
-                return receipt_item, 1.0
-    
-    # Estratégia 2-4: Match textual
-    for idx, receipt_item in enumerate(receipt_items):
-        normalized_receipt_desc = normalize_text(receipt_item.description)
-        receipt_words = set(normalized_receipt_desc.split())
-        
-        score = 0.0
-        
-        # Match exato
-        if normalized_list_desc == normalized_receipt_desc:
-            score = 0.95
-        # Match por substring
-        elif normalized_list_desc in normalized_receipt_desc or normalized_receipt_desc in normalized_list_desc:
-            score = 0.85
-        # Match por overlap de palavras
-        elif list_words and receipt_words:
-            intersection = list_words.intersection(receipt_words)
-            union = list_words.union(receipt_words)
-            if union:
-                overlap_ratio = len(intersection) / len(union)
-                score = min(0.8, overlap_ratio * 0.8)
-        
-        if score > best_score:
-            best_score = score
-            best_match = receipt_item
-            best_index = idx
-    
-    if best_match and best_score > 0:
-        logger.debug(f"Match textual: {list_item.description} -> {best_match.description} (score: {best_score})")
-        return best_match, best_score
-    
-    return None, 0.0
+    return match_all([list_item], receipt_items)[0]
 
 
 def normalize_quantity_to_base(quantity: Decimal, unit_code: str, unit_multiplier: int) -> Decimal:
@@ -155,37 +209,38 @@ def compare_quantities_and_price(
         Dict com planned_quantity, real_quantity, planned_unit_price, real_unit_price,
         planned_total, real_total, difference, difference_percent, flags
     """
+    # Aritmética em float: a resposta já é float e Decimal é muito mais lento
     # Normalizar quantidades para mesma base
     # list_item.quantity já está na menor unidade (base)
-    planned_quantity_base = Decimal(str(list_item.quantity))
+    planned_quantity_base = float(list_item.quantity)
     
     # receipt_item.quantity está na unidade do item (precisamos assumir que é a mesma base)
     # Por enquanto, assumimos que receipt_item.quantity já está normalizada
-    real_quantity_base = Decimal(str(receipt_item.quantity))
+    real_quantity_base = float(receipt_item.quantity)
     
     # Calcular preços unitários
     # list_item pode ter price_estimate, senão usar None
-    planned_unit_price = Decimal(str(list_item.price_estimate)) if list_item.price_estimate else None
+    planned_unit_price = float(list_item.price_estimate) if list_item.price_estimate else None
     
     # receipt_item: unit_price já está disponível
-    real_unit_price = Decimal(str(receipt_item.unit_price))
+    real_unit_price = float(receipt_item.unit_price)
     
     # Calcular totais
     if planned_unit_price:
-        planned_total = planned_unit_price * planned_quantity_base
+        planned_total = round(planned_unit_price * planned_quantity_base, TOTAL_DECIMALS)
     else:
         planned_total = None
     
-    real_total = Decimal(str(receipt_item.total_price))
+    real_total = float(receipt_item.total_price)
     
     # Calcular diferença
     difference = None
     difference_percent = None
     
     if planned_total is not None:
-        difference = real_total - planned_total
+        difference = round(real_total - planned_total, TOTAL_DECIMALS)
         if planned_total > 0:
-            difference_percent = (difference / planned_total) * Decimal('100')
+            difference_percent = (difference / planned_total) * 100.0
     
     # Flags
     price_higher = False
@@ -193,31 +248,105 @@ def compare_quantities_and_price(
     quantity_different = False
     
     if planned_unit_price and real_unit_price:
-        price_diff_percent = abs((real_unit_price - planned_unit_price) / planned_unit_price * Decimal('100'))
+        price_diff_percent = round(
+            abs((real_unit_price - planned_unit_price) / planned_unit_price) * 100.0,
+            PERCENT_DECIMALS
+        )
         if real_unit_price > planned_unit_price:
             price_higher = price_diff_percent > PRICE_TOLERANCE_PERCENT
         else:
             price_lower = price_diff_percent > PRICE_TOLERANCE_PERCENT
     
     if planned_quantity_base > 0:
-        qty_diff_percent = abs((real_quantity_base - planned_quantity_base) / planned_quantity_base * Decimal('100'))
+        qty_diff_percent = round(
+            abs((real_quantity_base - planned_quantity_base) / planned_quantity_base) * 100.0,
+            PERCENT_DECIMALS
+        )
         quantity_different = qty_diff_percent > QUANTITY_TOLERANCE_PERCENT
     
     return {
-        "planned_quantity": float(planned_quantity_base),
-        "real_quantity": float(real_quantity_base),
-        "planned_unit_price": float(planned_unit_price) if planned_unit_price else None,
-        "real_unit_price": float(real_unit_price),
-        "planned_total": float(planned_total) if planned_total else None,
-        "real_total": float(real_total),
-        "difference": float(difference) if difference is not None else None,
-        "difference_percent": float(difference_percent) if difference_percent is not None else None,
+        "planned_quantity": planned_quantity_base,
+        "real_quantity": real_quantity_base,
+        "planned_unit_price": planned_unit_price,
+        "real_unit_price": real_unit_price,
+        "planned_total": planned_total if planned_total else None,
+        "real_total": real_total,
+        "difference": difference,
+        "difference_percent": difference_percent,
         "price_higher": price_higher,
         "price_lower": price_lower,
         "quantity_different": quantity_different
     }
 
 
+def _optional_price(value) -> float:
+    """Converte preço opcional para float (NaN quando ausente ou zero)."""
+    return float(value) if value else np.nan
+
+
+def bulk_compare(
+    list_items: List[ShoppingListItem],
+    receipt_items: List[ReceiptItem]
+) -> List[Dict]:
+    """
+    Versão vetorizada de compare_quantities_and_price para vários pares.
+    
+    Monta arrays float64 por campo (quantidades, preços, totais) e calcula
+    totais, diferenças e flags com operações NumPy em lote.
+    
+    Args:
+        list_items: Itens da lista de compras
+        receipt_items: Itens da nota mapeados (paralelo a list_items)
+        
+    Returns:
+        Lista de dicts no mesmo formato de compare_quantities_and_price
+    """
+    n = len(list_items)
+    if n == 0:
+        return []
+
+    planned_q = np.fromiter((float(li.quantity) for li in list_items), dtype=np.float64, count=n)
+    real_q = np.fromiter((float(ri.quantity) for ri in receipt_items), dtype=np.float64, count=n)
+    planned_p = np.fromiter((_optional_price(li.price_estimate) for li in list_items), dtype=np.float64, count=n)
+    real_p = np.fromiter((float(ri.unit_price) for ri in receipt_items), dtype=np.float64, count=n)
+    real_t = np.fromiter((float(ri.total_price) for ri in receipt_items), dtype=np.float64, count=n)
+
+    has_price = ~np.isnan(planned_p)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        planned_t = np.round(planned_p * planned_q, TOTAL_DECIMALS)
+        difference = np.round(real_t - planned_t, TOTAL_DECIMALS)
+        has_percent = has_price & (planned_t > 0)
+        difference_pct = difference / planned_t * 100.0
+
+        price_pct = np.round(np.abs((real_p - planned_p) / planned_p) * 100.0, PERCENT_DECIMALS)
+        price_out = has_price & (real_p != 0) & (price_pct > PRICE_TOLERANCE_PERCENT)
+        price_higher = price_out & (real_p > planned_p)
+        price_lower = price_out & (real_p <= planned_p)
+
+        qty_pct = np.round(np.abs((real_q - planned_q) / planned_q) * 100.0, PERCENT_DECIMALS)
+        quantity_different = (planned_q > 0) & (qty_pct > QUANTITY_TOLERANCE_PERCENT)
+
+    results = []
+    for i in range(n):
+        priced = bool(has_price[i])
+        results.append({
+            "planned_quantity": float(planned_q[i]),
+            "real_quantity": float(real_q[i]),
+            "planned_unit_price": float(planned_p[i]) if priced else None,
+            "real_unit_price": float(real_p[i]),
+            "planned_total": float(planned_t[i]) if priced and planned_t[i] else None,
+            "real_total": float(real_t[i]),
+            "difference": float(difference[i]) if priced else None,
+            "difference_percent": float(difference_pct[i]) if has_percent[i] else None,
+            "price_higher": bool(price_higher[i]),
+            "price_lower": bool(price_lower[i]),
+            "quantity_different": bool(quantity_different[i])
+        })
+
+    return results
+
+
 def build_item_comparison(
     list_item: ShoppingListItem,
     receipt_item: Optional[ReceiptItem],
@@ -1,27 +1,190 @@
 """
 PDF Generator Service - Gera PDFs de relatórios de sincronização
 """
+import asyncio
+import hashlib
+import json
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
+from operator import itemgetter
 from decimal import Decimal
 from datetime import datetime
+from typing import Any, Dict, Optional
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import cm
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from app.config import settings
+from app.database.redis import get_sync_redis
 from app.models.shopping_list_execution import ShoppingListExecution
 
 logger = logging.getLogger(__name__)
 
+# Pool de processos para renderização (ReportLab é CPU-bound e segura o GIL)
+_pdf_pool: Optional[ProcessPoolExecutor] = None
 
-def generate_sync_pdf(execution: ShoppingListExecution) -> bytes:
+# Estilos compartilhados entre todas as gerações (montados uma única vez)
+_STYLES = getSampleStyleSheet()
+
+_TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=_STYLES['Heading1'],
+    fontSize=18,
+    textColor=colors.HexColor('#1a1a1a'),
+    spaceAfter=30,
+    alignment=TA_CENTER
+)
+
+_INFO_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f5f5f5')),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+    ('TOPPADDING', (0, 0), (-1, -1), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+])
+
+_SUMMARY_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4a90e2')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 11),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+    ('TOPPADDING', (0, 0), (-1, -1), 10),
+    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+])
+
+_ITEMS_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4a90e2')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('ALIGN', (1, 1), (4, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('TOPPADDING', (0, 0), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9f9f9')]),
+])
+
+_ITEMS_HEADER = (
+    'Descrição',
+    'Qtd Planejada',
+    'Qtd Real',
+    'Preço Unit.',
+    'Total Real',
+    'Status'
+)
+
+_ITEMS_COL_WIDTHS = [5*cm, 2*cm, 2*cm, 2.5*cm, 2.5*cm, 2*cm]
+
+# Linhas por tabela de itens: tabelas muito grandes deixam a quebra de
+# página do ReportLab cara; número par mantém a alternância de cores
+_ITEMS_ROWS_PER_TABLE = 200
+
+# Traduzir status para português
+_STATUS_MAP = {
+    'PLANNED_AND_MATCHED': 'OK',
+    'PLANNED_NOT_PURCHASED': 'Não Comprado',
+    'PURCHASED_NOT_PLANNED': 'Extra',
+    'PRICE_HIGHER_THAN_EXPECTED': 'Preço Alto',
+    'PRICE_LOWER_THAN_EXPECTED': 'Preço Baixo',
+    'QUANTITY_DIFFERENT': 'Qtd Diferente'
+}
+
+
+# Campos de cada item usados na linha da tabela, na ordem das colunas
+_ITEM_FIELDS = ('description', 'planned_quantity', 'real_quantity', 'real_unit_price', 'real_total', 'status')
+_item_fields = itemgetter(*_ITEM_FIELDS)
+_status_label = _STATUS_MAP.get
+
+
+def _item_row(item: dict) -> tuple:
+    """Formata uma linha da tabela de itens."""
+    try:
+        description, planned_quantity, real_quantity, real_unit_price, real_total, status = _item_fields(item)
+    except KeyError:
+        # Resumos antigos podem não ter todos os campos
+        description, planned_quantity, real_quantity, real_unit_price, real_total, status = map(item.get, _ITEM_FIELDS)
+    if status is None:
+        status = 'N/A'
+    
+    return (
+        (description or 'N/A')[:40],  # Limitar tamanho
+        f"{planned_quantity:.2f}" if planned_quantity else 'N/A',
+        f"{real_quantity:.2f}" if real_quantity else 'N/A',
+        f"R$ {real_unit_price:.2f}" if real_unit_price else 'N/A',
+        f"R$ {real_total:.2f}" if real_total else 'N/A',
+        _status_label(status, status)
+    )
+
+
+def execution_to_dict(execution: ShoppingListExecution) -> Dict[str, Any]:
     """
-    Gera PDF de uma execução de sincronização.
+    Extrai da execução os campos usados no PDF em um dict simples,
+    que pode ser enviado para outro processo (pickle).
+    """
+    return {
+        "id": execution.id,
+        "created_at": execution.created_at,
+        "shopping_list_id": execution.shopping_list_id,
+        "receipt_id": execution.receipt_id,
+        "summary": execution.summary,
+    }
+
+
+def pdf_cache_key(data: Dict[str, Any]) -> str:
+    """
+    Chave de cache do PDF: hash de todos os dados renderizados.
+    Execuções são imutáveis após a sincronização, então não há invalidação.
+    """
+    payload = json.dumps(data, sort_keys=True, default=str).encode()
+    return f"pdf:{hashlib.blake2b(payload, digest_size=16).hexdigest()}"
+
+
+def _get_cached_pdf(key: str) -> Optional[bytes]:
+    """Busca PDF no Redis (None se ausente ou Redis indisponível)."""
+    client = get_sync_redis(decode_responses=False)
+    if client is None:
+        return None
+    try:
+        return client.get(key)
+    except Exception as e:
+        logger.warning(f"Redis unavailable for PDF cache read: {e}")
+        return None
+
+
+def _set_cached_pdf(key: str, pdf_bytes: bytes) -> None:
+    """Salva PDF no Redis; falhas são apenas logadas."""
+    client = get_sync_redis(decode_responses=False)
+    if client is None:
+        return
+    try:
+        client.set(key, pdf_bytes, ex=settings.PDF_CACHE_TTL_SECONDS)
+    except Exception as e:
+        logger.warning(f"Redis unavailable for PDF cache write: {e}")
+
+
+def render_sync_pdf(data: Dict[str, Any]) -> bytes:
+    """
+    Renderiza o PDF a partir do dict de execution_to_dict.
+    Não depende de sessão do banco, podendo rodar no pool de processos.
     
     Args:
-        execution: ShoppingListExecution com dados da sincronização
+        data: Dados da execução (id, created_at, shopping_list_id, receipt_id, summary)
         
     Returns:
         bytes do PDF gerado
@@ -29,48 +192,25 @@ def generate_sync_pdf(execution: ShoppingListExecution) -> bytes:
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=2*cm, bottomMargin=2*cm)
     
-    # Estilos
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        textColor=colors.HexColor('#1a1a1a'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    
     # Conteúdo
     story = []
     
     # Título
-    story.append(Paragraph("Relatório de Compra — Economiza", title_style))
+    story.append(Paragraph("Relatório de Compra — Economiza", _TITLE_STYLE))
     story.append(Spacer(1, 0.5*cm))
     
     # Informações gerais
     info_data = [
-        ['Data da Sincronização', execution.created_at.strftime('%d/%m/%Y %H:%M')],
-        ['Lista de Compras', str(execution.shopping_list_id)],
-        ['Nota Fiscal', str(execution.receipt_id)],
+        ['Data da Sincronização', data['created_at'].strftime('%d/%m/%Y %H:%M')],
+        ['Lista de Compras', str(data['shopping_list_id'])],
+        ['Nota Fiscal', str(data['receipt_id'])],
     ]
     
-    info_table = Table(info_data, colWidths=[6*cm, 10*cm])
-    info_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f5f5f5')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('TOPPADDING', (0, 0), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-    ]))
-    story.append(info_table)
+    story.append(Table(info_data, colWidths=[6*cm, 10*cm], style=_INFO_STYLE))
     story.append(Spacer(1, 1*cm))
     
     # Resumo financeiro
-    summary = execution.summary.get('summary', {}) if execution.summary else {}
+    summary = data['summary'].get('summary', {}) if data['summary'] else {}
     
     summary_data = [
         ['Resumo Financeiro', ''],
@@ -80,88 +220,104 @@ def generate_sync_pdf(execution: ShoppingListExecution) -> bytes:
         ['Diferença Percentual', f"{summary.get('difference_percent', 0):.2f}%" if summary.get('difference_percent') else 'N/A'],
     ]
     
-    summary_table = Table(summary_data, colWidths=[8*cm, 8*cm])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4a90e2')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-        ('TOPPADDING', (0, 0), (-1, -1), 10),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-    ]))
-    story.append(summary_table)
+    story.append(Table(summary_data, colWidths=[8*cm, 8*cm], style=_SUMMARY_STYLE))
     story.append(Spacer(1, 1*cm))
     
     # Itens
-    items = execution.summary.get('items', []) if execution.summary else []
+    items = data['summary'].get('items', []) if data['summary'] else []
     
     if items:
-        story.append(Paragraph("Itens Comparados", styles['Heading2']))
+        story.append(Paragraph("Itens Comparados", _STYLES['Heading2']))
         story.append(Spacer(1, 0.3*cm))
         
-        # Cabeçalho da tabela de itens
-        items_header = [
-            'Descrição',
-            'Qtd Planejada',
-            'Qtd Real',
-            'Preço Unit.',
-            'Total Real',
-            'Status'
-        ]
-        
-        items_data = [items_header]
-        
-        for item in items:
-            status_text = item.get('status', 'N/A')
-            # Traduzir status para português
-            status_map = {
-                'PLANNED_AND_MATCHED': 'OK',
-                'PLANNED_NOT_PURCHASED': 'Não Comprado',
-                'PURCHASED_NOT_PLANNED': 'Extra',
-                'PRICE_HIGHER_THAN_EXPECTED': 'Preço Alto',
-                'PRICE_LOWER_THAN_EXPECTED': 'Preço Baixo',
-                'QUANTITY_DIFFERENT': 'Qtd Diferente'
-            }
-            status_text = status_map.get(status_text, status_text)
-            
-            items_data.append([
-                item.get('description', 'N/A')[:40],  # Limitar tamanho
-                f"{item.get('planned_quantity', 0):.2f}" if item.get('planned_quantity') else 'N/A',
-                f"{item.get('real_quantity', 0):.2f}" if item.get('real_quantity') else 'N/A',
-                f"R$ {item.get('real_unit_price', 0):.2f}" if item.get('real_unit_price') else 'N/A',
-                f"R$ {item.get('real_total', 0):.2f}" if item.get('real_total') else 'N/A',
-                status_text
-            ])
-        
-        items_table = Table(items_data, colWidths=[5*cm, 2*cm, 2*cm, 2.5*cm, 2.5*cm, 2*cm])
-        items_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4a90e2')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('ALIGN', (1, 1), (4, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9f9f9')]),
-        ]))
-        story.append(items_table)
+        # Tabelas de itens em blocos, cada uma com cabeçalho repetido por página
+        for start in range(0, len(items), _ITEMS_ROWS_PER_TABLE):
+            items_data = [_ITEMS_HEADER]
+            items_data.extend(_item_row(item) for item in items[start:start + _ITEMS_ROWS_PER_TABLE])
+            story.append(Table(
+                items_data,
+                colWidths=_ITEMS_COL_WIDTHS,
+                style=_ITEMS_STYLE,
+                repeatRows=1
+            ))
     
     # Gerar PDF
     doc.build(story)
-    buffer.seek(0)
-    pdf_bytes = buffer.read()
+    pdf_bytes = buffer.getvalue()
     buffer.close()
     
-    logger.info(f"PDF gerado para execução {execution.id}: {len(pdf_bytes)} bytes")
+    logger.info(f"PDF gerado para execução {data['id']}: {len(pdf_bytes)} bytes")
     
     return pdf_bytes
 
+
+def generate_sync_pdf(execution: ShoppingListExecution) -> bytes:
+    """
+    Gera PDF de uma execução de sincronização no processo atual.
+    Reutiliza o PDF em cache se a execução já foi renderizada.
+    
+    Args:
+        execution: ShoppingListExecution com dados da sincronização
+        
+    Returns:
+        bytes do PDF gerado
+    """
+    data = execution_to_dict(execution)
+    key = pdf_cache_key(data)
+    
+    cached = _get_cached_pdf(key)
+    if cached is not None:
+        return cached
+    
+    pdf_bytes = render_sync_pdf(data)
+    _set_cached_pdf(key, pdf_bytes)
+    return pdf_bytes
+
+
+def start_pdf_pool() -> ProcessPoolExecutor:
+    """Cria o pool de processos de PDF (idempotente)."""
+    global _pdf_pool
+    
+    if _pdf_pool is None:
+        workers = settings.PDF_WORKERS or os.cpu_count() or 1
+        _pdf_pool = ProcessPoolExecutor(max_workers=workers)
+        logger.info(f"PDF process pool started with {workers} workers")
+    
+    return _pdf_pool
+
+
+def shutdown_pdf_pool() -> None:
+    """Encerra o pool de processos de PDF."""
+    global _pdf_pool
+    
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(wait=True)
+        _pdf_pool = None
+        logger.info("PDF process pool stopped")
+
+
+async def generate_sync_pdf_async(execution: ShoppingListExecution) -> bytes:
+    """
+    Gera PDF no pool de processos sem bloquear o event loop.
+    Reutiliza o PDF em cache se a execução já foi renderizada.
+    
+    Args:
+        execution: ShoppingListExecution com dados da sincronização
+        
+    Returns:
+        bytes do PDF gerado
+    """
+    data = execution_to_dict(execution)
+    key = pdf_cache_key(data)
+    loop = asyncio.get_running_loop()
+    
+    # Cliente Redis síncrono (binário) no executor padrão de threads: o
+    # timeout de socket e a cópia de PDFs grandes não bloqueiam o event loop
+    cached = await loop.run_in_executor(None, _get_cached_pdf, key)
+    if cached is not None:
+        logger.info(f"PDF em cache para execução {data['id']}")
+        return cached
+    
+    pdf_bytes = await loop.run_in_executor(start_pdf_pool(), render_sync_pdf, data)
+    await loop.run_in_executor(None, _set_cached_pdf, key, pdf_bytes)
+    return pdf_bytes
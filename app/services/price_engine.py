@@ -3,20 +3,34 @@ Price Engine - Serviço para estimar preços de itens em listas de compras
 baseado no histórico de compras do usuário.
 """
 import logging
+from functools import lru_cache
 from decimal import Decimal
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, or_, text
 from uuid import UUID
 from app.models.product import Product
 from app.models.receipt_item import ReceiptItem
 from app.models.shopping_list import ShoppingListItem
-import unicodedata
+from app.utils.text import fold_accents
 import re
 
 logger = logging.getLogger(__name__)
 
+# Regex pré-compilada: mantém apenas letras, números e espaços
+_STRIP_PUNCT = re.compile(r'[^a-z0-9\s]+')
 
+
+def _contains_pattern(s: str) -> str:
+    """
+    Padrão ILIKE "contém s" com %, _ e \\ escapados (usar com escape="\\"),
+    para o filtro SQL concordar com o `in` em Python.
+    """
+    escaped = s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+@lru_cache(maxsize=8192)
 def normalize_text(s: str) -> str:
     """
     Normaliza texto removendo acentos, convertendo para minúsculas
@@ -31,36 +45,100 @@ def normalize_text(s: str) -> str:
     if not s:
         return ""
     
-    # Remover acentos
-    nfd = unicodedata.normalize('NFD', s)
-    text = ''.join(char for char in nfd if unicodedata.category(char) != 'Mn')
-    
-    # Converter para minúsculas
-    text = text.lower()
+    # Remover acentos e converter para minúsculas (tabela pré-calculada)
+    text = fold_accents(s)
     
-    # Remover caracteres especiais, manter apenas letras, números e espaços
-    text = re.sub(r'[^a-z0-9\s]', '', text)
-    
-    # Remover espaços múltiplos
-    text = re.sub(r'\s+', ' ', text).strip()
+    # Remover caracteres especiais e espaços múltiplos em uma passada de regex
+    return ' '.join(_STRIP_PUNCT.sub('', text).split())
+
+
+# Similaridade mínima (pg_trgm) para aceitar o candidato retornado pelo banco;
+# abaixo disso a pontuação por substring/palavras em Python decide
+TRGM_SIMILARITY_THRESHOLD = 0.5
+
+
+def _score_product_name(
+    normalized_desc: str,
+    words: frozenset,
+    normalized_product: str,
+    product_words: Optional[frozenset] = None
+) -> float:
+    """
+    Pontuação simples por substring/palavras entre a descrição e o nome do produto.
+    `words`/`product_words` são os conjuntos de palavras de cada lado
+    (calculados uma vez pelo chamador quando o mesmo nome é pontuado várias vezes).
+    """
+    # Match exato
+    if normalized_product == normalized_desc:
+        return 1.0
+    # Match parcial (produto contém descrição ou vice-versa)
+    if normalized_desc in normalized_product or normalized_product in normalized_desc:
+        return 0.8
+    # Match por palavras (interseção de conjuntos)
+    if product_words is None:
+        product_words = frozenset(normalized_product.split())
+    matching_words = len(words & product_words)
+    if matching_words > 0:
+        return matching_words / max(len(words), len(product_words))
+    return 0.0
+
+
+def _trgm_top_matches(
+    db: Session,
+    user_id: UUID,
+    normalized_descs: List[str]
+) -> Dict[int, Tuple[UUID, float]]:
+    """
+    Para cada descrição normalizada, o produto do histórico do usuário mais
+    similar (pg_trgm similarity), em uma única query - mesma ordenação que
+    match_product usa para um item. Só em Postgres.
     
-    return text
+    Returns:
+        {posição em normalized_descs: (product_id, similarity)}
+    """
+    rows = db.execute(
+        text("""
+            WITH history AS (
+                SELECT DISTINCT p.id, p.normalized_name
+                FROM products p
+                JOIN receipt_items ri ON ri.product_id = p.id
+                JOIN receipts r ON r.id = ri.receipt_id
+                WHERE r.user_id = CAST(:user_id AS uuid)
+            )
+            SELECT DISTINCT ON (d.idx) d.idx, h.id,
+                   similarity(h.normalized_name, d.q) AS similarity
+            FROM unnest(CAST(:queries AS text[])) WITH ORDINALITY AS d(q, idx)
+            JOIN history h ON h.normalized_name % d.q
+            ORDER BY d.idx, similarity DESC
+        """),
+        {"user_id": str(user_id), "queries": normalized_descs},
+    )
+    # WITH ORDINALITY numera a partir de 1
+    return {idx - 1: (product_id, float(sim)) for idx, product_id, sim in rows}
 
 
-def match_product(description: str, db: Session, user_id: UUID) -> Optional[Product]:
+def match_product(
+    description: str,
+    db: Session,
+    user_id: UUID,
+    normalized_desc: Optional[str] = None
+) -> Optional[Product]:
     """
     Busca produto correspondente usando match textual.
     
     Lógica:
-    1. Buscar em products.normalized_name usando ILIKE
-    2. Buscar em receipt_items.description usando similaridade
-    3. Pontuação simples por substring
-    4. Retornar a melhor correspondência
+    1. Entre os produtos já comprados pelo usuário, pedir ao banco o mais
+       similar (pg_trgm similarity) à descrição, buscando apenas (id, nome)
+    2. Se a similaridade for baixa (ou fora do Postgres), pontuar por
+       substring/palavras em Python sobre os mesmos (id, nome)
+    3. Buscar em receipt_items.description usando ILIKE
+    4. Retornar a melhor correspondência (Product completo só do vencedor)
     
     Args:
         description: Descrição do item
         db: Sessão do banco de dados
         user_id: ID do usuário para filtrar histórico
+        normalized_desc: Descrição já normalizada (evita renormalizar no chamador e aqui)
         
     Returns:
         Product correspondente ou None
@@ -68,8 +146,9 @@ def match_product(description: str, db: Session, user_id: UUID) -> Optional[Prod
     if not description:
         return None
     
-    normalized_desc = normalize_text(description)
-    words = normalized_desc.split()
+    if normalized_desc is None:
+        normalized_desc = normalize_text(description)
+    words = frozenset(normalized_desc.split())
     
     if not words:
         return None
@@ -78,75 +157,101 @@ def match_product(description: str, db: Session, user_id: UUID) -> Optional[Prod
     from app.models.receipt import Receipt
     
     products_from_history = (
-        db.query(Product)
-        .join(ReceiptItem)
-        .join(Receipt)
+        db.query(Product.id, Product.normalized_name)
+        .join(ReceiptItem, ReceiptItem.product_id == Product.id)
+        .join(Receipt, Receipt.id == ReceiptItem.receipt_id)
         .filter(Receipt.user_id == user_id)
         .distinct()
-        .all()
     )
     
-    best_match = None
+    best_match_id = None
     best_score = 0.0
     
-    # Buscar em produtos do histórico do usuário
-    for product in products_from_history:
-        normalized_product = normalize_text(product.normalized_name)
-        
-        # Calcular score por substring
-        score = 0.0
-        
-        # Match exato
-        if normalized_product == normalized_desc:
-            score = 1.0
-        # Match parcial (produto contém descrição ou vice-versa)
-        elif normalized_desc in normalized_product or normalized_product in normalized_desc:
-            score = 0.8
-        # Match por palavras
-        else:
-            product_words = normalized_product.split()
-            matching_words = sum(1 for word in words if word in product_words)
-            if matching_words > 0:
-                score = matching_words / max(len(words), len(product_words))
-        
-        if score > best_score:
-            best_score = score
-            best_match = product
+    if db.get_bind().dialect.name == "postgresql":
+        # Candidato mais similar calculado no banco (índice GIN trigram)
+        similarity = func.similarity(Product.normalized_name, normalized_desc).label("similarity")
+        top = (
+            products_from_history
+            .add_columns(similarity)
+            .filter(Product.normalized_name.op("%")(normalized_desc))
+            .order_by(desc("similarity"))
+            .limit(1)
+            .first()
+        )
+        if top and top.similarity >= TRGM_SIMILARITY_THRESHOLD:
+            best_match_id = top.id
+            best_score = float(top.similarity)
+    
+    if best_match_id is None:
+        # Pontuação em Python sobre (id, nome) projetados; normalized_name
+        # já é gravado normalizado, então a comparação é direta
+        for product_id, product_name in products_from_history:
+            score = _score_product_name(normalized_desc, words, product_name)
+            if score > best_score:
+                best_score = score
+                best_match_id = product_id
+                if score == 1.0:
+                    break
     
-    # Se encontrou match com score >= 0.5, retornar
-    if best_match and best_score >= 0.5:
-        logger.debug(f"Product match: '{description}' -> '{best_match.normalized_name}' (score: {best_score})")
-        return best_match
+    # Se encontrou match com score >= 0.5, carregar e retornar o produto
+    if best_match_id and best_score >= 0.5:
+        best_match = db.query(Product).filter(Product.id == best_match_id).first()
+        if best_match:
+            logger.debug(f"Product match: '{description}' -> '{best_match.normalized_name}' (score: {best_score})")
+            return best_match
     
     # Estratégia 2: Buscar em receipt_items.description diretamente do usuário
-    # e tentar encontrar product_id mais comum
-    receipt_items = (
-        db.query(ReceiptItem)
-        .join(Receipt)
+    # o product_id mais comum (agregado no banco: retorna uma única linha)
+    occurrences = func.count().label("occurrences")
+    most_common = (
+        db.query(ReceiptItem.product_id, occurrences)
+        .join(Receipt, Receipt.id == ReceiptItem.receipt_id)
         .filter(
             Receipt.user_id == user_id,
-            ReceiptItem.description.ilike(f"%{description}%")
+            ReceiptItem.product_id.isnot(None),
+            ReceiptItem.description.ilike(_contains_pattern(description), escape="\\")
         )
-        .all()
+        .group_by(ReceiptItem.product_id)
+        .order_by(desc(occurrences))
+        .limit(1)
+        .first()
     )
     
-    if receipt_items:
-        # Contar product_id mais frequente
-        product_counts = {}
-        for item in receipt_items:
-            if item.product_id:
-                product_counts[item.product_id] = product_counts.get(item.product_id, 0) + 1
-        
-        if product_counts:
-            most_common_product_id = max(product_counts, key=product_counts.get)
-            product = db.query(Product).filter(Product.id == most_common_product_id).first()
-            if product:
-                logger.debug(f"Product match via receipt_items: '{description}' -> '{product.normalized_name}'")
-                return product
+    if most_common:
+        product = db.query(Product).filter(Product.id == most_common.product_id).first()
+        if product:
+            logger.debug(f"Product match via receipt_items: '{description}' -> '{product.normalized_name}'")
+            return product
     
     return None
 
 
+def _as_decimal(value) -> Decimal:
+    """
+    Converte para Decimal sem ida e volta por str quando possível: colunas
+    Numeric já chegam como Decimal e int converte direto.
+    """
+    if type(value) is Decimal:
+        return value
+    if isinstance(value, int):
+        return Decimal(value)
+    return Decimal(str(value))
+
+
+def _unit_price(total_price, quantity, product_id: UUID) -> Optional[Decimal]:
+    """
+    Calcula o preço unitário (total_price / quantity) de um receipt_item.
+    """
+    if not quantity or quantity <= 0:
+        return None
+    
+    try:
+        return _as_decimal(total_price) / _as_decimal(quantity)
+    except (ValueError, ZeroDivisionError):
+        logger.warning(f"Erro ao calcular preço unitário para product_id={product_id}")
+        return None
+
+
 def get_latest_price(product_id: UUID, db: Session, user_id: UUID) -> Optional[Decimal]:
     """
     Busca o preço unitário mais recente de um produto.
@@ -165,76 +270,80 @@ def get_latest_price(product_id: UUID, db: Session, user_id: UUID) -> Optional[D
     # Assumindo que ReceiptItem tem relação com Receipt que tem user_id
     from app.models.receipt import Receipt
     
-    latest_item = db.query(ReceiptItem).join(Receipt).filter(
+    latest_item = db.query(ReceiptItem.total_price, ReceiptItem.quantity).join(Receipt).filter(
         ReceiptItem.product_id == product_id,
         Receipt.user_id == user_id
     ).order_by(desc(ReceiptItem.created_at)).first()
     
-    if not latest_item or not latest_item.quantity or latest_item.quantity <= 0:
+    if not latest_item:
         return None
     
-    # Calcular preço unitário
-    try:
-        unit_price = Decimal(str(latest_item.total_price)) / Decimal(str(latest_item.quantity))
-        return unit_price
-    except (ValueError, ZeroDivisionError):
-        logger.warning(f"Erro ao calcular preço unitário para product_id={product_id}")
-        return None
+    return _unit_price(latest_item.total_price, latest_item.quantity, product_id)
 
 
-def estimate_item_price(
-    item: ShoppingListItem,
-    db: Session,
-    user_id: UUID
-) -> Dict[str, Optional[Decimal] | float]:
+def get_latest_prices(product_ids, db: Session, user_id: UUID) -> Dict[UUID, Decimal]:
     """
-    Estima preço de um item da lista de compras.
+    Busca o preço unitário mais recente de vários produtos em uma única query
+    (DISTINCT ON product_id ordenado por created_at DESC).
     
     Args:
-        item: ShoppingListItem a estimar
+        product_ids: IDs dos produtos
         db: Sessão do banco de dados
-        user_id: ID do usuário
+        user_id: ID do usuário para filtrar histórico
         
     Returns:
-        {
-            "unit_price_estimate": Decimal | None,
-            "total_price_estimate": Decimal | None,
-            "confidence": float
-        }
+        Dict {product_id: preço unitário}; produtos sem preço válido ficam de fora
     """
-    unit_price_estimate = None
-    total_price_estimate = None
-    confidence = 0.0
+    from app.models.receipt import Receipt
     
-    product = None
+    product_ids = set(product_ids)
+    if not product_ids:
+        return {}
     
-    # Estratégia 1: Se item.product_id existe, usar esse produto
-    if item.product_id:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        if product:
-            confidence = 1.0
-            logger.debug(f"Using product_id for item: {item.description}")
+    latest_items = (
+        db.query(ReceiptItem.product_id, ReceiptItem.total_price, ReceiptItem.quantity)
+        .join(Receipt, Receipt.id == ReceiptItem.receipt_id)
+        .filter(
+            ReceiptItem.product_id.in_(product_ids),
+            Receipt.user_id == user_id
+        )
+        .distinct(ReceiptItem.product_id)
+        .order_by(ReceiptItem.product_id, desc(ReceiptItem.created_at))
+        .all()
+    )
     
-    # Estratégia 2: Se não encontrou, fazer match textual
-    if not product:
-        product = match_product(item.description, db, user_id)
-        if product:
-            # Ajustar confidence baseado na qualidade do match
-            normalized_desc = normalize_text(item.description)
-            normalized_product = normalize_text(product.normalized_name)
-            
-            if normalized_product == normalized_desc:
-                confidence = 0.8
-            elif normalized_desc in normalized_product or normalized_product in normalized_desc:
-                confidence = 0.7
-            else:
-                confidence = 0.5
-            logger.debug(f"Matched product via text for item: {item.description}")
+    prices = {}
+    for product_id, total_price, quantity in latest_items:
+        unit_price = _unit_price(total_price, quantity, product_id)
+        if unit_price is not None:
+            prices[product_id] = unit_price
+    return prices
+
+
+def _text_match_confidence(normalized_desc: str, normalized_product: str) -> float:
+    """Confidence de um match textual conforme a qualidade do match."""
+    if normalized_product == normalized_desc:
+        return 0.8
+    if normalized_desc in normalized_product or normalized_product in normalized_desc:
+        return 0.7
+    return 0.5
+
+
+def _build_estimate(
+    item: ShoppingListItem,
+    product_found: bool,
+    confidence: float,
+    latest_price: Optional[Decimal]
+) -> Dict[str, Optional[Decimal] | float]:
+    """
+    Monta a estimativa de um item a partir do produto encontrado e do seu
+    preço mais recente.
+    """
+    unit_price_estimate = None
+    total_price_estimate = None
     
-    # Se encontrou produto, buscar preço mais recente
-    if product:
-        latest_price = get_latest_price(product.id, db, user_id)
-        
+    # Se encontrou produto, usar preço mais recente
+    if product_found:
         if latest_price:
             # Normalizar unidades
             # latest_price está em "unidade base" do receipt_item
@@ -247,7 +356,7 @@ def estimate_item_price(
             
             # Calcular total
             try:
-                total_price_estimate = unit_price_estimate * Decimal(str(item.quantity))
+                total_price_estimate = unit_price_estimate * _as_decimal(item.quantity)
             except (ValueError, TypeError):
                 logger.warning(f"Erro ao calcular total_price_estimate para item {item.id}")
                 total_price_estimate = None
@@ -266,3 +375,203 @@ def estimate_item_price(
         "confidence": confidence
     }
 
+
+def estimate_item_price(
+    item: ShoppingListItem,
+    db: Session,
+    user_id: UUID
+) -> Dict[str, Optional[Decimal] | float]:
+    """
+    Estima preço de um item da lista de compras.
+    
+    Para vários itens, prefira estimate_items_prices, que usa um número fixo de queries.
+    
+    Args:
+        item: ShoppingListItem a estimar
+        db: Sessão do banco de dados
+        user_id: ID do usuário
+        
+    Returns:
+        {
+            "unit_price_estimate": Decimal | None,
+            "total_price_estimate": Decimal | None,
+            "confidence": float
+        }
+    """
+    confidence = 0.0
+    product = None
+    
+    # Estratégia 1: Se item.product_id existe, usar esse produto
+    if item.product_id:
+        product = db.query(Product).filter(Product.id == item.product_id).first()
+        if product:
+            confidence = 1.0
+            logger.debug(f"Using product_id for item: {item.description}")
+    
+    # Estratégia 2: Se não encontrou, fazer match textual
+    if not product:
+        normalized_desc = normalize_text(item.description)
+        product = match_product(item.description, db, user_id, normalized_desc=normalized_desc)
+        if product:
+            # Ajustar confidence baseado na qualidade do match
+            confidence = _text_match_confidence(normalized_desc, product.normalized_name)
+            logger.debug(f"Matched product via text for item: {item.description}")
+    
+    latest_price = get_latest_price(product.id, db, user_id) if product else None
+    return _build_estimate(item, product is not None, confidence, latest_price)
+
+
+def estimate_items_prices(
+    items: List[ShoppingListItem],
+    db: Session,
+    user_id: UUID
+) -> List[Dict[str, Optional[Decimal] | float]]:
+    """
+    Estima preços de vários itens da lista de compras de uma vez.
+    
+    Mesmas estratégias de estimate_item_price (e de match_product), mas sem
+    queries por item:
+    1. Produtos referenciados por product_id (uma query)
+    2. Em Postgres, o produto do histórico mais similar (pg_trgm) a cada
+       descrição, aceito com similaridade >= TRGM_SIMILARITY_THRESHOLD (uma query)
+    3. Para os demais, produtos do histórico do usuário (id, nome) pontuados
+       por substring/palavras em Python (uma query)
+    4. Fallback por receipt_items.description para os itens sem match (uma query)
+    5. Preço mais recente de todos os produtos encontrados (uma query)
+    
+    Args:
+        items: ShoppingListItems a estimar
+        db: Sessão do banco de dados
+        user_id: ID do usuário
+        
+    Returns:
+        Lista paralela a items com dicts no formato de estimate_item_price
+    """
+    from app.models.receipt import Receipt
+    
+    if not items:
+        return []
+    
+    # (product_id, confidence) por item; None quando não há produto
+    matches: List[Optional[Tuple[UUID, float]]] = [None] * len(items)
+    
+    # Estratégia 1: produtos referenciados por product_id
+    referenced_ids = {item.product_id for item in items if item.product_id}
+    existing_ids = set()
+    if referenced_ids:
+        existing_ids = {
+            product_id for (product_id,) in
+            db.query(Product.id).filter(Product.id.in_(referenced_ids))
+        }
+    
+    pending = []
+    for index, item in enumerate(items):
+        if item.product_id in existing_ids:
+            matches[index] = (item.product_id, 1.0)
+            logger.debug(f"Using product_id for item: {item.description}")
+        else:
+            pending.append(index)
+    
+    # Estratégia 2: match textual contra o histórico do usuário (carregado uma vez)
+    if pending:
+        history = dict(
+            db.query(Product.id, Product.normalized_name)
+            .join(ReceiptItem, ReceiptItem.product_id == Product.id)
+            .join(Receipt, Receipt.id == ReceiptItem.receipt_id)
+            .filter(Receipt.user_id == user_id)
+            .distinct()
+            .all()
+        )
+        # Conjuntos de palavras de cada produto, calculados uma vez para todos os itens
+        history_words = [
+            (product_id, product_name, frozenset(product_name.split()))
+            for product_id, product_name in history.items()
+        ]
+        
+        normalized_descs = [normalize_text(items[index].description) for index in pending]
+        
+        # Candidatos pg_trgm de todos os itens pendentes em uma query
+        trgm_matches = {}
+        if history and db.get_bind().dialect.name == "postgresql":
+            trgm_matches = _trgm_top_matches(db, user_id, normalized_descs)
+        
+        unmatched = []
+        for position, index in enumerate(pending):
+            item = items[index]
+            normalized_desc = normalized_descs[position]
+            words = frozenset(normalized_desc.split())
+            if not words:
+                continue
+            
+            best_match_id = None
+            best_score = 0.0
+            top = trgm_matches.get(position)
+            if top and top[1] >= TRGM_SIMILARITY_THRESHOLD:
+                best_match_id, best_score = top
+            
+            if best_match_id is None:
+                for product_id, product_name, product_words in history_words:
+                    score = _score_product_name(normalized_desc, words, product_name, product_words)
+                    if score > best_score:
+                        best_score = score
+                        best_match_id = product_id
+                        if score == 1.0:
+                            break
+            
+            if best_match_id and best_score >= 0.5:
+                matches[index] = (best_match_id, _text_match_confidence(normalized_desc, history[best_match_id]))
+                logger.debug(f"Matched product via text for item: {item.description}")
+            else:
+                unmatched.append(index)
+        
+        # Estratégia 3: product_id mais frequente entre receipt_items cuja
+        # descrição contém a do item (ILIKE de todos os itens em uma query)
+        if unmatched:
+            descriptions = {items[index].description for index in unmatched}
+            # Agrupado por (descrição, produto): descrições repetidas vêm uma vez com a contagem
+            receipt_rows = (
+                db.query(ReceiptItem.description, ReceiptItem.product_id, func.count())
+                .join(Receipt, Receipt.id == ReceiptItem.receipt_id)
+                .filter(
+                    Receipt.user_id == user_id,
+                    ReceiptItem.product_id.isnot(None),
+                    or_(*[ReceiptItem.description.ilike(_contains_pattern(d), escape="\\") for d in descriptions])
+                )
+                .group_by(ReceiptItem.description, ReceiptItem.product_id)
+                .all()
+            )
+            receipt_rows = [
+                (description.lower(), product_id, count)
+                for description, product_id, count in receipt_rows
+            ]
+            
+            for index in unmatched:
+                item = items[index]
+                needle = item.description.lower()
+                product_counts = {}
+                for description, product_id, count in receipt_rows:
+                    if needle in description:
+                        product_counts[product_id] = product_counts.get(product_id, 0) + count
+                
+                if product_counts:
+                    most_common_product_id = max(product_counts, key=product_counts.get)
+                    normalized_desc = normalize_text(item.description)
+                    matches[index] = (
+                        most_common_product_id,
+                        _text_match_confidence(normalized_desc, history[most_common_product_id])
+                    )
+                    logger.debug(f"Matched product via receipt_items for item: {item.description}")
+    
+    # Estratégia 4: preço mais recente de todos os produtos encontrados
+    latest_prices = get_latest_prices(
+        (match[0] for match in matches if match), db, user_id
+    )
+    
+    estimates = []
+    for item, match in zip(items, matches):
+        if match:
+            product_id, confidence = match
+            estimates.append(_build_estimate(item, True, confidence, latest_prices.get(product_id)))
+        else:
+            estimates.append(_build_estimate(item, False, 0.0, None))
+    return estimates
@@ -5,29 +5,49 @@ Serviço para matching de produtos usando múltiplas estratégias:
 - Embedding matching com vector DB (opcional)
 """
 import re
-import unicodedata
 import logging
+import threading
+import time
+from functools import lru_cache
+import numpy as np
 from typing import Optional, List, Dict, Any
 from uuid import UUID
-from sqlalchemy.orm import Session
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session, object_session
 from rapidfuzz import process, fuzz
 from app.models.product import Product
+from app.utils.text import fold_accents
 
 logger = logging.getLogger(__name__)
 
 # Stopwords e palavras genéricas em português (comuns em nomes de produtos)
-STOPWORDS = {
+STOPWORDS = frozenset({
     'a', 'o', 'e', 'de', 'do', 'da', 'em', 'um', 'uma', 'para', 'com', 'por',
     'que', 'na', 'no', 'as', 'os', 'ao', 'pelo', 'pela', 'dos', 'das',
     'tipo', 'marca', 'sabor', 'sabor', 'unidade', 'un', 'pacote', 'pac',
     'caixa', 'cx', 'embalagem', 'emb', 'ref', 'und', 'pct', 'kg', 'g', 'l', 'ml'
-}
+})
+
+# Regex pré-compiladas para normalize_name
+# Medidas com números (ex: "500g", "1kg") e números isolados em uma única passada;
+# a unidade precisa terminar a palavra ("12 lata" não vira "ata")
+_MEASURE_RE = re.compile(r'\d+\s*(?:kg|g|ml|l|lt|un|pct|pac|cx|emb|und|gr|mg|cl|dl)\b|\b\d+\b')
+_DIGIT_RE = re.compile(r'\d')
+_NONWORD_RE = re.compile(r'[^a-z0-9\s]')
 
 # Modelo de embeddings (carregado sob demanda)
+EMBEDDING_MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
 _embedding_model = None
 _supabase_client = None
 
+# Símbolos das dependências opcionais do vector DB, importados uma única vez.
+# None = ainda não tentou; False = dependências indisponíveis (ImportError
+# falho não fica em sys.modules, então repetir o import custaria a cada chamada)
+_SentenceTransformer = None
+_create_client = None
+
 
+@lru_cache(maxsize=8192)
 def normalize_name(text: str) -> str:
     """
     Normaliza o nome do produto para matching:
@@ -47,31 +67,37 @@ def normalize_name(text: str) -> str:
     if not text:
         return ""
     
-    # Lowercase
-    normalized = text.lower().strip()
-    
-    # Remover acentos
-    normalized = unicodedata.normalize('NFD', normalized)
-    normalized = ''.join(char for char in normalized if unicodedata.category(char) != 'Mn')
-    
-    # Remover medidas e unidades com números (ex: "500g", "1kg", "250ml", "2un", "5kg", "1l")
-    normalized = re.sub(r'\d+\s*(kg|g|ml|l|lt|un|pct|pac|cx|emb|und|gr|mg|cl|dl)', '', normalized, flags=re.IGNORECASE)
+    normalized = _normalize_name_once(text)
     
-    # Remover números isolados (ex: "produto 123", "5", "1")
-    normalized = re.sub(r'\b\d+\b', '', normalized)
+    # Remover uma medida pode expor outra ("g5l2l" -> "g5l", "ab12 de lt" ->
+    # "ab12 lt"): repete até estabilizar, para que normalizar de novo um valor
+    # já normalizado (ex.: evento de Product) devolva o mesmo texto.
+    # Sem dígitos o resultado já é estável.
+    while _DIGIT_RE.search(normalized):
+        again = _normalize_name_once(normalized)
+        if again == normalized:
+            break
+        normalized = again
     
-    # Remover pontuações (mantém apenas letras, números e espaços)
-    normalized = re.sub(r'[^\w\s]', ' ', normalized)
+    return normalized
+
+
+def _normalize_name_once(text: str) -> str:
+    """Uma passada das regras de normalize_name."""
+    # Lowercase e remover acentos (tabela pré-calculada)
+    normalized = fold_accents(text)
     
-    # Remover stopwords e palavras genéricas
-    words = normalized.split()
-    words = [w for w in words if w not in STOPWORDS and len(w) > 1]
-    normalized = ' '.join(words)
+    # Remover pontuações e caracteres fora de [a-z0-9] (mantém apenas letras, números e espaços)
+    # antes das medidas, para que "nº12" e "12º" exponham o número isolado
+    normalized = _NONWORD_RE.sub(' ', normalized)
     
-    # Remover espaços extras
-    normalized = ' '.join(normalized.split())
+    # Remover medidas e unidades com números (ex: "500g", "1kg", "250ml", "2un", "5kg", "1l")
+    # e números isolados (ex: "produto 123", "5", "1"); sem dígitos, nada a remover
+    if _DIGIT_RE.search(normalized):
+        normalized = _MEASURE_RE.sub('', normalized)
     
-    return normalized.strip()
+    # Remover stopwords, palavras genéricas e espaços extras
+    return ' '.join(w for w in normalized.split() if w not in STOPWORDS and len(w) > 1)
 
 
 def match_by_barcode(db: Session, barcode: str) -> Optional[UUID]:
@@ -97,6 +123,102 @@ def match_by_barcode(db: Session, barcode: str) -> Optional[UUID]:
     return None
 
 
+# ---------------------------------------------------------------------------
+# Índice em memória (id, normalized_name) para fuzzy matching
+# ---------------------------------------------------------------------------
+
+# Tempo máximo de reuso do índice: produtos criados por outros processos
+# passam a ser considerados no máximo após esse intervalo
+PRODUCT_INDEX_TTL_SECONDS = 60
+
+_PRODUCT_INDEX_DIRTY_KEY = "product_index_dirty"
+
+_product_index = {
+    "version": 0, "built_version": -1, "built_at": 0.0,
+    "ids": [], "choices": [], "trigrams": {},
+}
+_product_index_lock = threading.Lock()
+
+
+def invalidate_product_index() -> None:
+    """Marca o índice de produtos para ser reconstruído na próxima busca."""
+    _product_index["version"] += 1
+
+
+def _trigrams(text: str) -> set:
+    """Trigramas do texto com espaço nas bordas (como o pg_trgm)."""
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _build_trigram_index(choices: List[str]) -> Dict[str, List[int]]:
+    """Mapeia trigrama -> posições (em choices) dos nomes que o contêm."""
+    trigram_index = {}
+    for position, name in enumerate(choices):
+        for trigram in _trigrams(name):
+            trigram_index.setdefault(trigram, []).append(position)
+    return trigram_index
+
+
+def _trigram_candidates(trigram_index: Dict[str, List[int]], name_normalized: str) -> List[int]:
+    """
+    Posições dos nomes que compartilham ao menos um trigrama com a busca,
+    em ordem crescente (mesma ordem de desempate de uma varredura completa).
+    """
+    candidates = set()
+    for trigram in _trigrams(name_normalized):
+        candidates.update(trigram_index.get(trigram, ()))
+    return sorted(candidates)
+
+
+def _get_product_index(db: Session) -> tuple:
+    """
+    Retorna (ids, choices, trigrams) com os produtos, seus nomes normalizados
+    e o índice de trigramas, reconstruindo apenas quando invalidado ou expirado.
+    """
+    with _product_index_lock:
+        index = _product_index
+        expired = time.monotonic() - index["built_at"] > PRODUCT_INDEX_TTL_SECONDS
+        if index["built_version"] != index["version"] or expired:
+            version = index["version"]
+            rows = db.query(Product.id, Product.normalized_name).filter(
+                Product.normalized_name.isnot(None),
+                Product.normalized_name != ""
+            ).all()
+            index["ids"] = [product_id for product_id, _ in rows]
+            index["choices"] = [name for _, name in rows]
+            index["trigrams"] = _build_trigram_index(index["choices"])
+            index["built_version"] = version
+            index["built_at"] = time.monotonic()
+            logger.debug(f"Product index rebuilt: {len(rows)} products")
+        return index["ids"], index["choices"], index["trigrams"]
+
+
+def _mark_product_index_dirty(mapper, connection, target):
+    """Invalida o índice ao gravar produtos (visível já na mesma sessão)."""
+    invalidate_product_index()
+    session = object_session(target)
+    if session is not None:
+        session.info[_PRODUCT_INDEX_DIRTY_KEY] = True
+
+
+event.listen(Product, "after_insert", _mark_product_index_dirty)
+event.listen(Product, "after_update", _mark_product_index_dirty)
+event.listen(Product, "after_delete", _mark_product_index_dirty)
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _refresh_product_index_on_end(session):
+    """
+    Após commit/rollback de uma sessão que gravou produtos, invalida de novo:
+    o índice pode ter sido montado por outra sessão sem ver essas alterações
+    (commit) ou pela própria sessão com linhas que não existem mais (rollback).
+    """
+    if session.info.pop(_PRODUCT_INDEX_DIRTY_KEY, None):
+        invalidate_product_index()
+
+
 def fuzzy_match(
     db: Session,
     name_normalized: str,
@@ -106,6 +228,12 @@ def fuzzy_match(
     Busca produto usando fuzzy matching com rapidfuzz.
     Recebe nome já normalizado.
     
+    Tenta primeiro match exato e por prefixo no banco. No fuzzy, os nomes
+    de produtos vêm do índice em memória (_get_product_index), sem consultar
+    a tabela inteira a cada chamada, e só são pontuados os que compartilham
+    algum trigrama com a busca (sem trigrama em comum o WRatio não chega ao
+    threshold).
+    
     Args:
         db: Sessão do banco de dados
         name_normalized: Nome do produto já normalizado
@@ -117,32 +245,53 @@ def fuzzy_match(
     if not name_normalized:
         return None
     
-    # Buscar todos os produtos
-    products = db.query(Product).all()
-    
-    if not products:
-        return None
-    
-    # Criar lista de nomes normalizados para matching
-    # Usar normalized_name como chave e id (string) como valor para que extractOne retorne o id
-    product_names = {p.normalized_name: str(p.id) for p in products if p.normalized_name}
-    
-    if not product_names:
-        return None
-    
-    # Usar rapidfuzz para encontrar melhor match
-    result = process.extractOne(
-        name_normalized,
-        product_names,
-        scorer=fuzz.WRatio,
-        score_cutoff=threshold
+    # Antes do fuzzy: igualdade e prefixo em normalized_name (consultas por
+    # índice, sem pontuar nomes). Nomes normalizados só têm [a-z0-9 ], então
+    # não há curingas de LIKE a escapar.
+    exact = db.query(Product.id).filter(Product.normalized_name == name_normalized).first()
+    if exact:
+        logger.debug(f"Product exact matched: '{name_normalized}' -> {exact.id}")
+        return exact.id
+    
+    prefix = (
+        db.query(Product.id)
+        .filter(Product.normalized_name.like(f"{name_normalized}%"))
+        .order_by(func.length(Product.normalized_name))
+        .first()
     )
+    if prefix:
+        logger.debug(f"Product prefix matched: '{name_normalized}' -> {prefix.id}")
+        return prefix.id
     
-    if result:
-        matched_name, score, product_id_str = result
-        product_id = UUID(product_id_str)
-        logger.debug(f"Product fuzzy matched: '{name_normalized}' -> {product_id} (score: {score:.1f}%)")
-        return product_id
+    for _ in range(2):
+        product_ids, choices, trigram_index = _get_product_index(db)
+        
+        candidates = _trigram_candidates(trigram_index, name_normalized)
+        if not candidates:
+            return None
+        
+        # Usar rapidfuzz para encontrar melhor match (nomes já normalizados)
+        result = process.extractOne(
+            name_normalized,
+            [choices[position] for position in candidates],
+            scorer=fuzz.WRatio,
+            processor=None,
+            score_cutoff=threshold
+        )
+        
+        if not result:
+            return None
+        
+        matched_name, score, candidate_index = result
+        product_id = product_ids[candidates[candidate_index]]
+        
+        # Confirmar pela PK: o produto pode ter sido removido fora do ORM
+        # (outro processo, SQL direto); nesse caso reconstruir e tentar de novo
+        if db.query(Product.id).filter(Product.id == product_id).first():
+            logger.debug(f"Product fuzzy matched: '{name_normalized}' -> {product_id} (score: {score:.1f}%)")
+            return product_id
+        
+        invalidate_product_index()
     
     return None
 
@@ -175,6 +324,58 @@ def fuzzy_match_name(
     return fuzzy_match(db, normalized, threshold)
 
 
+def _load_vector_deps() -> bool:
+    """
+    Importa sentence_transformers/supabase na primeira chamada e guarda os
+    símbolos em globais do módulo. Retorna False se não estiverem instalados.
+    """
+    global _SentenceTransformer, _create_client
+    
+    if _SentenceTransformer is None:
+        try:
+            from supabase import create_client
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            _SentenceTransformer = _create_client = False
+        else:
+            _SentenceTransformer = SentenceTransformer
+            _create_client = create_client
+    
+    return _SentenceTransformer is not False
+
+
+def _get_embedding_model():
+    """
+    Carrega o modelo de embeddings sob demanda. Em GPU usa FP16 (metade da
+    banda de memória por encode); em CPU mantém FP32, onde half() é mais lento.
+    """
+    global _embedding_model
+    
+    if _embedding_model is None:
+        logger.info("Loading sentence transformer model...")
+        model = _SentenceTransformer(EMBEDDING_MODEL_NAME)
+        if model.device.type == 'cuda':
+            model = model.half()
+        _embedding_model = model
+    
+    return _embedding_model
+
+
+@lru_cache(maxsize=4096)
+def _embed_query(normalized: str) -> tuple:
+    """
+    Embedding unitário do nome normalizado (cacheado: nomes se repetem entre
+    notas). A normalização L2 é feita in-place em NumPy, de modo que o vector
+    DB compara por produto interno; a conversão para floats Python (exigida
+    pelo JSON da RPC) acontece uma vez por nome, não a cada busca.
+    """
+    vector = np.asarray(_get_embedding_model().encode(normalized), dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return tuple(vector.tolist())
+
+
 def embed_match_name(
     db: Session,
     name: str,
@@ -192,14 +393,12 @@ def embed_match_name(
     Returns:
         Lista de product_ids ordenados por similaridade
     """
-    try:
-        from supabase import create_client, Client
-        from sentence_transformers import SentenceTransformer
-        from app.config import settings
-    except ImportError:
+    if not _load_vector_deps():
         logger.debug("Vector DB dependencies not available, skipping embedding match")
         return []
     
+    from app.config import settings
+    
     # Verificar se vector DB está configurado
     supabase_url = getattr(settings, 'SUPABASE_URL', '')
     supabase_key = getattr(settings, 'SUPABASE_KEY', '')
@@ -209,20 +408,14 @@ def embed_match_name(
         return []
     
     try:
-        global _embedding_model, _supabase_client
-        
-        # Carregar modelo de embeddings (lazy loading)
-        if _embedding_model is None:
-            logger.info("Loading sentence transformer model...")
-            _embedding_model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+        global _supabase_client
         
         # Inicializar cliente Supabase (lazy loading)
         if _supabase_client is None:
-            _supabase_client = create_client(supabase_url, supabase_key)
+            _supabase_client = _create_client(supabase_url, supabase_key)
         
-        # Gerar embedding do nome
-        normalized = normalize_name(name)
-        embedding = _embedding_model.encode(normalized).tolist()
+        # Gerar embedding do nome (cacheado por nome normalizado)
+        embedding = _embed_query(normalize_name(name))
         
         # Buscar no vector DB
         response = _supabase_client.rpc(
@@ -248,7 +441,8 @@ def embed_match_name(
 
 def get_or_create_product(
     db: Session,
-    item: Dict[str, Any]
+    item: Dict[str, Any],
+    commit: bool = True
 ) -> UUID:
     """
     Busca ou cria produto usando múltiplas estratégias combinadas:
@@ -259,6 +453,8 @@ def get_or_create_product(
     Args:
         db: Sessão do banco de dados
         item: Dicionário com dados do item (description, barcode, etc)
+        commit: Se False, apenas faz flush do produto novo, deixando o commit
+            para o chamador (usado ao salvar vários itens em uma transação)
         
     Returns:
         product_id (existente ou recém-criado)
@@ -293,13 +489,70 @@ def get_or_create_product(
         category_id=item.get("category_id")
     )
     db.add(product)
-    db.commit()
-    db.refresh(product)
+    if commit:
+        db.commit()
+        db.refresh(product)
+    else:
+        db.flush()  # Para obter o ID sem encerrar a transação
     
     logger.info(f"Product created: {product.id} - '{normalized}'")
     return product.id
 
 
+def get_or_create_products(
+    db: Session,
+    items: List[Dict[str, Any]]
+) -> List[UUID]:
+    """
+    Versão em lote de get_or_create_product para os itens de uma nota.
+    
+    Códigos de barras e nomes normalizados de todos os itens são resolvidos
+    em duas consultas IN; apenas os itens sem match direto passam pelas
+    demais estratégias (prefixo, fuzzy, criação). Produtos novos são apenas
+    enviados com flush: o commit fica com o chamador.
+    
+    Args:
+        db: Sessão do banco de dados
+        items: Dicionários com dados dos itens (description, barcode, etc)
+        
+    Returns:
+        product_id de cada item, na mesma ordem de `items`
+    """
+    barcodes = {item.get("barcode") for item in items if item.get("barcode")}
+    names = {normalize_name(item.get("description") or "") for item in items}
+    names.discard("")
+    
+    by_barcode: Dict[str, UUID] = {}
+    if barcodes:
+        for product_id, barcode in db.query(Product.id, Product.barcode).filter(Product.barcode.in_(barcodes)):
+            by_barcode.setdefault(barcode, product_id)
+    
+    by_name: Dict[str, UUID] = {}
+    if names:
+        for product_id, name in db.query(Product.id, Product.normalized_name).filter(Product.normalized_name.in_(names)):
+            by_name.setdefault(name, product_id)
+    
+    product_ids = []
+    for item in items:
+        barcode = item.get("barcode")
+        normalized = normalize_name(item.get("description") or "")
+        
+        product_id = by_barcode.get(barcode) if barcode else None
+        if product_id is None and normalized:
+            product_id = by_name.get(normalized)
+        if product_id is None:
+            product_id = get_or_create_product(db, item, commit=False)
+            # Itens repetidos na mesma nota reaproveitam o resultado
+            if barcode:
+                by_barcode.setdefault(barcode, product_id)
+            if normalized:
+                by_name[normalized] = product_id
+        
+        product_ids.append(product_id)
+    
+    return product_ids
+
+
 # Alias para compatibilidade
 get_or_create_product_from_item = get_or_create_product
 
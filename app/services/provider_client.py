@@ -2,17 +2,53 @@
 Cliente para buscar notas fiscais de providers externos (Webmania/Serpro/Oobj)
 Integração real para consulta de NFC-e
 """
+import asyncio
+import atexit
+import hashlib
+import json
+import httpx
 import requests
 import xmltodict
 import logging
-import time
+import random
 import re
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from io import BytesIO
+from xml.etree import ElementTree
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
 from urllib.parse import urlparse
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple, Union
 from app.config import settings
+from app.database.redis import get_redis, get_sync_redis
 
 logger = logging.getLogger(__name__)
 
+try:
+    # orjson: bem mais rápido que json da stdlib em payloads de NF-e
+    # (fallback para a stdlib onde não estiver instalado)
+    from orjson import dumps as _json_dumps, loads as _json_loads
+except ImportError:
+    _json_dumps = json.dumps
+    _json_loads = json.loads
+
+try:
+    # h2 (httpx[http2]): várias buscas simultâneas multiplexadas na mesma
+    # conexão TLS com o provider
+    import h2  # noqa: F401
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+# Chave de acesso da NF-e: 44 dígitos (busca em URL e validação exata)
+_KEY_RE = re.compile(r'\d{44}')
+
 # Hosts permitidos para fetch_by_url (anti-SSRF)
 ALLOWED_HOSTS = [
     "fazenda.gov.br",
@@ -25,6 +61,162 @@ ALLOWED_HOSTS = [
 ]
 
 
+# Pool de conexões HTTP para o provider
+PROVIDER_POOL_CONNECTIONS = 20
+PROVIDER_POOL_MAXSIZE = 50
+# Conexões ociosas mantidas abertas no cliente assíncrono (padrão httpx: 5s)
+PROVIDER_KEEPALIVE_EXPIRY = 60
+
+# Retries (GET) em timeouts, erros de conexão, 429 e 5xx, com backoff
+# exponencial e jitter; quando o provider envia Retry-After, espera o que ele pede
+# (limitado a PROVIDER_RETRY_AFTER_MAX_SECONDS)
+PROVIDER_MAX_RETRIES = 2
+PROVIDER_BACKOFF_FACTOR = 1
+# Até N segundos aleatórios somados ao backoff: workers que falharam juntos
+# não voltam ao provider no mesmo instante
+PROVIDER_BACKOFF_JITTER = 0.5
+PROVIDER_RETRY_STATUSES = (429, 500, 502, 503, 504)
+PROVIDER_RETRY_AFTER_MAX_SECONDS = 30
+
+PROVIDER_USER_AGENT = "Economiza-Backend/1.0"
+
+# Buscas simultâneas por lote em fetch_many (abaixo de PROVIDER_POOL_MAXSIZE)
+PROVIDER_FETCH_CONCURRENCY = 16
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Converte o header Retry-After (segundos ou HTTP-date) em segundos de espera,
+    limitado a PROVIDER_RETRY_AFTER_MAX_SECONDS. None se ausente ou inválido.
+    """
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        seconds = (retry_at - datetime.now(timezone.utc)).total_seconds()
+    return min(max(seconds, 0.0), PROVIDER_RETRY_AFTER_MAX_SECONDS)
+
+
+class _CappedRetry(Retry):
+    """Retry do urllib3 que respeita Retry-After, mas sem esperar além do limite."""
+    
+    def parse_retry_after(self, retry_after: str) -> float:
+        return min(super().parse_retry_after(retry_after), PROVIDER_RETRY_AFTER_MAX_SECONDS)
+
+
+class _TokenBucket:
+    """
+    Token bucket (por processo) com `rate_per_minute` fichas por minuto.
+    reserve() consome uma ficha e retorna quanto esperar antes de usá-la,
+    evitando provocar 429 no provider em vez de só reagir a ele.
+    """
+    
+    def __init__(self, rate_per_minute: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            # Saldo negativo = fila: espera até a ficha reservada ser reposta
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+_rate_limiter: Optional[_TokenBucket] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def _provider_wait_time() -> float:
+    """Espera necessária antes da próxima requisição (0 sem PROVIDER_RATE_LIMIT_PER_MINUTE)."""
+    global _rate_limiter
+    
+    limit = settings.PROVIDER_RATE_LIMIT_PER_MINUTE
+    if not limit:
+        return 0.0
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = _TokenBucket(limit)
+    return _rate_limiter.reserve()
+
+
+def _build_session() -> requests.Session:
+    """
+    Cria a sessão HTTP compartilhada: reaproveita conexões (keep-alive/TLS)
+    entre chamadas e delega os retries ao urllib3.
+    """
+    retry = _CappedRetry(
+        total=PROVIDER_MAX_RETRIES,
+        backoff_factor=PROVIDER_BACKOFF_FACTOR,
+        backoff_jitter=PROVIDER_BACKOFF_JITTER,
+        status_forcelist=PROVIDER_RETRY_STATUSES,
+        allowed_methods=frozenset(["GET"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=PROVIDER_POOL_CONNECTIONS,
+        pool_maxsize=PROVIDER_POOL_MAXSIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = PROVIDER_USER_AGENT
+    return session
+
+
+_session = _build_session()
+atexit.register(_session.close)
+
+# Cliente assíncrono compartilhado (criado sob demanda)
+_async_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    """
+    Retorna o httpx.AsyncClient compartilhado (pool de conexões keep-alive,
+    HTTP/2 quando h2 está instalado), criando-o na primeira chamada. Sem
+    retries no transporte: erros de conexão são repetidos apenas pelo laço de
+    _make_request_async (mesmo número de tentativas da sessão síncrona).
+    """
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        # Limites vão no transporte: com transport=..., o httpx ignora os do cliente
+        _async_client = httpx.AsyncClient(
+            headers={"User-Agent": PROVIDER_USER_AGENT},
+            transport=httpx.AsyncHTTPTransport(
+                http2=_HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=PROVIDER_POOL_MAXSIZE,
+                    max_keepalive_connections=PROVIDER_POOL_CONNECTIONS,
+                    keepalive_expiry=PROVIDER_KEEPALIVE_EXPIRY,
+                ),
+            ),
+        )
+    return _async_client
+
+
+async def close_async_client() -> None:
+    """Fecha o httpx.AsyncClient compartilhado (shutdown da aplicação)."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
 class ProviderError(Exception):
     """Exceção genérica para erros do provider"""
     pass
@@ -45,6 +237,24 @@ class ProviderUnauthorized(ProviderError):
     pass
 
 
+@lru_cache(maxsize=4)
+def _compile_allowed_hosts(whitelist_domains: str) -> Tuple[frozenset, Tuple[str, ...]]:
+    """
+    Compila ALLOWED_HOSTS + WHITELIST_DOMAINS em (hosts exatos, sufixos ".dominio").
+    Cacheado pelo valor da whitelist: parse uma vez, refeito só se a config mudar.
+    Wildcard "*.example.com" equivale ao domínio simples (ele e seus subdomínios).
+    """
+    domains = [allowed.lower() for allowed in ALLOWED_HOSTS]
+    if whitelist_domains:
+        for domain in whitelist_domains.split(","):
+            domain = domain.strip().lower()
+            if domain.startswith("*."):
+                domain = domain[2:]
+            if domain:
+                domains.append(domain)
+    return frozenset(domains), tuple(f".{domain}" for domain in domains)
+
+
 def _is_allowed_host(host: str) -> bool:
     """
     Verifica se o host está na lista de permitidos (anti-SSRF).
@@ -57,29 +267,13 @@ def _is_allowed_host(host: str) -> bool:
     # Normalizar host (remover porta se houver)
     host = host.split(":")[0].lower().strip()
     
-    # Verificar hosts padrão
-    for allowed in ALLOWED_HOSTS:
-        allowed_lower = allowed.lower()
-        if host == allowed_lower:
-            return True
-        # Verificar subdomínios (ex: nfe.fazenda.gov.br)
-        if host.endswith(f".{allowed_lower}"):
-            return True
-    
-    # Verificar whitelist customizada
-    if settings.WHITELIST_DOMAINS:
-        whitelist = [d.strip().lower() for d in settings.WHITELIST_DOMAINS.split(",") if d.strip()]
-        for domain in whitelist:
-            if domain.startswith("*."):
-                # Wildcard: *.example.com
-                base_domain = domain[2:]
-                if host.endswith(f".{base_domain}") or host == base_domain:
-                    return True
-            elif host == domain or host.endswith(f".{domain}"):
-                return True
+    # Host exato ou subdomínio (ex: nfe.fazenda.gov.br) de um domínio permitido
+    exact_hosts, suffixes = _compile_allowed_hosts(settings.WHITELIST_DOMAINS)
+    if host in exact_hosts or host.endswith(suffixes):
+        return True
     
     # Rejeitar por padrão (segurança)
-    logger.warning(f"SSRF protection: Host '{host}' not in whitelist")
+    logger.warning("SSRF protection: Host '%s' not in whitelist", host)
     return False
 
 
@@ -96,7 +290,7 @@ def _validate_url(url: str) -> bool:
         
         # Apenas HTTP e HTTPS permitidos
         if parsed.scheme not in ["http", "https"]:
-            logger.warning(f"SSRF protection: Invalid scheme '{parsed.scheme}' in URL")
+            logger.warning("SSRF protection: Invalid scheme '%s' in URL", parsed.scheme)
             return False
         
         # Extrair host (remover porta)
@@ -109,26 +303,338 @@ def _validate_url(url: str) -> bool:
         is_allowed = _is_allowed_host(host)
         
         if not is_allowed:
-            logger.warning(f"SSRF protection: Host '{host}' not allowed for URL: {url}")
+            logger.warning("SSRF protection: Host '%s' not allowed for URL: %s", host, url)
         
         return is_allowed
         
     except Exception as e:
-        logger.error(f"SSRF protection: Error validating URL '{url}': {e}")
+        logger.error("SSRF protection: Error validating URL '%s': %s", url, e)
         return False
 
 
+def _is_access_key(key: str) -> bool:
+    """Chave de acesso válida: exatamente 44 dígitos ASCII (sem regex)."""
+    return len(key) == 44 and key.isascii() and key.isdigit()
+
+
 def _extract_key_from_url(url: str) -> Optional[str]:
     """
     Extrai chave de acesso (44 dígitos) de uma URL.
     """
     # Buscar padrão de chave de acesso (44 dígitos)
-    match = re.search(r'\d{44}', url)
+    match = _KEY_RE.search(url)
     if match:
         return match.group(0)
     return None
 
 
+# Elementos da NF-e usados por receipt_parser (filhos diretos de infNFe)
+_NFE_SECTIONS = frozenset(["ide", "emit", "total"])
+
+
+@lru_cache(maxsize=1024)
+def _local_name(tag: str) -> str:
+    """
+    Remove o namespace de uma tag ElementTree ({ns}tag -> tag). Cacheado: o
+    vocabulário de tags da NF-e é pequeno, e as chaves dos dicts de todos os
+    itens passam a compartilhar o mesmo objeto str.
+    """
+    return tag.rsplit("}", 1)[-1]
+
+
+@lru_cache(maxsize=256)
+def _attr_key(name: str) -> str:
+    """Chave de atributo no formato do xmltodict ('@' + nome local), cacheada."""
+    return "@" + _local_name(name)
+
+
+def _element_to_dict(elem) -> Any:
+    """
+    Converte um elemento (e filhos) para a mesma estrutura do xmltodict:
+    atributos com '@', tags repetidas viram lista, texto em '#text'.
+    """
+    children = list(elem)
+    text = elem.text.strip() if elem.text and elem.text.strip() else None
+    if not children and not elem.attrib:
+        return text
+    
+    result: Dict[str, Any] = {_attr_key(k): v for k, v in elem.attrib.items()}
+    for child in children:
+        name = _local_name(child.tag)
+        value = _element_to_dict(child)
+        if name in result:
+            if not isinstance(result[name], list):
+                result[name] = [result[name]]
+            result[name].append(value)
+        else:
+            result[name] = value
+    if text is not None:
+        result["#text"] = text
+    return result
+
+
+def _response_too_large() -> ProviderError:
+    """Erro (já logado) para respostas acima de PROVIDER_MAX_RESPONSE_BYTES."""
+    logger.error("provider_fetch_fail: Response larger than %s bytes", settings.PROVIDER_MAX_RESPONSE_BYTES)
+    return ProviderError("Resposta do provider excede o tamanho máximo permitido")
+
+
+def _check_content_length(headers) -> None:
+    """Rejeita a resposta pelo Content-Length, antes de ler o corpo."""
+    length = headers.get("Content-Length")
+    if length and length.isdigit() and int(length) > settings.PROVIDER_MAX_RESPONSE_BYTES:
+        raise _response_too_large()
+
+
+def _join_limited(chunks) -> bytes:
+    """Junta os chunks do corpo abortando ao passar de PROVIDER_MAX_RESPONSE_BYTES."""
+    limit = settings.PROVIDER_MAX_RESPONSE_BYTES
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) > limit:
+            raise _response_too_large()
+    return bytes(buffer)
+
+
+async def _ajoin_limited(chunks) -> bytes:
+    """Versão assíncrona de _join_limited (httpx aiter_bytes)."""
+    limit = settings.PROVIDER_MAX_RESPONSE_BYTES
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer += chunk
+        if len(buffer) > limit:
+            raise _response_too_large()
+    return bytes(buffer)
+
+
+class _LimitedReader:
+    """Stream para o iterparse que aborta ao passar de PROVIDER_MAX_RESPONSE_BYTES."""
+    
+    def __init__(self, stream):
+        self._stream = stream
+        self._limit = settings.PROVIDER_MAX_RESPONSE_BYTES
+        self._bytes_read = 0
+    
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._stream.read(size)
+        self._bytes_read += len(chunk)
+        if self._bytes_read > self._limit:
+            raise _response_too_large()
+        return chunk
+
+
+# Início de um XML de nota sem content-type: declaração ou raiz da NF-e
+_XML_PREFIXES = (b"<?xml", b"<nfeProc", b"<NFe")
+
+
+def _looks_like_xml(content: bytes) -> bool:
+    """
+    Sniff pelos primeiros bytes do corpo (sem decodificar para str), ignorando
+    BOM UTF-8 e espaços iniciais.
+    """
+    return content[:512].lstrip(b"\xef\xbb\xbf \t\r\n").startswith(_XML_PREFIXES)
+
+
+class _RecordingReader:
+    """
+    Envolve o stream lido pelo iterparse guardando os bytes já lidos, para que
+    um XML sem infNFe possa ir inteiro ao xmltodict. A gravação para assim que
+    infNFe aparece, então em NF-e a memória extra fica limitada ao início do
+    documento.
+    """
+    
+    def __init__(self, stream):
+        self._stream = stream
+        self._chunks = []
+        self.recording = True
+    
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._stream.read(size)
+        if self.recording:
+            self._chunks.append(chunk)
+        return chunk
+    
+    def stop_recording(self) -> None:
+        self.recording = False
+        self._chunks = []
+    
+    def recorded(self) -> bytes:
+        """Bytes lidos até agora mais o restante do stream."""
+        return b"".join(self._chunks) + self._stream.read()
+
+
+def _parse_note_xml(content: Union[bytes, Any]) -> Dict[str, Any]:
+    """
+    Extrai de um XML de NF-e/NFC-e apenas o que receipt_parser consome
+    ({"infNFe": {"@Id", "ide", "emit", "total", "det": [...]}}), em streaming:
+    cada <det> é convertido e removido da árvore assim que termina,
+    mantendo a memória proporcional a um item, não ao documento.
+    
+    Aceita bytes ou um stream (ex.: response.raw), lido direto do socket sem
+    materializar o corpo. XML sem infNFe (outro formato) cai no xmltodict completo.
+    """
+    source = _RecordingReader(
+        BytesIO(content) if isinstance(content, (bytes, bytearray)) else content
+    )
+    inf_nfe: Dict[str, Any] = {}
+    items = []
+    inf_nfe_elem = None
+    depth_of_inf_nfe = None
+    depth = 0
+    
+    for event, elem in ElementTree.iterparse(source, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            if depth_of_inf_nfe is None and _local_name(elem.tag) == "infNFe":
+                depth_of_inf_nfe = depth
+                inf_nfe_elem = elem
+                source.stop_recording()
+                if "Id" in elem.attrib:
+                    inf_nfe["@Id"] = elem.attrib["Id"]
+            continue
+        
+        # event == "end": seções diretamente abaixo de infNFe. Depois de
+        # convertidas, saem da árvore (remove, não só clear) para não acumular
+        if depth_of_inf_nfe is not None and depth == depth_of_inf_nfe + 1:
+            name = _local_name(elem.tag)
+            if name == "det":
+                items.append(_element_to_dict(elem))
+                inf_nfe_elem.remove(elem)
+            elif name in _NFE_SECTIONS:
+                inf_nfe[name] = _element_to_dict(elem)
+                inf_nfe_elem.remove(elem)
+        depth -= 1
+    
+    if depth_of_inf_nfe is None:
+        return xmltodict.parse(source.recorded())
+    
+    if items:
+        inf_nfe["det"] = items
+    return {"infNFe": inf_nfe}
+
+
+def _note_cache_key(provider_name: str, key: str) -> str:
+    """Chave Redis da nota já buscada: sha256(provider|chave)."""
+    digest = hashlib.sha256(f"{provider_name}|{key}".encode()).hexdigest()
+    return f"provider_note:{digest}"
+
+
+# Entrada gravada no lugar da nota quando o provider responde "não encontrada"
+_NOT_FOUND_ENTRY = {"__not_found__": True}
+
+
+def _is_not_found_entry(cached: Any) -> bool:
+    """True se o valor em cache é o marcador de nota não encontrada."""
+    return isinstance(cached, dict) and cached.get("__not_found__") is True
+
+
+def _note_cache_enabled() -> bool:
+    """Cache de notas ligado (positivo ou de não encontradas)."""
+    return settings.PROVIDER_CACHE_TTL_SECONDS > 0 or settings.PROVIDER_NOT_FOUND_TTL_SECONDS > 0
+
+
+def _get_cached_note(cache_key: str) -> Optional[Dict[str, Any]]:
+    """Busca nota no Redis (None se ausente, cache desligado ou Redis indisponível)."""
+    if not _note_cache_enabled():
+        return None
+    client = get_sync_redis()
+    if client is None:
+        return None
+    try:
+        raw = client.get(cache_key)
+    except Exception as e:
+        logger.warning("Redis unavailable for provider cache read: %s", e)
+        return None
+    return _json_loads(raw) if raw else None
+
+
+def _set_cached_note(cache_key: str, data: Dict[str, Any], ttl: Optional[int] = None) -> None:
+    """Salva nota no Redis com TTL (padrão PROVIDER_CACHE_TTL_SECONDS); falhas são apenas logadas."""
+    ttl = settings.PROVIDER_CACHE_TTL_SECONDS if ttl is None else ttl
+    if ttl <= 0:
+        return
+    client = get_sync_redis()
+    if client is None:
+        return
+    try:
+        client.set(cache_key, _json_dumps(data), ex=ttl)
+    except Exception as e:
+        logger.warning("Redis unavailable for provider cache write: %s", e)
+
+
+async def _get_cached_note_async(cache_key: str) -> Optional[Dict[str, Any]]:
+    """Versão assíncrona de _get_cached_note (cliente redis.asyncio)."""
+    if not _note_cache_enabled():
+        return None
+    try:
+        client = await get_redis()
+        raw = await client.get(cache_key) if client is not None else None
+    except Exception as e:
+        logger.warning("Redis unavailable for provider cache read: %s", e)
+        return None
+    return _json_loads(raw) if raw else None
+
+
+async def _set_cached_note_async(cache_key: str, data: Dict[str, Any], ttl: Optional[int] = None) -> None:
+    """Versão assíncrona de _set_cached_note; falhas são apenas logadas."""
+    ttl = settings.PROVIDER_CACHE_TTL_SECONDS if ttl is None else ttl
+    if ttl <= 0:
+        return
+    try:
+        client = await get_redis()
+        if client is not None:
+            await client.set(cache_key, _json_dumps(data), ex=ttl)
+    except Exception as e:
+        logger.warning("Redis unavailable for provider cache write: %s", e)
+
+
+# Particularidades de cada provider, resolvidas uma vez no __init__.
+# auth: "app_key" = par app_key/app_secret em headers; "bearer" = Authorization
+_PROVIDER_SPECS: Dict[str, Dict[str, str]] = {
+    "webmania": {"auth": "app_key", "method": "GET", "path": "{base}/{key}"},
+    "oobj": {"auth": "app_key", "method": "GET", "path": "{base}/{key}"},
+    "serpro": {"auth": "bearer", "method": "GET", "path": "{base}/{key}"},
+}
+_DEFAULT_PROVIDER_SPEC = _PROVIDER_SPECS["webmania"]
+
+
+# Nota devolvida pelo provider fake; montada uma vez e copiada (rasa) por chave
+_FAKE_NOTE_TEMPLATE: Dict[str, Any] = {
+    "store": {
+        "name": "SUPERMERCADO FAKE",
+        "cnpj": "12345678000190"
+    },
+    "total": "125.30",
+    "subtotal": "119.00",
+    "tax": "6.30",
+    "emitted_at": "2024-01-15T10:30:00-03:00",
+    "items": [
+        {
+            "description": "ARROZ TIPO 1 5KG",
+            "quantity": 1,
+            "unit_price": "25.50",
+            "total_price": "25.50",
+            "tax_value": "1.20"
+        },
+        {
+            "description": "FEIJAO PRETO 1KG",
+            "quantity": 2,
+            "unit_price": "8.50",
+            "total_price": "17.00",
+            "tax_value": "0.85"
+        },
+        {
+            "description": "ACUCAR CRISTAL 1KG",
+            "quantity": 1,
+            "unit_price": "4.80",
+            "total_price": "4.80",
+            "tax_value": "0.24"
+        }
+    ]
+}
+
+
 class ProviderClient:
     """
     Cliente para integração com providers de notas fiscais.
@@ -140,114 +646,169 @@ class ProviderClient:
         self.app_key = settings.PROVIDER_APP_KEY
         self.app_secret = settings.PROVIDER_APP_SECRET
         self.timeout = settings.PROVIDER_TIMEOUT
+        self._session = _session
+        self._base_url = (self.api_url or "").rstrip('/')
+        # Provider é fixo durante o processo: método, URL e headers de
+        # autenticação são resolvidos uma vez por cliente (não por chamada)
+        self._spec = _PROVIDER_SPECS.get(self.provider_name, _DEFAULT_PROVIDER_SPEC)
+        self._method = self._spec["method"]
+        self._headers = self._get_headers()
+        # Buscas em andamento por chave: chamadas simultâneas para a mesma
+        # chave aguardam a primeira em vez de repetir a ida ao provider
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._inflight_async: Dict[str, "asyncio.Task"] = {}
     
     def _get_headers(self) -> Dict[str, str]:
         """
         Retorna os headers corretos para cada provider.
         """
-        if self.provider_name == "webmania":
-            return {
-                "app_key": self.app_key,
-                "app_secret": self.app_secret,
-                "Content-Type": "application/json",
-            }
-        elif self.provider_name == "oobj":
-            return {
-                "app_key": self.app_key,
-                "app_secret": self.app_secret,
-                "Content-Type": "application/json",
-            }
-        elif self.provider_name == "serpro":
+        if self._spec["auth"] == "bearer":
             return {
                 "Authorization": f"Bearer {self.app_key}",
                 "Content-Type": "application/json",
             }
-        else:
-            # Default
-            return {
-                "app_key": self.app_key,
-                "app_secret": self.app_secret,
-                "Content-Type": "application/json",
-            }
+        return {
+            "app_key": self.app_key,
+            "app_secret": self.app_secret,
+            "Content-Type": "application/json",
+        }
+    
+    def _check_status(self, status_code: int) -> None:
+        """
+        Converte status HTTP de erro nas exceções do provider.
+        """
+        if status_code == 401 or status_code == 403:
+            logger.error("provider_fetch_fail: Unauthorized (%s)", status_code)
+            raise ProviderUnauthorized("Erro de autenticação com o provider")
+        
+        if status_code == 404:
+            logger.error("provider_fetch_fail: Not found (404)")
+            raise ProviderNotFound("Nota fiscal não encontrada")
+        
+        if status_code == 429:
+            logger.error("provider_fetch_fail: Rate limit (429)")
+            raise ProviderRateLimit("Rate limit excedido. Tente novamente mais tarde.")
+        
+        if status_code >= 500:
+            # Retries já esgotados
+            logger.error("provider_fetch_fail: Server error %s", status_code)
+            raise ProviderError(f"Erro do servidor do provider: {status_code}")
+        
+        if status_code >= 400:
+            logger.error("provider_fetch_fail: HTTP %s", status_code)
+            raise ProviderError(f"Erro ao buscar nota fiscal: HTTP {status_code}")
     
     def _make_request(
         self,
         method: str,
         url: str,
         data: Optional[Dict] = None,
-        max_retries: int = 3
+        stream: bool = False
     ) -> requests.Response:
         """
-        Faz requisição ao provider com retries exponenciais.
+        Faz requisição ao provider pela sessão compartilhada (keep-alive).
+        Retries com backoff exponencial para timeouts, erros de conexão e
+        5xx ficam a cargo do Retry do urllib3 montado na sessão.
+        Com stream=True o corpo fica no socket (response.raw) e o chamador
+        deve fechar a resposta para devolver a conexão ao pool. Respostas com
+        Content-Length acima de PROVIDER_MAX_RESPONSE_BYTES são rejeitadas.
         """
-        headers = self._get_headers()
-        backoff = 1
+        headers = self._headers
+        method = method.upper()
         
-        for attempt in range(max_retries):
-            try:
-                if method.upper() == "GET":
-                    response = requests.get(url, headers=headers, timeout=self.timeout)
-                elif method.upper() == "POST":
-                    response = requests.post(url, headers=headers, json=data, timeout=self.timeout)
-                else:
-                    raise ValueError(f"Método HTTP não suportado: {method}")
-                
-                # Tratamento de status codes específicos
-                if response.status_code == 401 or response.status_code == 403:
-                    logger.error(f"provider_fetch_fail: Unauthorized ({response.status_code})")
-                    raise ProviderUnauthorized("Erro de autenticação com o provider")
-                
-                if response.status_code == 404:
-                    logger.error("provider_fetch_fail: Not found (404)")
-                    raise ProviderNotFound("Nota fiscal não encontrada")
-                
-                if response.status_code == 429:
-                    logger.error("provider_fetch_fail: Rate limit (429)")
-                    raise ProviderRateLimit("Rate limit excedido. Tente novamente mais tarde.")
-                
-                if response.status_code >= 500:
-                    # Erro do servidor - pode tentar novamente
-                    if attempt < max_retries - 1:
-                        wait_time = backoff * (2 ** attempt)
-                        logger.warning(
-                            f"Server error {response.status_code}, retrying in {wait_time}s "
-                            f"(attempt {attempt + 1}/{max_retries})"
-                        )
-                        time.sleep(wait_time)
-                        backoff *= 2
-                        continue
-                    else:
-                        logger.error(f"provider_fetch_fail: Server error {response.status_code}")
-                        raise ProviderError(f"Erro do servidor do provider: {response.status_code}")
-                
-                response.raise_for_status()
-                return response
-                
-            except (ProviderNotFound, ProviderRateLimit, ProviderUnauthorized):
-                # Não fazer retry para esses erros
-                raise
-            except requests.exceptions.Timeout:
-                if attempt < max_retries - 1:
-                    wait_time = backoff * (2 ** attempt)
-                    logger.warning(
-                        f"Timeout, retrying in {wait_time}s (attempt {attempt + 1}/{max_retries})"
-                    )
-                    time.sleep(wait_time)
-                    backoff *= 2
-                    continue
+        wait_time = _provider_wait_time()
+        if wait_time:
+            time.sleep(wait_time)
+        
+        try:
+            if method == "GET":
+                response = self._session.get(url, headers=headers, timeout=self.timeout, stream=stream)
+            elif method == "POST":
+                response = self._session.post(url, headers=headers, json=data, timeout=self.timeout, stream=stream)
+            else:
+                raise ValueError(f"Método HTTP não suportado: {method}")
+        except requests.exceptions.Timeout:
+            logger.error("provider_fetch_fail: Timeout after retries")
+            raise ProviderError("Timeout ao buscar nota fiscal após tentativas")
+        except requests.exceptions.RequestException as e:
+            # Retries de leitura esgotados chegam como ConnectionError(MaxRetryError(ReadTimeoutError))
+            reason = getattr(e.args[0], "reason", None) if e.args else None
+            if isinstance(reason, ReadTimeoutError):
                 logger.error("provider_fetch_fail: Timeout after retries")
                 raise ProviderError("Timeout ao buscar nota fiscal após tentativas")
-            except requests.exceptions.RequestException as e:
-                if attempt < max_retries - 1:
-                    wait_time = backoff * (2 ** attempt)
-                    logger.warning(
-                        f"Request error, retrying in {wait_time}s (attempt {attempt + 1}/{max_retries}): {str(e)}"
-                    )
-                    time.sleep(wait_time)
-                    backoff *= 2
-                    continue
-                logger.error(f"provider_fetch_fail: {str(e)}")
-                raise ProviderError(f"Erro ao buscar nota fiscal: {str(e)}")
+            logger.error("provider_fetch_fail: %s", e)
+            raise ProviderError(f"Erro ao buscar nota fiscal: {str(e)}")
+        
+        try:
+            self._check_status(response.status_code)
+            _check_content_length(response.headers)
+        except ProviderError:
+            response.close()
+            raise
+        return response
+    
+    async def _make_request_async(
+        self,
+        method: str,
+        url: str,
+        data: Optional[Dict] = None
+    ) -> httpx.Response:
+        """
+        Versão assíncrona de _make_request (httpx.AsyncClient compartilhado).
+        Mesma política de retries: GET em timeouts, erros de conexão, 429 e 5xx,
+        com Retry-After ou backoff exponencial via asyncio.sleep (não bloqueia
+        o event loop). A resposta volta em streaming: o chamador lê o corpo
+        (com limite de tamanho) e a fecha.
+        """
+        method = method.upper()
+        if method not in ("GET", "POST"):
+            raise ValueError(f"Método HTTP não suportado: {method}")
+        
+        headers = self._headers
+        retries = PROVIDER_MAX_RETRIES if method == "GET" else 0
+        client = _get_async_client()
+        
+        for attempt in range(retries + 1):
+            can_retry = attempt < retries
+            wait_time = _provider_wait_time()
+            if wait_time:
+                await asyncio.sleep(wait_time)
+            
+            retry_after = None
+            try:
+                request = client.build_request(
+                    method, url, headers=headers, json=data, timeout=self.timeout
+                )
+                response = await client.send(request, stream=True)
+            except httpx.TimeoutException:
+                if not can_retry:
+                    logger.error("provider_fetch_fail: Timeout after retries")
+                    raise ProviderError("Timeout ao buscar nota fiscal após tentativas")
+                reason = "Timeout"
+            except httpx.HTTPError as e:
+                if not can_retry:
+                    logger.error("provider_fetch_fail: %s", e)
+                    raise ProviderError(f"Erro ao buscar nota fiscal: {str(e)}")
+                reason = f"Request error ({str(e)})"
+            else:
+                if response.status_code not in PROVIDER_RETRY_STATUSES or not can_retry:
+                    try:
+                        self._check_status(response.status_code)
+                        _check_content_length(response.headers)
+                    except ProviderError:
+                        await response.aclose()
+                        raise
+                    return response
+                reason = f"HTTP {response.status_code}"
+                retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+                await response.aclose()
+            
+            wait_time = retry_after
+            if wait_time is None:
+                wait_time = PROVIDER_BACKOFF_FACTOR * (2 ** attempt) + random.uniform(0, PROVIDER_BACKOFF_JITTER)
+            logger.warning("%s, retrying in %ss (attempt %s/%s)", reason, wait_time, attempt + 1, retries + 1)
+            await asyncio.sleep(wait_time)
         
         raise ProviderError("Erro ao buscar nota fiscal após todas as tentativas")
     
@@ -256,47 +817,129 @@ class ProviderClient:
         Retorna dados fake para desenvolvimento.
         Nunca faz requisições reais.
         """
-        logger.info(f"Using fake provider for key: {key[:10]}...")
+        logger.info("Using fake provider for key: %s...", key[:10])
         
-        # Gerar dados fake baseados na chave
-        return {
-            "access_key": key,
-            "store": {
-                "name": "SUPERMERCADO FAKE",
-                "cnpj": "12345678000190"
-            },
-            "total": "125.30",
-            "subtotal": "119.00",
-            "tax": "6.30",
-            "emitted_at": "2024-01-15T10:30:00-03:00",
-            "items": [
-                {
-                    "description": "ARROZ TIPO 1 5KG",
-                    "quantity": 1,
-                    "unit_price": "25.50",
-                    "total_price": "25.50",
-                    "tax_value": "1.20"
-                },
-                {
-                    "description": "FEIJAO PRETO 1KG",
-                    "quantity": 2,
-                    "unit_price": "8.50",
-                    "total_price": "17.00",
-                    "tax_value": "0.85"
-                },
-                {
-                    "description": "ACUCAR CRISTAL 1KG",
-                    "quantity": 1,
-                    "unit_price": "4.80",
-                    "total_price": "4.80",
-                    "tax_value": "0.24"
-                }
-            ]
-        }
+        # Cópia rasa do modelo: store/items são compartilhados (somente leitura)
+        return {**_FAKE_NOTE_TEMPLATE, "access_key": key}
+    
+    def _use_fake(self) -> bool:
+        """Modo fake ou modo DEV_REAL: retornar dados fake sem fazer requisições."""
+        dev_real_mode = False
+        try:
+            dev_real_mode = bool(getattr(settings, "DEV_REAL_MODE", False))
+        except Exception:
+            dev_real_mode = False
+        return self.provider_name == "fake" or dev_real_mode
+    
+    def _fake_data_for_key(self, key: str) -> Dict[str, Any]:
+        """Dados fake para uma chave (ou uma chave fake, se inválida)."""
+        if not key or not _is_access_key(key):
+            fake_key = "352001" + ("0" * 38)
+            return self._get_fake_data(fake_key)
+        return self._get_fake_data(key)
+    
+    def _endpoint_for_key(self, key: str) -> str:
+        """
+        Valida configuração e chave e monta a URL do endpoint do provider.
+        """
+        # Modo real: validar configuração
+        if not self.api_url or not self.app_key or not self.app_secret:
+            raise ProviderError("Provider não configurado. Configure PROVIDER_API_URL, PROVIDER_APP_KEY e PROVIDER_APP_SECRET")
+        
+        logger.info("Fetching note by key: %s... (provider: %s)", key[:10], self.provider_name)
+        
+        # Validar chave (44 dígitos)
+        if not _is_access_key(key):
+            raise ProviderError(f"Chave de acesso inválida: deve ter 44 dígitos")
+        
+        # Construir URL do endpoint
+        return self._spec["path"].format(base=self._base_url, key=key)
+    
+    def _parse_response(self, response, content: Optional[bytes] = None) -> Dict[str, Any]:
+        """
+        Converte a resposta do provider (requests ou httpx) em dict.
+        `content` é o corpo já lido (caminho assíncrono); sem ele, o corpo é
+        lido da resposta com o limite PROVIDER_MAX_RESPONSE_BYTES.
+        """
+        content_type = response.headers.get("Content-Type", "").lower()
+        
+        # XML declarado em resposta requests com stream=True: parse direto do
+        # socket, sem juntar o corpo em bytes
+        if "xml" in content_type and isinstance(response, requests.Response):
+            logger.info("provider_fetch_ok: Key (XML)")
+            response.raw.decode_content = True
+            return _parse_note_xml(_LimitedReader(response.raw))
+        
+        if content is None:
+            if isinstance(response, requests.Response):
+                content = _join_limited(response.iter_content(chunk_size=65536))
+            else:
+                content = response.content
+        
+        # Se for XML, converter para dict. O prefixo dos bytes só é inspecionado
+        # quando o content-type não decide (evita decodificar o corpo inteiro)
+        if "xml" in content_type or ("json" not in content_type and _looks_like_xml(content)):
+            logger.info("provider_fetch_ok: Key (XML)")
+            return _parse_note_xml(content)
+        
+        # Se for JSON, processar
+        try:
+            json_data = _json_loads(content)
+        except ValueError:
+            # Não é JSON válido
+            logger.warning("Response não é JSON válido, retornando como texto")
+            return {"raw": content.decode(response.encoding or "utf-8", errors="replace")}
+        
+        # Verificar formato de resposta do Webmania/Oobj
+        if isinstance(json_data, dict):
+            # Verificar se há campo "erro" ou "sucesso"
+            if "erro" in json_data:
+                error_msg = json_data.get("erro", {}).get("mensagem", "Erro desconhecido")
+                error_lower = error_msg.lower()
+                if "não encontrada" in error_lower or "inexistente" in error_lower:
+                    raise ProviderNotFound(f"Nota fiscal não encontrada: {error_msg}")
+                raise ProviderError(f"Erro do provider: {error_msg}")
+            
+            if "retorno" in json_data:
+                # Formato Webmania/Oobj
+                logger.info("provider_fetch_ok: Key (JSON - formato provider)")
+                return json_data
+            
+            # Formato genérico
+            logger.info("provider_fetch_ok: Key (JSON)")
+            return json_data
+        
+        return json_data
+    
+    def _key_from_url(self, url: str) -> str:
+        """
+        Valida a URL (anti-SSRF) e extrai a chave de acesso.
+        """
+        # Modo real: validar URL (anti-SSRF)
+        if not _validate_url(url):
+            logger.error("provider_fetch_fail: URL não permitida (SSRF protection): %s", url)
+            raise ProviderError("URL não permitida por questões de segurança")
+        
+        # Extrair chave de acesso da URL
+        access_key = _extract_key_from_url(url)
+        
+        if not access_key:
+            raise ProviderError("Não foi possível extrair chave de acesso da URL")
+        
+        logger.info("Extracted access key from URL: %s...", access_key[:10])
+        return access_key
+    
+    def _fake_data_for_url(self, url: str) -> Dict[str, Any]:
+        """Dados fake para a chave contida na URL (ou uma chave fake)."""
+        access_key = _extract_key_from_url(url)
+        if not access_key:
+            access_key = "35200112345678901234567890123456789012345678"
+        return self._get_fake_data(access_key)
     
     def fetch_by_key(self, key: str) -> Dict[str, Any]:
         """
         Busca nota fiscal por chave de acesso usando API do provider.
+        Chamadas simultâneas para a mesma chave compartilham uma única busca.
         
         Args:
             key: Chave de acesso da nota fiscal (44 dígitos)
@@ -310,80 +953,116 @@ class ProviderClient:
             ProviderRateLimit: Se exceder rate limit (429)
             ProviderUnauthorized: Se houver erro de autenticação (401/403)
         """
-        # Modo fake ou modo DEV_REAL: retornar dados fake sem fazer requisições.
-        dev_real_mode = False
-        try:
-            dev_real_mode = bool(getattr(settings, "DEV_REAL_MODE", False))
-        except Exception:
-            dev_real_mode = False
-
-        if self.provider_name == "fake" or dev_real_mode:
-            if not key or not re.match(r'^\d{44}$', key):
-                fake_key = "352001" + ("0" * 38)
-                return self._get_fake_data(fake_key)
-            return self._get_fake_data(key)
+        if self._use_fake():
+            return self._fake_data_for_key(key)
         
-        # Modo real: validar configuração
-        if not self.api_url or not self.app_key or not self.app_secret:
-            raise ProviderError("Provider não configurado. Configure PROVIDER_API_URL, PROVIDER_APP_KEY e PROVIDER_APP_SECRET")
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._inflight[key] = future
         
-        logger.info(f"Fetching note by key: {key[:10]}... (provider: {self.provider_name})")
+        if not is_owner:
+            return future.result()
         
-        # Validar chave (44 dígitos)
-        if not re.match(r'^\d{44}$', key):
-            raise ProviderError(f"Chave de acesso inválida: deve ter 44 dígitos")
+        try:
+            data = self._fetch_by_key_uncoalesced(key)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(data)
+            return data
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+    
+    def _fetch_by_key_uncoalesced(self, key: str) -> Dict[str, Any]:
+        """Cache de notas + chamada ao provider para uma chave (fetch_by_key)."""
+        # Valida antes do cache: chave inválida falha sem ida ao Redis
+        endpoint = self._endpoint_for_key(key)
         
-        # Construir URL do endpoint
-        endpoint = f"{self.api_url.rstrip('/')}/{key}"
+        # Nota já buscada recentemente (ou não encontrada há pouco): evita nova
+        # chamada (cobrada) ao provider
+        cache_key = _note_cache_key(self.provider_name, key)
+        cached = _get_cached_note(cache_key)
+        if cached is not None:
+            logger.info("provider_cache_hit: %s...", key[:10])
+            if _is_not_found_entry(cached):
+                raise ProviderNotFound("Nota fiscal não encontrada")
+            return cached
         
         try:
-            response = self._make_request("GET", endpoint)
-            
-            # Processar resposta
-            content_type = response.headers.get("Content-Type", "").lower()
+            response = self._make_request(self._method, endpoint, stream=True)
+            try:
+                data = self._parse_response(response)
+            finally:
+                response.close()
+        except ProviderNotFound:
+            _set_cached_note(cache_key, _NOT_FOUND_ENTRY, settings.PROVIDER_NOT_FOUND_TTL_SECONDS)
+            raise
+        except ProviderError:
+            raise
+        except Exception as e:
+            logger.error("provider_fetch_fail: %s", e, exc_info=True)
+            raise ProviderError(f"Erro ao buscar nota fiscal: {str(e)}")
+        
+        _set_cached_note(cache_key, data)
+        return data
+    
+    async def fetch_by_key_async(self, key: str) -> Dict[str, Any]:
+        """
+        Versão assíncrona de fetch_by_key (não bloqueia o event loop).
+        Várias notas podem ser buscadas em paralelo com asyncio.gather.
+        """
+        if self._use_fake():
+            return self._fake_data_for_key(key)
+        
+        task = self._inflight_async.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_by_key_uncoalesced_async(key))
+            self._inflight_async[key] = task
             
-            # Se for XML, converter para dict
-            if "xml" in content_type or response.text.strip().startswith("<?xml"):
-                logger.info("provider_fetch_ok: Key (XML)")
-                data = xmltodict.parse(response.text)
-                return data
+            def _forget(done: "asyncio.Task") -> None:
+                if self._inflight_async.get(key) is done:
+                    del self._inflight_async[key]
             
-            # Se for JSON, processar
+            task.add_done_callback(_forget)
+        
+        # shield: cancelar um chamador não cancela a busca dos demais
+        return await asyncio.shield(task)
+    
+    async def _fetch_by_key_uncoalesced_async(self, key: str) -> Dict[str, Any]:
+        """Versão assíncrona de _fetch_by_key_uncoalesced."""
+        endpoint = self._endpoint_for_key(key)
+        
+        cache_key = _note_cache_key(self.provider_name, key)
+        cached = await _get_cached_note_async(cache_key)
+        if cached is not None:
+            logger.info("provider_cache_hit: %s...", key[:10])
+            if _is_not_found_entry(cached):
+                raise ProviderNotFound("Nota fiscal não encontrada")
+            return cached
+        
+        try:
+            response = await self._make_request_async(self._method, endpoint)
             try:
-                json_data = response.json()
-                
-                # Verificar formato de resposta do Webmania/Oobj
-                if isinstance(json_data, dict):
-                    # Verificar se há campo "erro" ou "sucesso"
-                    if "erro" in json_data:
-                        error_msg = json_data.get("erro", {}).get("mensagem", "Erro desconhecido")
-                        if "não encontrada" in error_msg.lower() or "inexistente" in error_msg.lower():
-                            raise ProviderNotFound(f"Nota fiscal não encontrada: {error_msg}")
-                        raise ProviderError(f"Erro do provider: {error_msg}")
-                    
-                    if "retorno" in json_data:
-                        # Formato Webmania/Oobj
-                        logger.info("provider_fetch_ok: Key (JSON - formato provider)")
-                        return json_data
-                    
-                    # Formato genérico
-                    logger.info("provider_fetch_ok: Key (JSON)")
-                    return json_data
-                
-                return json_data
-                
-            except ValueError:
-                # Não é JSON válido
-                logger.warning("Response não é JSON válido, retornando como texto")
-                return {"raw": response.text}
-                
-        except (ProviderNotFound, ProviderRateLimit, ProviderUnauthorized):
+                content = await _ajoin_limited(response.aiter_bytes())
+                data = self._parse_response(response, content)
+            finally:
+                await response.aclose()
+        except ProviderNotFound:
+            await _set_cached_note_async(cache_key, _NOT_FOUND_ENTRY, settings.PROVIDER_NOT_FOUND_TTL_SECONDS)
             raise
         except ProviderError:
             raise
         except Exception as e:
-            logger.error(f"provider_fetch_fail: {str(e)}", exc_info=True)
+            logger.error("provider_fetch_fail: %s", e, exc_info=True)
             raise ProviderError(f"Erro ao buscar nota fiscal: {str(e)}")
+        
+        await _set_cached_note_async(cache_key, data)
+        return data
     
     def fetch_by_url(self, url: str) -> Dict[str, Any]:
         """
@@ -400,48 +1079,90 @@ class ProviderClient:
         Raises:
             ProviderError: Se houver erro ao buscar ou processar a nota
         """
-        logger.info(f"Fetching note from URL: {url}")
+        logger.info("Fetching note from URL: %s", url)
         
-        # Modo fake ou modo DEV_REAL
-        try:
-            dev_real_mode = bool(getattr(settings, "DEV_REAL_MODE", False))
-        except Exception:
-            dev_real_mode = False
-
-        if self.provider_name == "fake" or dev_real_mode:
-            access_key = _extract_key_from_url(url)
-            if not access_key:
-                access_key = "35200112345678901234567890123456789012345678"
-            return self._get_fake_data(access_key)
+        if self._use_fake():
+            return self._fake_data_for_url(url)
         
-        # Modo real: validar URL (anti-SSRF)
-        if not _validate_url(url):
-            logger.error(f"provider_fetch_fail: URL não permitida (SSRF protection): {url}")
-            raise ProviderError("URL não permitida por questões de segurança")
+        # Usar fetch_by_key com a chave extraída
+        return self.fetch_by_key(self._key_from_url(url))
+    
+    async def fetch_by_url_async(self, url: str) -> Dict[str, Any]:
+        """
+        Versão assíncrona de fetch_by_url (mesma validação anti-SSRF).
+        """
+        logger.info("Fetching note from URL: %s", url)
         
-        # Extrair chave de acesso da URL
-        access_key = _extract_key_from_url(url)
+        if self._use_fake():
+            return self._fake_data_for_url(url)
         
-        if not access_key:
-            raise ProviderError("Não foi possível extrair chave de acesso da URL")
+        return await self.fetch_by_key_async(self._key_from_url(url))
+    
+    async def fetch_many(
+        self,
+        keys: List[str],
+        concurrency: int = PROVIDER_FETCH_CONCURRENCY
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """
+        Busca várias notas por chave em paralelo (asyncio.gather), com no
+        máximo `concurrency` requisições ao provider ao mesmo tempo.
         
-        # Usar fetch_by_key com a chave extraída
-        logger.info(f"Extracted access key from URL: {access_key[:10]}...")
-        return self.fetch_by_key(access_key)
-
-
-# Instância global do cliente
-_client_instance: Optional[ProviderClient] = None
+        Args:
+            keys: Chaves de acesso
+            concurrency: Limite de requisições simultâneas
+            
+        Returns:
+            Lista na mesma ordem de `keys`: dict da nota ou a exceção
+            (ProviderError e subclasses) daquela chave, sem abortar o lote
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def fetch_one(key: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.fetch_by_key_async(key)
+        
+        return await asyncio.gather(*(fetch_one(key) for key in keys), return_exceptions=True)
+    
+    async def prefetch(
+        self,
+        keys: List[str],
+        concurrency: int = PROVIDER_FETCH_CONCURRENCY
+    ) -> int:
+        """
+        Aquece o cache de notas para as chaves informadas (ex.: lote de notas
+        enviado pelo usuário). Cada nota é gravada no cache assim que chega
+        (asyncio.as_completed), e o fetch_by_key posterior não vai à rede.
+        Erros por chave são apenas logados.
+        
+        Returns:
+            Quantidade de notas buscadas com sucesso
+        """
+        if settings.PROVIDER_CACHE_TTL_SECONDS <= 0:
+            return 0
+        
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def fetch_one(key: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.fetch_by_key_async(key)
+        
+        warmed = 0
+        for future in asyncio.as_completed([fetch_one(key) for key in dict.fromkeys(keys)]):
+            try:
+                await future
+                warmed += 1
+            except ProviderError as e:
+                logger.warning("provider_prefetch_fail: %s", e)
+        return warmed
 
 
+@lru_cache(maxsize=1)
 def get_provider_client() -> ProviderClient:
     """
     Retorna instância singleton do ProviderClient.
+    Para recarregar credenciais/config do provider: get_provider_client.cache_clear().
     """
-    global _client_instance
-    if _client_instance is None:
-        _client_instance = ProviderClient()
-    return _client_instance
+    return ProviderClient()
 
 
 # Funções de compatibilidade (mantidas para não quebrar código existente)
@@ -453,3 +1174,23 @@ def fetch_by_key(key: str) -> Dict[str, Any]:
 def fetch_by_url(url: str) -> Dict[str, Any]:
     """Wrapper para compatibilidade"""
     return get_provider_client().fetch_by_url(url)
+
+
+async def fetch_by_key_async(key: str) -> Dict[str, Any]:
+    """Busca nota por chave sem bloquear o event loop"""
+    return await get_provider_client().fetch_by_key_async(key)
+
+
+async def fetch_by_url_async(url: str) -> Dict[str, Any]:
+    """Busca nota por URL sem bloquear o event loop"""
+    return await get_provider_client().fetch_by_url_async(url)
+
+
+async def fetch_many(keys: List[str]) -> List[Union[Dict[str, Any], Exception]]:
+    """Busca várias notas por chave em paralelo (concorrência limitada)"""
+    return await get_provider_client().fetch_many(keys)
+
+
+async def prefetch(keys: List[str]) -> int:
+    """Aquece o cache de notas para um lote de chaves"""
+    return await get_provider_client().prefetch(keys)
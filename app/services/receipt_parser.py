@@ -5,10 +5,84 @@ import re
 import logging
 from datetime import datetime
 from decimal import Decimal
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Sequence
 
 logger = logging.getLogger(__name__)
 
+# Tudo exceto dígitos e ponto (_safe_decimal, chamado por campo de cada item)
+_NON_NUMERIC_RE = re.compile(r'[^\d.]')
+
+# Data brasileira dd/mm/aaaa, com hora HH:MM:SS opcional
+_BR_DATETIME_RE = re.compile(r'(\d{2})/(\d{2})/(\d{4})(?: (\d{2}):(\d{2}):(\d{2}))?')
+
+
+# Chave de acesso: caminhos tentados em ordem de prioridade
+_ACCESS_KEY_PATHS = (
+    ("@Id",),
+    ("infNFe", "@Id"),
+    ("ide", "chNFe"),
+    ("chave",),
+    ("access_key",),
+)
+
+# Data de emissão: caminhos tentados em ordem de prioridade
+_EMITTED_AT_PATHS = (
+    ("ide", "dhEmi"),
+    ("ide", "dEmi"),
+    ("emitted_at",),
+    ("dataEmissao",),
+)
+
+# Nome da loja: caminhos tentados em ordem de prioridade
+_STORE_NAME_PATHS = (
+    ("emit", "xNome"),
+    ("emit", "xFant"),
+    ("store_name",),
+    ("nomeEmitente",),
+)
+
+# CNPJ da loja: caminhos tentados em ordem de prioridade
+_STORE_CNPJ_PATHS = (
+    ("emit", "CNPJ"),
+    ("emit", "cnpj"),
+    ("store_cnpj",),
+    ("cnpjEmitente",),
+)
+
+# Valor total: caminhos tentados em ordem de prioridade
+_TOTAL_PATHS = (
+    ("total", "ICMSTot", "vNF"),
+    ("total", "ICMSTot", "vProd"),
+    ("total", "vNF"),
+    ("total_value",),
+    ("valorTotal",),
+)
+
+# Subtotal: caminhos tentados em ordem de prioridade
+_SUBTOTAL_PATHS = (
+    ("total", "ICMSTot", "vProd"),
+    ("total", "vProd"),
+    ("subtotal",),
+    ("valorProdutos",),
+)
+
+# Impostos: caminhos tentados em ordem de prioridade
+_TAX_PATHS = (
+    ("total", "ICMSTot", "vTotTrib"),
+    ("total", "ICMSTot", "vIPI"),
+    ("total", "vTotTrib"),
+    ("total_tax",),
+    ("valorImpostos",),
+)
+
+# Lista de itens: caminhos tentados em ordem de prioridade
+_ITEMS_PATHS = (
+    ("det",),
+    ("dets", "det"),
+    ("items",),
+    ("produtos",),
+)
+
 
 def parse_note(raw: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -87,8 +161,11 @@ def _safe_decimal(value: Any) -> Decimal:
         # Remover caracteres não numéricos exceto ponto e vírgula
         str_value = str(value).strip()
         str_value = str_value.replace(",", ".")
+        # Caso comum (ex.: "12.50"): já é número limpo, dispensa o regex
+        if str_value.replace(".", "", 1).isdigit():
+            return Decimal(str_value)
         # Remover tudo exceto números e ponto
-        str_value = re.sub(r'[^\d.]', '', str_value)
+        str_value = _NON_NUMERIC_RE.sub('', str_value)
         if not str_value:
             return Decimal("0")
         return Decimal(str_value)
@@ -97,6 +174,47 @@ def _safe_decimal(value: Any) -> Decimal:
         return Decimal("0")
 
 
+_ZERO = Decimal("0")
+_ONE = Decimal("1")
+
+
+def _to_decimal(value: Any, default: Decimal = _ZERO) -> Decimal:
+    """
+    Converte valor numérico de item para Decimal sem cópias desnecessárias:
+    Decimal é devolvido como está e str vai direto ao construtor.
+    """
+    if value is None:
+        return default
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(value if isinstance(value, str) else str(value))
+
+
+def _first(data: Dict[str, Any], keys: Sequence[str], default: Any = None) -> Any:
+    """
+    Primeiro valor presente entre `keys` (None e "" contam como ausentes).
+    Diferente de `a or b`, preserva 0 vindo do provider.
+    """
+    for key in keys:
+        value = data.get(key)
+        if value is not None and value != "":
+            return value
+    return default
+
+
+def _parse_br_datetime(value: str, fmt: str) -> datetime:
+    """
+    Converte data no formato brasileiro (`fmt` de strptime) montando o datetime
+    direto dos campos; strptime reinterpreta o formato a cada chamada e só é
+    usado quando o texto foge de dd/mm/aaaa[ HH:MM:SS].
+    """
+    match = _BR_DATETIME_RE.fullmatch(value)
+    if match is None or (match.group(4) is None) != (fmt == "%d/%m/%Y"):
+        return datetime.strptime(value, fmt)
+    day, month, year, hour, minute, second = match.groups(default="0")
+    return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second))
+
+
 def _parse_provider_format(raw: Dict[str, Any]) -> Dict[str, Any]:
     """
     Parseia formato real do Webmania/Oobj:
@@ -115,23 +233,23 @@ def _parse_provider_format(raw: Dict[str, Any]) -> Dict[str, Any]:
         raise ValueError("Formato de resposta do provider inválido: campo 'retorno' não encontrado")
     
     # Extrair chave de acesso
-    access_key = retorno.get("chave") or retorno.get("chave_acesso") or ""
-    if not access_key or len(str(access_key)) != 44:
+    access_key = str(_first(retorno, ("chave", "chave_acesso"), ""))
+    if len(access_key) != 44 or not access_key.isdigit():
         raise ValueError("Chave de acesso inválida ou não encontrada")
     
     # Extrair emitente
     emitente = retorno.get("emitente", {})
-    store_name = emitente.get("razao_social") or emitente.get("nome") or "Loja não identificada"
-    store_cnpj = emitente.get("cnpj") or emitente.get("CNPJ") or ""
+    store_name = _first(emitente, ("razao_social", "nome"), "Loja não identificada")
+    store_cnpj = _first(emitente, ("cnpj", "CNPJ"), "")
     
     # Extrair data de emissão
-    data_emissao_str = retorno.get("data_emissao") or retorno.get("dataEmissao") or retorno.get("dhEmi") or ""
+    data_emissao_str = _first(retorno, ("data_emissao", "dataEmissao", "dhEmi"), "")
     try:
         if data_emissao_str:
             if "T" in data_emissao_str:
                 emitted_at = datetime.fromisoformat(data_emissao_str.replace("Z", "+00:00"))
             elif "/" in data_emissao_str:
-                emitted_at = datetime.strptime(data_emissao_str, "%d/%m/%Y %H:%M:%S")
+                emitted_at = _parse_br_datetime(data_emissao_str, "%d/%m/%Y %H:%M:%S")
             else:
                 emitted_at = datetime.fromisoformat(data_emissao_str)
         else:
@@ -150,13 +268,13 @@ def _parse_provider_format(raw: Dict[str, Any]) -> Dict[str, Any]:
     
     for produto in produtos:
         try:
-            descricao = str(produto.get("descricao") or produto.get("desc") or "Produto não identificado")
+            descricao = str(_first(produto, ("descricao", "desc"), "Produto não identificado"))
             
             # Converter valores para Decimal com segurança
-            quantidade = _safe_decimal(produto.get("quantidade") or produto.get("qtd") or "1")
-            valor_unitario = _safe_decimal(produto.get("valor_unitario") or produto.get("preco_unitario") or "0")
-            valor_total = _safe_decimal(produto.get("valor_total") or produto.get("preco_total") or "0")
-            valor_imposto = _safe_decimal(produto.get("valor_imposto") or produto.get("imposto") or "0")
+            quantidade = _safe_decimal(_first(produto, ("quantidade", "qtd"), "1"))
+            valor_unitario = _safe_decimal(_first(produto, ("valor_unitario", "preco_unitario"), "0"))
+            valor_total = _safe_decimal(_first(produto, ("valor_total", "preco_total"), "0"))
+            valor_imposto = _safe_decimal(_first(produto, ("valor_imposto", "imposto"), "0"))
             
             # Se valor_total não estiver presente, calcular
             if valor_total == 0 and quantidade > 0 and valor_unitario > 0:
@@ -168,7 +286,7 @@ def _parse_provider_format(raw: Dict[str, Any]) -> Dict[str, Any]:
                 "unit_price": valor_unitario,
                 "total_price": valor_total,
                 "tax_value": valor_imposto,
-                "barcode": produto.get("codigo_barras") or produto.get("ean") or None
+                "barcode": _first(produto, ("codigo_barras", "ean"))
             })
             
             subtotal += valor_total
@@ -220,7 +338,7 @@ def _parse_fake_format(raw: Dict[str, Any]) -> Dict[str, Any]:
     emitted_at_str = raw.get("emitted_at", "")
     try:
         emitted_at = datetime.fromisoformat(emitted_at_str.replace("Z", "+00:00"))
-    except:
+    except (ValueError, AttributeError):
         emitted_at = datetime.now()
     
     return {
@@ -251,45 +369,37 @@ def _normalize_structure(data: Dict[str, Any]) -> Dict[str, Any]:
 
 def _extract_access_key(data: Dict[str, Any]) -> str:
     """Extrai a chave de acesso da nota"""
-    paths = [
-        ["@Id"],
-        ["infNFe", "@Id"],
-        ["ide", "chNFe"],
-        ["chave"],
-        ["access_key"],
-    ]
-    
-    for path in paths:
+    for path in _ACCESS_KEY_PATHS:
         value = _get_nested_value(data, path)
-        if value:
-            if isinstance(value, str) and value.startswith("NFe"):
-                value = value[3:]
-            if len(str(value)) == 44:
-                return str(value)
+        if not value:
+            continue
+        if not isinstance(value, str):
+            value = str(value)
+        # Filtra pelo tamanho antes de fatiar: "NFe" + 44 dígitos (Id da infNFe)
+        if len(value) == 47 and value.startswith("NFe"):
+            return value[3:]
+        if len(value) == 44 and not value.startswith("NFe"):
+            return value
     
     return ""
 
 
 def _extract_emitted_at(data: Dict[str, Any]) -> datetime:
     """Extrai a data de emissão"""
-    paths = [
-        ["ide", "dhEmi"],
-        ["ide", "dEmi"],
-        ["emitted_at"],
-        ["dataEmissao"],
-    ]
-    
-    for path in paths:
+    for path in _EMITTED_AT_PATHS:
         value = _get_nested_value(data, path)
         if value:
             try:
-                if isinstance(value, str):
-                    if "T" in value:
-                        return datetime.fromisoformat(value.replace("Z", "+00:00"))
-                    if "/" in value:
-                        return datetime.strptime(value, "%d/%m/%Y")
-                return datetime.fromisoformat(str(value))
-            except:
+                if not isinstance(value, str):
+                    return datetime.fromisoformat(str(value))
+                # Caso dominante: dhEmi em ISO 8601 (Python 3.11 já aceita "Z")
+                try:
+                    return datetime.fromisoformat(value)
+                except ValueError:
+                    if "/" not in value:
+                        raise
+                return _parse_br_datetime(value, "%d/%m/%Y")
+            except (ValueError, TypeError):
                 continue
     
     return datetime.now()
@@ -297,14 +407,7 @@ def _extract_emitted_at(data: Dict[str, Any]) -> datetime:
 
 def _extract_store_name(data: Dict[str, Any]) -> str:
     """Extrai o nome da loja"""
-    paths = [
-        ["emit", "xNome"],
-        ["emit", "xFant"],
-        ["store_name"],
-        ["nomeEmitente"],
-    ]
-    
-    for path in paths:
+    for path in _STORE_NAME_PATHS:
         value = _get_nested_value(data, path)
         if value:
             return str(value)
@@ -314,14 +417,7 @@ def _extract_store_name(data: Dict[str, Any]) -> str:
 
 def _extract_store_cnpj(data: Dict[str, Any]) -> str:
     """Extrai o CNPJ da loja"""
-    paths = [
-        ["emit", "CNPJ"],
-        ["emit", "cnpj"],
-        ["store_cnpj"],
-        ["cnpjEmitente"],
-    ]
-    
-    for path in paths:
+    for path in _STORE_CNPJ_PATHS:
         value = _get_nested_value(data, path)
         if value:
             return str(value)
@@ -331,46 +427,23 @@ def _extract_store_cnpj(data: Dict[str, Any]) -> str:
 
 def _extract_totals(data: Dict[str, Any]) -> tuple[Decimal, Decimal, Decimal]:
     """Extrai totais (subtotal, total, impostos)"""
-    paths_total = [
-        ["total", "ICMSTot", "vNF"],
-        ["total", "ICMSTot", "vProd"],
-        ["total", "vNF"],
-        ["total_value"],
-        ["valorTotal"],
-    ]
-    
-    paths_subtotal = [
-        ["total", "ICMSTot", "vProd"],
-        ["total", "vProd"],
-        ["subtotal"],
-        ["valorProdutos"],
-    ]
-    
-    paths_tax = [
-        ["total", "ICMSTot", "vTotTrib"],
-        ["total", "ICMSTot", "vIPI"],
-        ["total", "vTotTrib"],
-        ["total_tax"],
-        ["valorImpostos"],
-    ]
-    
     total_value = Decimal("0")
     subtotal = Decimal("0")
     total_tax = Decimal("0")
     
-    for path in paths_total:
+    for path in _TOTAL_PATHS:
         value = _get_nested_value(data, path)
         if value:
             total_value = Decimal(str(value))
             break
     
-    for path in paths_subtotal:
+    for path in _SUBTOTAL_PATHS:
         value = _get_nested_value(data, path)
         if value:
             subtotal = Decimal(str(value))
             break
     
-    for path in paths_tax:
+    for path in _TAX_PATHS:
         value = _get_nested_value(data, path)
         if value:
             total_tax = Decimal(str(value))
@@ -386,15 +459,8 @@ def _extract_items(data: Dict[str, Any]) -> List[Dict[str, Any]]:
     """Extrai os itens da nota"""
     items = []
     
-    det_paths = [
-        ["det"],
-        ["dets", "det"],
-        ["items"],
-        ["produtos"],
-    ]
-    
     det_list = None
-    for path in det_paths:
+    for path in _ITEMS_PATHS:
         det_list = _get_nested_value(data, path)
         if det_list:
             break
@@ -416,25 +482,24 @@ def _extract_items(data: Dict[str, Any]) -> List[Dict[str, Any]]:
                 "Produto não identificado"
             )
             
-            quantity = Decimal(str(prod.get("qCom", prod.get("quantidade", "1"))))
-            unit_price = Decimal(str(prod.get("vUnCom", prod.get("precoUnitario", "0"))))
-            total_price = Decimal(str(prod.get("vProd", prod.get("valorTotal", "0"))))
+            quantity = _to_decimal(_first(prod, ("qCom", "quantidade")), _ONE)
+            unit_price = _to_decimal(_first(prod, ("vUnCom", "precoUnitario")))
+            total_price = _to_decimal(_first(prod, ("vProd", "valorTotal")))
             
-            tax_value = Decimal("0")
-            if isinstance(det, dict):
-                imp = det.get("imposto", {})
-                if imp:
-                    ipi = imp.get("IPI", {})
-                    if ipi:
-                        ipi_tot = ipi.get("IPITrib", {}) or ipi.get("IPINT", {})
-                        if ipi_tot:
-                            tax_value += Decimal(str(ipi_tot.get("vIPI", "0")))
-                    
-                    icms = imp.get("ICMS", {})
-                    if isinstance(icms, dict):
-                        icms_val = icms.get("vICMS", "0")
-                        if icms_val:
-                            tax_value += Decimal(str(icms_val))
+            tax_value = _ZERO
+            imp = det.get("imposto") if isinstance(det, dict) else None
+            if imp:
+                ipi = imp.get("IPI")
+                if ipi:
+                    ipi_tot = ipi.get("IPITrib") or ipi.get("IPINT")
+                    if ipi_tot:
+                        tax_value += _to_decimal(ipi_tot.get("vIPI"))
+                
+                icms = imp.get("ICMS")
+                if isinstance(icms, dict):
+                    icms_val = icms.get("vICMS")
+                    if icms_val:
+                        tax_value += _to_decimal(icms_val)
             
             items.append({
                 "description": str(description),
@@ -450,7 +515,7 @@ def _extract_items(data: Dict[str, Any]) -> List[Dict[str, Any]]:
     return items
 
 
-def _get_nested_value(data: Dict[str, Any], path: List[str]) -> Any:
+def _get_nested_value(data: Dict[str, Any], path: Sequence[str]) -> Any:
     """Obtém valor aninhado de um dict usando caminho"""
     current = data
     for key in path:
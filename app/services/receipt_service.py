@@ -3,14 +3,14 @@ Service para gerenciar receipts (notas fiscais)
 """
 import logging
 import hashlib
-from typing import Optional
+from typing import List, Optional, Sequence, Tuple
 from uuid import UUID
 from sqlalchemy.orm import Session
 from app.models.receipt import Receipt
 from app.models.receipt_item import ReceiptItem
 from app.models.product import Product
 from app.utils.encryption import encrypt_sensitive_data
-from app.services.product_matcher import get_or_create_product_from_item
+from app.services.product_matcher import get_or_create_product_from_item, get_or_create_products
 
 logger = logging.getLogger(__name__)
 
@@ -59,6 +59,11 @@ def check_receipt_exists(
     ).first()
 
 
+def qr_text_hash(qr_text: str) -> str:
+    """Hash (sha256 hex) do QR em claro, gravado em Receipt.qr_hash."""
+    return hashlib.sha256(qr_text.encode()).hexdigest()
+
+
 def check_qr_text_exists(
     db: Session,
     qr_text: str
@@ -66,22 +71,46 @@ def check_qr_text_exists(
     """
     Verifica se um QR text já foi processado (idempotência por hash do QR).
     """
-    qr_hash = hashlib.sha256(qr_text.encode()).hexdigest()
-    
-    # Buscar por raw_qr_text (precisa descriptografar para comparar)
-    # Por simplicidade, vamos usar hash direto no banco
-    # Em produção, pode criar uma coluna qr_hash
-    receipts = db.query(Receipt).all()
-    for receipt in receipts:
-        try:
-            from app.utils.encryption import decrypt_sensitive_data
-            decrypted = decrypt_sensitive_data(receipt.raw_qr_text)
-            if hashlib.sha256(decrypted.encode()).hexdigest() == qr_hash:
-                return receipt
-        except:
-            continue
-    
-    return None
+    return db.query(Receipt).filter(Receipt.qr_hash == qr_text_hash(qr_text)).first()
+
+
+def _new_receipt(user_id: UUID, parsed_data: dict, raw_qr_text: str, qr_hash: str) -> Receipt:
+    """Monta o Receipt (QR criptografado) a partir da nota parseada."""
+    # Nota: xml_raw não é salvo no modelo Receipt atual, apenas raw_qr_text
+    return Receipt(
+        user_id=user_id,
+        access_key=parsed_data["access_key"],
+        raw_qr_text=encrypt_sensitive_data(raw_qr_text),
+        qr_hash=qr_hash,
+        total_value=parsed_data["total_value"],
+        subtotal=parsed_data["subtotal"],
+        total_tax=parsed_data["total_tax"],
+        emitted_at=parsed_data["emitted_at"],
+        store_name=parsed_data["store_name"],
+        store_cnpj=parsed_data["store_cnpj"],
+    )
+
+
+def _matcher_item(item_data: dict) -> dict:
+    """Campos do item usados pelo product_matcher."""
+    return {
+        "description": item_data["description"],
+        "barcode": item_data.get("barcode"),
+        "category_id": item_data.get("category_id")
+    }
+
+
+def _new_receipt_item(receipt: Receipt, item_data: dict, product_id: UUID) -> ReceiptItem:
+    """Monta o ReceiptItem de um item da nota parseada."""
+    return ReceiptItem(
+        receipt_id=receipt.id,
+        product_id=product_id,
+        description=item_data["description"],
+        quantity=item_data["quantity"],
+        unit_price=item_data["unit_price"],
+        total_price=item_data["total_price"],
+        tax_value=item_data["tax_value"],
+    )
 
 
 def save_receipt(
@@ -95,49 +124,20 @@ def save_receipt(
     Salva um receipt no banco de dados com todos os itens.
     """
     try:
-        # Criptografar dados sensíveis
-        encrypted_qr = encrypt_sensitive_data(raw_qr_text)
-        # Nota: xml_raw não é salvo no modelo Receipt atual, apenas raw_qr_text
-        
-        # Criar receipt
-        receipt = Receipt(
-            user_id=user_id,
-            access_key=parsed_data["access_key"],
-            raw_qr_text=encrypted_qr,
-            total_value=parsed_data["total_value"],
-            subtotal=parsed_data["subtotal"],
-            total_tax=parsed_data["total_tax"],
-            emitted_at=parsed_data["emitted_at"],
-            store_name=parsed_data["store_name"],
-            store_cnpj=parsed_data["store_cnpj"],
-        )
+        receipt = _new_receipt(user_id, parsed_data, raw_qr_text, qr_text_hash(raw_qr_text))
         db.add(receipt)
         db.flush()  # Para obter o ID
         
-        # Criar produtos e itens
-        for item_data in parsed_data["items"]:
-            # Criar ou buscar produto usando product_matcher
-            product_id = get_or_create_product_from_item(
-                db=db,
-                item={
-                    "description": item_data["description"],
-                    "barcode": item_data.get("barcode"),
-                    "category_id": item_data.get("category_id")
-                }
-            )
-            
-            # Criar receipt item
-            receipt_item = ReceiptItem(
-                receipt_id=receipt.id,
-                product_id=product_id,
-                description=item_data["description"],
-                quantity=item_data["quantity"],
-                unit_price=item_data["unit_price"],
-                total_price=item_data["total_price"],
-                tax_value=item_data["tax_value"],
-            )
-            db.add(receipt_item)
+        # Criar produtos e itens na mesma transação do receipt (um único commit);
+        # produtos já existentes são resolvidos em lote
+        product_ids = get_or_create_products(
+            db, [_matcher_item(item_data) for item_data in parsed_data["items"]]
+        )
         
+        db.add_all([
+            _new_receipt_item(receipt, item_data, product_id)
+            for item_data, product_id in zip(parsed_data["items"], product_ids)
+        ])
         db.commit()
         db.refresh(receipt)
         
@@ -149,3 +149,58 @@ def save_receipt(
         logger.error(f"Error saving receipt: {e}")
         raise
 
+
+def save_receipts_bulk(
+    db: Session,
+    user_id: UUID,
+    entries: Sequence[Tuple[dict, str]]
+) -> List[Receipt]:
+    """
+    Salva várias notas do usuário (pares (parsed_data, raw_qr_text)) em uma
+    única transação: um flush para todos os receipts, produtos de todas as
+    notas resolvidos em um só get_or_create_products e um commit no fim.
+    O número de round-trips não cresce com o número de notas.
+    
+    Nota repetida dentro do lote (mesmo QR, ou QRs diferentes com a mesma
+    access_key, ex.: URL e chave) é gravada uma vez; a idempotência contra notas
+    já salvas (check_qr_text_exists / check_receipt_exists) fica com o chamador,
+    como em save_receipt. Tudo ou nada: em erro, nenhuma nota é salva.
+    """
+    try:
+        batch = []
+        seen_hashes = set()
+        seen_access_keys = set()
+        for parsed_data, raw_qr_text in entries:
+            qr_hash = qr_text_hash(raw_qr_text)
+            access_key = parsed_data["access_key"]
+            if qr_hash in seen_hashes or access_key in seen_access_keys:
+                continue
+            seen_hashes.add(qr_hash)
+            seen_access_keys.add(access_key)
+            batch.append((_new_receipt(user_id, parsed_data, raw_qr_text, qr_hash), parsed_data["items"]))
+        
+        if not batch:
+            return []
+        
+        db.add_all([receipt for receipt, _ in batch])
+        db.flush()  # Para obter os IDs
+        
+        product_ids = iter(get_or_create_products(
+            db, [_matcher_item(item_data) for _, items in batch for item_data in items]
+        ))
+        
+        db.add_all([
+            _new_receipt_item(receipt, item_data, next(product_ids))
+            for receipt, items in batch
+            for item_data in items
+        ])
+        db.commit()
+        
+        receipts = [receipt for receipt, _ in batch]
+        logger.info("receipts_saved: %d", len(receipts))
+        return receipts
+        
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error saving receipts in bulk: {e}")
+        raise
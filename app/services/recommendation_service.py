@@ -3,16 +3,19 @@ Serviço de recomendações de economia usando IA básica.
 Analisa gastos do usuário e sugere alternativas mais baratas.
 """
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Tuple
 from uuid import UUID
 from datetime import datetime, timedelta
 from decimal import Decimal
+import numpy as np
+from rapidfuzz import process, fuzz
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_
 from app.models.receipt_item import ReceiptItem
 from app.models.receipt import Receipt
 from app.models.product import Product
 from app.services.product_matcher import normalize_name, fuzzy_match_name
+from app.services.savings_cache import get_cached_suggestions, set_cached_suggestions
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +23,8 @@ logger = logging.getLogger(__name__)
 def generate_savings_suggestions(
     db: Session,
     user_id: UUID,
-    limit: int = 3
+    limit: int = 3,
+    use_cache: bool = True
 ) -> List[Dict[str, Any]]:
     """
     Gera sugestões de economia baseadas nos gastos do usuário.
@@ -35,10 +39,17 @@ def generate_savings_suggestions(
         db: Sessão do banco de dados
         user_id: ID do usuário
         limit: Número máximo de sugestões a retornar
+        use_cache: Se deve usar cache (por usuário e dia, invalidado ao salvar notas)
         
     Returns:
         Lista de sugestões com rationale e economia estimada
     """
+    if use_cache:
+        cached = get_cached_suggestions(user_id, "recommendation", limit)
+        if cached is not None:
+            logger.info("Using cached savings suggestions for user %s", user_id)
+            return cached
+    
     logger.info(f"Generating savings suggestions for user: {user_id}")
     
     # 1. Buscar top produtos mais comprados (últimos 90 dias)
@@ -67,22 +78,21 @@ def generate_savings_suggestions(
         logger.info(f"No purchase history found for user: {user_id}")
         return []
     
+    # 2. Buscar alternativas mais baratas para todos os produtos top de uma vez
+    alternatives = _find_cheaper_alternatives(
+        db=db,
+        items=[(item.description, float(item.avg_unit_price)) for item in top_items]
+    )
+    
     suggestions = []
     
-    # 2. Para cada produto top, buscar alternativas mais baratas
     for item in top_items:
         description = item.description
         avg_price = float(item.avg_unit_price)
         total_quantity = float(item.total_quantity)
         purchase_count = item.purchase_count
         
-        # Buscar produtos similares no catálogo
-        alternative = _find_cheaper_alternative(
-            db=db,
-            product_name=description,
-            current_price=avg_price,
-            user_id=user_id
-        )
+        alternative = alternatives.get(description)
         
         if alternative:
             # Calcular economia
@@ -113,106 +123,95 @@ def generate_savings_suggestions(
     suggestions.sort(key=lambda x: x['estimated_monthly_savings'], reverse=True)
     
     # Retornar top N sugestões
-    return suggestions[:limit]
+    suggestions = suggestions[:limit]
+    
+    if use_cache:
+        set_cached_suggestions(user_id, "recommendation", limit, suggestions)
+    
+    return suggestions
 
 
-def _find_cheaper_alternative(
+def _find_cheaper_alternatives(
     db: Session,
-    product_name: str,
-    current_price: float,
-    user_id: UUID
-) -> Optional[Dict[str, Any]]:
+    items: List[Tuple[str, float]]
+) -> Dict[str, Dict[str, Any]]:
     """
-    Busca um produto alternativo mais barato no catálogo.
+    Busca, para cada produto, uma alternativa mais barata no catálogo.
+    O catálogo é carregado uma vez, a similaridade de todos os produtos é
+    calculada em um único cdist e os preços médios vêm de uma única query.
     
     Args:
         db: Sessão do banco
-        product_name: Nome do produto atual
-        current_price: Preço atual do produto
-        user_id: ID do usuário (para filtrar produtos já comprados)
+        items: Pares (descrição, preço médio atual) dos produtos do usuário
         
     Returns:
-        Dict com nome, preço e confiança da alternativa, ou None
+        Dict descrição -> {nome, preço, confiança} da melhor alternativa
+        (descrições sem alternativa ficam de fora)
     """
-    # Normalizar nome do produto
-    normalized = normalize_name(product_name)
-    
-    # Buscar todos os produtos no catálogo
-    all_products = db.query(Product).all()
+    if not items:
+        return {}
     
-    if not all_products:
-        return None
+    # Buscar nomes do catálogo (sem carregar entidades completas)
+    catalog = db.query(Product.id, Product.normalized_name).all()
     
-    # Buscar preços médios de cada produto (baseado em compras de todos os usuários)
-    product_prices = {}
+    if not catalog:
+        return {}
     
-    for product in all_products:
-        # Buscar preço médio deste produto
-        avg_price_result = db.query(
-            func.avg(ReceiptItem.unit_price)
-        ).join(
-            Receipt, ReceiptItem.receipt_id == Receipt.id
-        ).filter(
-            and_(
-                ReceiptItem.product_id == product.id,
-                ReceiptItem.description.ilike(f"%{product.normalized_name}%")
-            )
-        ).scalar()
-        
-        if avg_price_result:
-            product_prices[product.id] = {
-                'name': product.normalized_name,
-                'price': float(avg_price_result)
-            }
+    # Similaridade de todos os produtos contra todo o catálogo em uma única
+    # chamada vetorizada; score_cutoff zera os pares abaixo do threshold (70 = 0.7)
+    scores = process.cdist(
+        [normalize_name(description) for description, _ in items],
+        [name for _, name in catalog],
+        scorer=fuzz.WRatio,
+        score_cutoff=70,
+    )
+    rows, cols = np.nonzero(scores)
     
-    # Buscar produtos similares usando fuzzy matching
-    similar_products = []
+    if not len(cols):
+        return {}
     
-    for product in all_products:
-        # Verificar similaridade
-        similarity = _calculate_similarity(normalized, product.normalized_name)
-        
-        if similarity >= 0.7:  # Threshold de similaridade
-            # Buscar preço médio
-            price_info = product_prices.get(product.id)
-            
-            if price_info:
-                price = price_info['price']
-                
-                # Só considerar se for mais barato (pelo menos 5% mais barato)
-                if price < current_price * 0.95:
-                    similar_products.append({
-                        'name': product.normalized_name,
-                        'price': price,
-                        'similarity': similarity,
-                        'product_id': product.id
-                    })
+    # Preço médio apenas dos candidatos (compras de todos os usuários), em uma query
+    # (product_id já identifica o produto: dispensa join e ILIKE na descrição)
+    avg_prices = dict(db.query(
+        ReceiptItem.product_id,
+        func.avg(ReceiptItem.unit_price)
+    ).filter(
+        ReceiptItem.product_id.in_(list({catalog[col].id for col in cols}))
+    ).group_by(
+        ReceiptItem.product_id
+    ).all())
     
-    if not similar_products:
-        return None
+    similar_products = {}
     
-    # Ordenar por preço (mais barato primeiro) e similaridade
-    similar_products.sort(key=lambda x: (x['price'], -x['similarity']))
+    for row, col in zip(rows, cols):
+        product_id, name = catalog[col]
+        avg_price = avg_prices.get(product_id)
+        if not avg_price:
+            continue
+        
+        price = float(avg_price)
+        
+        # Só considerar se for mais barato (pelo menos 5% mais barato)
+        if price < items[row][1] * 0.95:
+            similar_products.setdefault(row, []).append({
+                'name': name,
+                'price': price,
+                'similarity': float(scores[row, col]) / 100.0,
+                'product_id': product_id
+            })
     
-    # Retornar a melhor alternativa
-    best = similar_products[0]
+    alternatives = {}
     
-    return {
-        'name': best['name'],
-        'price': best['price'],
-        'confidence': best['similarity']
-    }
-
-
-def _calculate_similarity(name1: str, name2: str) -> float:
-    """
-    Calcula similaridade entre dois nomes de produtos (0-1).
-    """
-    from rapidfuzz import fuzz
+    for row, candidates in similar_products.items():
+        # Melhor alternativa: mais barata primeiro, depois a mais similar
+        best = min(candidates, key=lambda x: (x['price'], -x['similarity']))
+        alternatives[items[row][0]] = {
+            'name': best['name'],
+            'price': best['price'],
+            'confidence': best['similarity']
+        }
     
-    # Usar WRatio para similaridade flexível
-    similarity = fuzz.WRatio(name1, name2) / 100.0
-    return similarity
+    return alternatives
 
 
 def _estimate_monthly_quantity(total_quantity: float, purchase_count: int) -> float:
@@ -0,0 +1,103 @@
+"""
+Cache de sugestões de economia em Redis, por (usuário, dia), invalidado por usuário
+"""
+import json
+import logging
+from datetime import date, timedelta
+from typing import Any, Iterable, List, Optional
+from uuid import UUID
+from app.database.redis import get_sync_redis
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = "savings"
+CACHE_TTL_SECONDS = 86400
+
+
+def savings_cache_key(user_id: UUID, day: Optional[date] = None) -> str:
+    """
+    Monta a chave Redis (hash) das sugestões do usuário no dia:
+    savings:{user_id}:{YYYY-MM-DD}. Cada dia tem sua chave e seu TTL,
+    então campos de dias anteriores não se acumulam.
+    """
+    return f"{CACHE_KEY_PREFIX}:{user_id}:{(day or date.today()).isoformat()}"
+
+
+def savings_cache_field(source: str, limit: int) -> str:
+    """Campo do hash do dia: {source}:{limit}."""
+    return f"{source}:{limit}"
+
+
+def _live_day_keys(user_id: UUID) -> List[str]:
+    """
+    Chaves do usuário que ainda podem existir: hoje e os dias cobertos pelo
+    TTL (sem SCAN no keyspace a cada nota salva).
+    """
+    today = date.today()
+    days = CACHE_TTL_SECONDS // 86400 + 1
+    return [savings_cache_key(user_id, today - timedelta(days=offset)) for offset in range(days)]
+
+
+def get_cached_suggestions(user_id: UUID, source: str, limit: int) -> Optional[List[Any]]:
+    """
+    Busca sugestões do dia no Redis.
+
+    Returns:
+        Lista de sugestões ou None se não houver cache (ou Redis indisponível)
+    """
+    client = get_sync_redis()
+    if client is None:
+        return None
+
+    try:
+        raw = client.hget(savings_cache_key(user_id), savings_cache_field(source, limit))
+    except Exception as e:
+        logger.warning("Redis unavailable for savings cache read: %s", e)
+        return None
+
+    return json.loads(raw) if raw else None
+
+
+def set_cached_suggestions(user_id: UUID, source: str, limit: int, data: List[Any]) -> bool:
+    """
+    Salva sugestões do dia no Redis (TTL de 1 dia, invalidado por eventos de Receipt).
+    HSET e EXPIRE vão em um único pipeline.
+
+    Returns:
+        True se salvou, False se o Redis estiver indisponível
+    """
+    client = get_sync_redis()
+    if client is None:
+        return False
+
+    key = savings_cache_key(user_id)
+    try:
+        pipe = client.pipeline()
+        pipe.hset(key, savings_cache_field(source, limit), json.dumps(data))
+        pipe.expire(key, CACHE_TTL_SECONDS)
+        pipe.execute()
+        return True
+    except Exception as e:
+        logger.warning("Redis unavailable for savings cache write: %s", e)
+        return False
+
+
+def invalidate_suggestions(user_ids: Iterable[UUID]) -> None:
+    """
+    Remove do Redis as sugestões dos usuários informados (todas as chaves
+    de dia ainda vivas, em um único DEL).
+    Falhas são apenas logadas para não quebrar a transação do chamador.
+    """
+    redis_keys = [key for user_id in user_ids for key in _live_day_keys(user_id)]
+    if not redis_keys:
+        return
+
+    client = get_sync_redis()
+    if client is None:
+        return
+
+    try:
+        client.delete(*redis_keys)
+        logger.debug("Invalidated savings cache keys: %s", redis_keys)
+    except Exception as e:
+        logger.warning("Failed to invalidate savings cache %s: %s", redis_keys, e)
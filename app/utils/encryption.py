@@ -99,6 +99,6 @@ def decrypt_sensitive_data(encrypted_data: str) -> str:
         # Tentar fallback para base64
         try:
             return base64.b64decode(encrypted_data.encode('utf-8')).decode('utf-8')
-        except:
+        except ValueError:  # binascii.Error / UnicodeDecodeError
             return ""
 
@@ -0,0 +1,37 @@
+"""
+Utilitários de normalização de texto (remoção de acentos)
+"""
+import unicodedata
+from typing import Dict
+
+
+def _build_accent_table() -> Dict[int, str]:
+    """
+    Monta tabela de str.translate para remoção de acentos (Latin-1 e Latin Extended-A/B).
+    Equivale a NFD + remoção de marcas combinantes para esses caracteres.
+    """
+    table = {}
+    for codepoint in range(0xC0, 0x250):
+        char = chr(codepoint)
+        nfd = unicodedata.normalize('NFD', char)
+        base = ''.join(c for c in nfd if unicodedata.category(c) != 'Mn')
+        if base != char:
+            table[codepoint] = base
+    return table
+
+
+_ACCENT_TABLE = _build_accent_table()
+
+
+def fold_accents(s: str) -> str:
+    """
+    Remove acentos e converte para minúsculas.
+
+    Usa a tabela pré-calculada (uma passada em C); o caminho NFD só é usado
+    quando sobra algum caractere fora de ASCII.
+    """
+    text = s.translate(_ACCENT_TABLE).lower()
+    if not text.isascii():
+        nfd = unicodedata.normalize('NFD', text)
+        text = ''.join(char for char in nfd if unicodedata.category(char) != 'Mn')
+    return text
@@ -0,0 +1,82 @@
+"""
+Testes do cache de analytics em Redis
+"""
+from datetime import datetime
+from uuid import uuid4
+import pytest
+from app.services import analytics_cache
+from app.services.analytics_cache import (
+    analytics_cache_key,
+    get_cached_summary,
+    set_cached_summary,
+    invalidate_summaries,
+)
+
+
+class FakeRedis:
+    """Redis em memória para testes"""
+
+    def __init__(self):
+        self.store = {}
+        self.ttls = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value, ex=None):
+        self.store[key] = value
+        self.ttls[key] = ex
+
+    def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+
+class BrokenRedis:
+    """Redis indisponível"""
+
+    def get(self, key):
+        raise ConnectionError("redis down")
+
+    set = delete = get
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    client = FakeRedis()
+    monkeypatch.setattr(analytics_cache, "get_sync_redis", lambda: client)
+    return client
+
+
+def test_cache_key_format():
+    """Testa formato da chave analytics:{user_id}:{YYYY-MM}"""
+    user_id = uuid4()
+    assert analytics_cache_key(user_id, "2024-03") == f"analytics:{user_id}:2024-03"
+    assert analytics_cache.month_key_for(datetime(2024, 3, 15)) == "2024-03"
+    assert analytics_cache.affected_month_keys(datetime(2024, 12, 31)) == ("2024-12", "2025-01")
+
+
+def test_set_get_and_invalidate(fake_redis):
+    """Testa que o resumo é salvo, lido e invalidado apenas para o mês afetado"""
+    user_id = uuid4()
+    data = {"total_mes": 10.5, "month": "2024-03"}
+
+    assert set_cached_summary(user_id, "2024-03", data) is True
+    assert set_cached_summary(user_id, "2024-04", data) is True
+    assert get_cached_summary(user_id, "2024-03") == data
+    assert fake_redis.ttls[analytics_cache_key(user_id, "2024-03")] == analytics_cache.CACHE_TTL_SECONDS
+
+    invalidate_summaries({(user_id, "2024-03")})
+
+    assert get_cached_summary(user_id, "2024-03") is None
+    assert get_cached_summary(user_id, "2024-04") == data
+
+
+def test_redis_unavailable_fails_open(monkeypatch):
+    """Testa que falhas do Redis não propagam exceção"""
+    monkeypatch.setattr(analytics_cache, "get_sync_redis", lambda: BrokenRedis())
+    user_id = uuid4()
+
+    assert get_cached_summary(user_id, "2024-03") is None
+    assert set_cached_summary(user_id, "2024-03", {}) is False
+    invalidate_summaries({(user_id, "2024-03")})
@@ -3,7 +3,7 @@ Testes de autenticação e scan de recibos
 """
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from app.main import app
 from app.database import SessionLocal, Base, engine
 
@@ -25,7 +25,7 @@ def db_session():
 @pytest.fixture
 def mock_provider_and_parser():
     """Mock do provider client e parser para evitar chamadas reais"""
-    with patch('app.routers.receipts.fetch_by_key') as mock_fetch, \
+    with patch('app.routers.receipts.fetch_by_key_async', new_callable=AsyncMock) as mock_fetch, \
          patch('app.routers.receipts.parse_note') as mock_parse:
         
         # Mock de resposta do provider
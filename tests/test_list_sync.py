@@ -0,0 +1,102 @@
+"""
+Testes do matching entre itens da lista de compras e itens da nota
+"""
+from decimal import Decimal
+from types import SimpleNamespace
+from uuid import uuid4
+import pytest
+from app.services.list_sync import (
+    match_all,
+    normalize_text,
+    compare_quantities_and_price,
+    bulk_compare,
+)
+
+
+def _list_item(description, product_id=None):
+    return SimpleNamespace(description=description, product_id=product_id)
+
+
+def _receipt_item(description, product_id=None):
+    return SimpleNamespace(description=description, product_id=product_id)
+
+
+def test_normalize_text():
+    """Testa remoção de acentos, pontuação e espaços extras"""
+    assert normalize_text("Açúcar  Refinado - 1KG") == "acucar refinado 1kg"
+    assert normalize_text("") == ""
+
+
+def test_match_all_tiers():
+    """Testa os níveis de score: product_id, exato, substring e fuzzy"""
+    product_id = uuid4()
+    receipt_items = [
+        _receipt_item("LEITE INTEGRAL 1L", product_id=product_id),
+        _receipt_item("Café Pilão 500g"),
+        _receipt_item("ARROZ BRANCO TIPO 1 5KG"),
+        _receipt_item("FEIJAO CARIOCA KICALDO 1KG"),
+    ]
+    list_items = [
+        _list_item("leite", product_id=product_id),
+        _list_item("cafe pilao 500g"),
+        _list_item("arroz branco"),
+        _list_item("feijao preto 1kg"),
+    ]
+
+    matches = match_all(list_items, receipt_items)
+
+    assert matches[0] == (receipt_items[0], 1.0)
+    assert matches[1] == (receipt_items[1], 0.95)
+    assert matches[2] == (receipt_items[2], 0.85)
+    assert matches[3][0] is receipt_items[3]
+    assert 0 < matches[3][1] <= 0.8
+
+
+def test_match_all_does_not_reuse_receipt_items():
+    """Testa que um item da nota é mapeado para no máximo um item da lista"""
+    receipt_items = [_receipt_item("DETERGENTE YPE 500ML")]
+    list_items = [_list_item("detergente ype 500ml"), _list_item("detergente")]
+
+    matches = match_all(list_items, receipt_items)
+
+    assert matches[0] == (receipt_items[0], 0.95)
+    assert matches[1] == (None, 0.0)
+
+
+def test_match_all_without_receipt_items():
+    """Testa listas vazias"""
+    assert match_all([], [_receipt_item("ARROZ")]) == []
+    assert match_all([_list_item("arroz")], []) == [(None, 0.0)]
+
+
+def test_bulk_compare_matches_single_comparison():
+    """Testa que bulk_compare produz o mesmo resultado item a item"""
+    list_items = [
+        SimpleNamespace(quantity=Decimal("2.000"), price_estimate=Decimal("10.00")),
+        SimpleNamespace(quantity=Decimal("1.000"), price_estimate=None),
+        SimpleNamespace(quantity=Decimal("500.000"), price_estimate=Decimal("0.02")),
+        SimpleNamespace(quantity=Decimal("1.000"), price_estimate=Decimal("5.00")),
+    ]
+    receipt_items = [
+        SimpleNamespace(quantity=Decimal("2.000"), unit_price=Decimal("10.20"), total_price=Decimal("20.40")),
+        SimpleNamespace(quantity=Decimal("3.000"), unit_price=Decimal("4.00"), total_price=Decimal("12.00")),
+        SimpleNamespace(quantity=Decimal("450.000"), unit_price=Decimal("0.02"), total_price=Decimal("9.00")),
+        SimpleNamespace(quantity=Decimal("1.000"), unit_price=Decimal("4.50"), total_price=Decimal("4.50")),
+    ]
+
+    results = bulk_compare(list_items, receipt_items)
+
+    assert len(results) == len(list_items)
+    for list_item, receipt_item, result in zip(list_items, receipt_items, results):
+        expected = compare_quantities_and_price(list_item, receipt_item)
+        assert result.keys() == expected.keys()
+        for key, value in expected.items():
+            if isinstance(value, float):
+                assert result[key] == pytest.approx(value)
+            else:
+                assert result[key] == value
+
+    assert results[0]["price_higher"] is False  # exatamente 2%: dentro da tolerância
+    assert results[2]["quantity_different"] is True
+    assert results[3]["price_lower"] is True
+    assert bulk_compare([], []) == []
@@ -13,6 +13,7 @@ from app.services.product_matcher import (
     fuzzy_match_name,
     embed_match_name,
     get_or_create_product_from_item,
+    get_or_create_products,
 )
 
 
@@ -57,6 +58,15 @@ def test_normalize_name_remove_accents():
     assert normalize_name("Pão") == "pao"
 
 
+def test_normalize_name_idempotent():
+    """Testa que normalizar de novo um nome já normalizado não o altera"""
+    assert normalize_name("CERVEJA 12º LATA") == "cerveja lata"
+    assert normalize_name("Nº12 Parafuso") == "parafuso"
+    for text in ["Nº12 Parafuso", "CERVEJA 12º LATA", "Coca_Cola 2L", "Arroz 2kg 500g", "g5l2l x u0"]:
+        once = normalize_name(text)
+        assert normalize_name(once) == once
+
+
 def test_normalize_name_empty():
     """Testa normalização de strings vazias"""
     assert normalize_name("") == ""
@@ -267,3 +277,24 @@ def test_get_or_create_product_from_item_with_category(db_session):
     product = db_session.query(Product).filter(Product.id == product_id).first()
     assert product.category_id == category.id
 
+
+def test_get_or_create_products_batch(db_session):
+    """Testa resolução em lote: barcode, nome exato e itens repetidos na nota"""
+    by_barcode = Product(normalized_name="produto diferente", barcode="7891234567890")
+    by_name = Product(normalized_name="feijao preto")
+    db_session.add_all([by_barcode, by_name])
+    db_session.commit()
+    
+    items = [
+        {"description": "Arroz Tipo 1 5KG", "barcode": "7891234567890"},
+        {"description": "Feijão Preto 1kg", "barcode": None},
+        {"description": "Produto Novo e Inexistente", "barcode": None},
+        {"description": "PRODUTO NOVO E INEXISTENTE", "barcode": None},
+    ]
+    
+    product_ids = get_or_create_products(db_session, items)
+    
+    assert product_ids[0] == by_barcode.id
+    assert product_ids[1] == by_name.id
+    assert product_ids[2] == product_ids[3]
+    assert db_session.query(Product).count() == 3
@@ -1,17 +1,25 @@
 """
 Testes para o provider_client com mocks das respostas reais dos providers
 """
+import asyncio
+import socket
+import httpcore
 import pytest
 import requests
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from app.services.provider_client import (
+    ProviderClient,
     fetch_by_key,
     fetch_by_url,
     ProviderError,
     ProviderNotFound,
     ProviderRateLimit,
     _validate_url,
+    _parse_note_xml,
+    _parse_retry_after,
+    PROVIDER_RETRY_AFTER_MAX_SECONDS,
 )
+from app.services import provider_client
 from app.config import settings
 
 
@@ -23,6 +31,10 @@ def mock_settings():
         mock.PROVIDER_API_URL = "https://api.webmania.com.br/nfe"
         mock.PROVIDER_API_KEY = "test-key-123"
         mock.PROVIDER_TIMEOUT = 8
+        mock.PROVIDER_RATE_LIMIT_PER_MINUTE = None
+        mock.PROVIDER_CACHE_TTL_SECONDS = 0
+        mock.PROVIDER_NOT_FOUND_TTL_SECONDS = 0
+        mock.PROVIDER_MAX_RESPONSE_BYTES = 10 * 1024 * 1024
         yield mock
 
 
@@ -264,3 +276,167 @@ def test_provider_oobj_post_method(mock_settings):
             assert call_args[0][0] == "POST"  # method
             assert "chave" in call_args[1]["data"]  # body contém chave
 
+
+def test_parse_note_xml_extracts_nfe_sections():
+    """Testa extração em streaming das seções da NF-e usadas pelo parser"""
+    xml = b"""<?xml version="1.0" encoding="UTF-8"?>
+<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe"><NFe>
+<infNFe Id="NFe35200112345678901234567890123456789012345678">
+<ide><dhEmi>2024-01-15T10:30:00-03:00</dhEmi></ide>
+<emit><CNPJ>12345678000190</CNPJ><xNome>SUPERMERCADO TESTE</xNome></emit>
+<det nItem="1"><prod><xProd>ARROZ 5KG</xProd><qCom>1</qCom><vUnCom>25.50</vUnCom><vProd>25.50</vProd></prod></det>
+<det nItem="2"><prod><xProd>FEIJAO</xProd><qCom>2</qCom><vUnCom>8.50</vUnCom><vProd>17.00</vProd></prod></det>
+<total><ICMSTot><vProd>42.50</vProd><vNF>42.50</vNF></ICMSTot></total>
+</infNFe></NFe></nfeProc>"""
+    
+    data = _parse_note_xml(xml)
+    inf_nfe = data["infNFe"]
+    
+    assert inf_nfe["@Id"] == "NFe35200112345678901234567890123456789012345678"
+    assert inf_nfe["ide"]["dhEmi"] == "2024-01-15T10:30:00-03:00"
+    assert inf_nfe["emit"]["xNome"] == "SUPERMERCADO TESTE"
+    assert inf_nfe["total"]["ICMSTot"]["vNF"] == "42.50"
+    assert [det["prod"]["xProd"] for det in inf_nfe["det"]] == ["ARROZ 5KG", "FEIJAO"]
+    assert inf_nfe["det"][0]["@nItem"] == "1"
+
+
+def test_parse_note_xml_other_format():
+    """Testa que XML sem infNFe é convertido por completo"""
+    assert _parse_note_xml(b"<nota><chave>123</chave></nota>") == {"nota": {"chave": "123"}}
+
+
+@pytest.mark.asyncio
+async def test_fetch_many_keeps_order_and_errors():
+    """Testa que fetch_many respeita a ordem das chaves e devolve erros por chave"""
+    client = ProviderClient()
+    
+    async def fake_fetch(key):
+        if key == "bad":
+            raise ProviderNotFound("Nota fiscal não encontrada")
+        return {"access_key": key}
+    
+    with patch.object(client, "fetch_by_key_async", side_effect=fake_fetch):
+        results = await client.fetch_many(["k1", "bad", "k2"], concurrency=2)
+    
+    assert results[0] == {"access_key": "k1"}
+    assert isinstance(results[1], ProviderNotFound)
+    assert results[2] == {"access_key": "k2"}
+
+
+@pytest.mark.asyncio
+async def test_prefetch_dedupes_keys_and_skips_errors():
+    """Testa que prefetch busca cada chave uma vez e conta só os sucessos"""
+    client = ProviderClient()
+    
+    async def fake_fetch(key):
+        if key == "bad":
+            raise ProviderNotFound("Nota fiscal não encontrada")
+        return {"access_key": key}
+    
+    with patch.object(client, "fetch_by_key_async", side_effect=fake_fetch) as mock_fetch:
+        assert await client.prefetch(["k1", "bad", "k1", "k2"]) == 2
+    
+    assert mock_fetch.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_fetch_by_key_async_coalesces_duplicate_keys(monkeypatch):
+    """Testa que buscas simultâneas da mesma chave fazem uma única chamada"""
+    client = ProviderClient()
+    monkeypatch.setattr(client, "_use_fake", lambda: False)
+    calls = []
+    
+    async def slow_fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return {"access_key": key}
+    
+    monkeypatch.setattr(client, "_fetch_by_key_uncoalesced_async", slow_fetch)
+    results = await asyncio.gather(*(client.fetch_by_key_async("k1") for _ in range(3)))
+    
+    assert results == [{"access_key": "k1"}] * 3
+    assert calls == ["k1"]
+    assert client._inflight_async == {}
+
+
+@pytest.mark.asyncio
+async def test_make_request_async_connect_attempts(monkeypatch):
+    """Testa que conexão recusada gera só PROVIDER_MAX_RETRIES + 1 conexões TCP (como na sessão síncrona)"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    
+    connects = []
+    auto_connect = httpcore._backends.auto.AutoBackend.connect_tcp
+    
+    async def counting_connect(self, *args, **kwargs):
+        connects.append(kwargs.get("port"))
+        return await auto_connect(self, *args, **kwargs)
+    
+    monkeypatch.setattr(httpcore._backends.auto.AutoBackend, "connect_tcp", counting_connect)
+    monkeypatch.setattr("app.services.provider_client._async_client", None)
+    monkeypatch.setattr("app.services.provider_client.asyncio.sleep", AsyncMock())
+    monkeypatch.setattr("app.services.provider_client._provider_wait_time", lambda: 0)
+    
+    client = ProviderClient()
+    client._headers = {}
+    with pytest.raises(ProviderError):
+        await client._make_request_async("GET", f"http://127.0.0.1:{port}/nfe")
+    
+    assert connects == [port] * (provider_client.PROVIDER_MAX_RETRIES + 1)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Redis em memória (get/set) usado pelo cache de notas do provider"""
+    store = {}
+    client = MagicMock()
+    client.get.side_effect = store.get
+    client.set.side_effect = lambda key, value, ex=None: store.__setitem__(key, value)
+    monkeypatch.setattr("app.services.provider_client.get_sync_redis", lambda: client)
+    return client
+
+
+def test_fetch_by_key_uses_note_cache(monkeypatch, fake_redis):
+    """Testa que a segunda busca da mesma chave vem do cache, sem chamar o provider"""
+    client = ProviderClient()
+    monkeypatch.setattr(client, "_use_fake", lambda: False)
+    monkeypatch.setattr(client, "_endpoint_for_key", lambda key: "https://provider.test/nfe")
+    
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.headers = {"Content-Type": "application/json"}
+    mock_response.content = b'{"access_key": "test"}'
+    
+    key = "35200112345678901234567890123456789012345678"
+    with patch.object(client, "_make_request", return_value=mock_response) as mock_request:
+        assert client.fetch_by_key(key) == {"access_key": "test"}
+        assert client.fetch_by_key(key) == {"access_key": "test"}
+    
+    mock_request.assert_called_once()
+
+
+def test_fetch_by_key_caches_not_found(monkeypatch, fake_redis):
+    """Testa que uma chave não encontrada falha do cache na segunda busca"""
+    client = ProviderClient()
+    monkeypatch.setattr(client, "_use_fake", lambda: False)
+    monkeypatch.setattr(client, "_endpoint_for_key", lambda key: "https://provider.test/nfe")
+    
+    key = "35200112345678901234567890123456789012345678"
+    with patch.object(client, "_make_request", side_effect=ProviderNotFound("Nota fiscal não encontrada")) as mock_request:
+        with pytest.raises(ProviderNotFound):
+            client.fetch_by_key(key)
+        with pytest.raises(ProviderNotFound):
+            client.fetch_by_key(key)
+    
+    mock_request.assert_called_once()
+    assert fake_redis.set.call_args.kwargs["ex"] == settings.PROVIDER_NOT_FOUND_TTL_SECONDS
+
+
+def test_parse_retry_after():
+    """Testa leitura do Retry-After em segundos/HTTP-date, com limite máximo"""
+    assert _parse_retry_after("5") == 5.0
+    assert _parse_retry_after("3600") == PROVIDER_RETRY_AFTER_MAX_SECONDS
+    assert _parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0  # data no passado
+    assert _parse_retry_after("invalido") is None
+    assert _parse_retry_after(None) is None
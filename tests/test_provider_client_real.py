@@ -1,8 +1,12 @@
 """
 Testes para provider_client com formato real do Webmania/Oobj
 """
+import io
+import json
 import pytest
-from unittest.mock import patch, MagicMock
+import requests
+from unittest.mock import patch
+from urllib3.response import HTTPResponse
 from app.services.provider_client import (
     ProviderClient,
     ProviderError,
@@ -22,10 +26,25 @@ def mock_settings():
         mock.PROVIDER_APP_KEY = "test-app-key"
         mock.PROVIDER_APP_SECRET = "test-app-secret"
         mock.PROVIDER_TIMEOUT = 10
+        mock.PROVIDER_RATE_LIMIT_PER_MINUTE = None
+        mock.PROVIDER_CACHE_TTL_SECONDS = 0
+        mock.PROVIDER_NOT_FOUND_TTL_SECONDS = 0
+        mock.PROVIDER_MAX_RESPONSE_BYTES = 10 * 1024 * 1024
         mock.WHITELIST_DOMAINS = ""
+        mock.DEV_REAL_MODE = False
         yield mock
 
 
+def _response(status_code, body=b"", content_type=None):
+    """requests.Response real com corpo em BytesIO (mesmos caminhos de leitura da produção)"""
+    response = requests.Response()
+    response.status_code = status_code
+    if content_type:
+        response.headers["Content-Type"] = content_type
+    response.raw = HTTPResponse(body=io.BytesIO(body), status=status_code, preload_content=False)
+    return response
+
+
 @pytest.fixture
 def provider_client(mock_settings):
     """Cria instância do ProviderClient"""
@@ -69,12 +88,10 @@ def mock_webmania_response_success():
 
 def test_fetch_by_key_success(provider_client, mock_webmania_response_success):
     """Testa busca por chave com sucesso"""
-    with patch('app.services.provider_client.requests.get') as mock_get:
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.headers = {"Content-Type": "application/json"}
-        mock_response.json.return_value = mock_webmania_response_success
-        mock_get.return_value = mock_response
+    with patch('app.services.provider_client._session.get') as mock_get:
+        mock_get.return_value = _response(
+            200, json.dumps(mock_webmania_response_success).encode(), "application/json"
+        )
         
         result = provider_client.fetch_by_key("35200112345678901234567890123456789012345678")
         
@@ -85,10 +102,8 @@ def test_fetch_by_key_success(provider_client, mock_webmania_response_success):
 
 def test_fetch_by_key_not_found(provider_client):
     """Testa busca por chave inexistente"""
-    with patch('app.services.provider_client.requests.get') as mock_get:
-        mock_response = MagicMock()
-        mock_response.status_code = 404
-        mock_get.return_value = mock_response
+    with patch('app.services.provider_client._session.get') as mock_get:
+        mock_get.return_value = _response(404)
         
         with pytest.raises(ProviderNotFound):
             provider_client.fetch_by_key("35200112345678901234567890123456789012345678")
@@ -96,10 +111,8 @@ def test_fetch_by_key_not_found(provider_client):
 
 def test_fetch_by_key_rate_limit(provider_client):
     """Testa rate limit (429)"""
-    with patch('app.services.provider_client.requests.get') as mock_get:
-        mock_response = MagicMock()
-        mock_response.status_code = 429
-        mock_get.return_value = mock_response
+    with patch('app.services.provider_client._session.get') as mock_get:
+        mock_get.return_value = _response(429)
         
         with pytest.raises(ProviderRateLimit):
             provider_client.fetch_by_key("35200112345678901234567890123456789012345678")
@@ -107,10 +120,8 @@ def test_fetch_by_key_rate_limit(provider_client):
 
 def test_fetch_by_key_unauthorized(provider_client):
     """Testa erro de autenticação (401)"""
-    with patch('app.services.provider_client.requests.get') as mock_get:
-        mock_response = MagicMock()
-        mock_response.status_code = 401
-        mock_get.return_value = mock_response
+    with patch('app.services.provider_client._session.get') as mock_get:
+        mock_get.return_value = _response(401)
         
         with pytest.raises(ProviderUnauthorized):
             provider_client.fetch_by_key("35200112345678901234567890123456789012345678")
@@ -131,27 +142,60 @@ def test_fetch_by_key_provider_error_response(provider_client):
         }
     }
     
-    with patch('app.services.provider_client.requests.get') as mock_get:
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.headers = {"Content-Type": "application/json"}
-        mock_response.json.return_value = error_response
-        mock_get.return_value = mock_response
+    with patch('app.services.provider_client._session.get') as mock_get:
+        mock_get.return_value = _response(
+            200, json.dumps(error_response).encode(), "application/json"
+        )
         
         with pytest.raises(ProviderNotFound):
             provider_client.fetch_by_key("35200112345678901234567890123456789012345678")
 
 
+NOTE_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe">
+  <NFe>
+    <infNFe Id="NFe35200112345678901234567890123456789012345678">
+      <ide><dhEmi>2024-04-12T15:33:00-03:00</dhEmi></ide>
+      <det nItem="1"><prod><xProd>ARROZ TIPO 1 5KG</xProd></prod></det>
+    </infNFe>
+  </NFe>
+</nfeProc>"""
+
+
+def test_fetch_by_key_streams_declared_xml(provider_client):
+    """Testa XML declarado no content-type lido direto de response.raw"""
+    with patch('app.services.provider_client._session.get') as mock_get:
+        mock_get.return_value = _response(200, NOTE_XML, "application/xml")
+
+        result = provider_client.fetch_by_key("35200112345678901234567890123456789012345678")
+
+        assert result["infNFe"]["ide"]["dhEmi"] == "2024-04-12T15:33:00-03:00"
+        assert result["infNFe"]["det"][0]["prod"]["xProd"] == "ARROZ TIPO 1 5KG"
+
+
+@pytest.mark.parametrize("body,content_type", [
+    (NOTE_XML, "application/xml"),
+    (json.dumps({"retorno": {"produto": ["x" * 200]}}).encode(), "application/json"),
+], ids=["xml", "json"])
+def test_fetch_by_key_rejects_oversized_response(provider_client, mock_settings, body, content_type):
+    """Testa que corpo acima de PROVIDER_MAX_RESPONSE_BYTES (sem Content-Length) é rejeitado"""
+    mock_settings.PROVIDER_MAX_RESPONSE_BYTES = 64
+
+    with patch('app.services.provider_client._session.get') as mock_get:
+        mock_get.return_value = _response(200, body, content_type)
+
+        with pytest.raises(ProviderError, match="tamanho máximo"):
+            provider_client.fetch_by_key("35200112345678901234567890123456789012345678")
+
+
 def test_fetch_by_url_valid(provider_client, mock_webmania_response_success):
     """Testa fetch por URL válida"""
     url = "https://nfce.fazenda.gov.br/consulta?chave=35200112345678901234567890123456789012345678"
     
-    with patch('app.services.provider_client.requests.get') as mock_get:
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.headers = {"Content-Type": "application/json"}
-        mock_response.json.return_value = mock_webmania_response_success
-        mock_get.return_value = mock_response
+    with patch('app.services.provider_client._session.get') as mock_get:
+        mock_get.return_value = _response(
+            200, json.dumps(mock_webmania_response_success).encode(), "application/json"
+        )
         
         result = provider_client.fetch_by_url(url)
         
@@ -180,6 +224,7 @@ def test_provider_not_configured():
         mock_settings.PROVIDER_API_URL = ""
         mock_settings.PROVIDER_APP_KEY = ""
         mock_settings.PROVIDER_APP_SECRET = ""
+        mock_settings.DEV_REAL_MODE = False
         
         client = ProviderClient()
         
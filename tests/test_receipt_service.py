@@ -0,0 +1,102 @@
+"""
+Testes do save_receipts_bulk (várias notas em uma transação)
+"""
+from decimal import Decimal
+from types import SimpleNamespace
+from uuid import uuid4
+import pytest
+from unittest.mock import MagicMock
+from app.services import receipt_service
+from app.services.receipt_service import save_receipts_bulk
+
+
+def _parsed(access_key, descriptions):
+    """Nota parseada mínima com um item por descrição"""
+    return {
+        "access_key": access_key,
+        "total_value": Decimal("10.00"),
+        "subtotal": Decimal("10.00"),
+        "total_tax": Decimal("0"),
+        "emitted_at": None,
+        "store_name": "MERCADO",
+        "store_cnpj": "12345678000100",
+        "items": [
+            {
+                "description": description,
+                "quantity": Decimal("1"),
+                "unit_price": Decimal("5.00"),
+                "total_price": Decimal("5.00"),
+                "tax_value": Decimal("0"),
+            }
+            for description in descriptions
+        ],
+    }
+
+
+@pytest.fixture
+def db():
+    """Sessão fake: o flush atribui IDs aos receipts adicionados"""
+    session = MagicMock()
+    added = []
+    session.add_all.side_effect = added.extend
+
+    def flush():
+        for obj in added:
+            if getattr(obj, "id", None) is None:
+                obj.id = uuid4()
+
+    session.flush.side_effect = flush
+    session.added = added
+    return session
+
+
+@pytest.fixture
+def products(monkeypatch):
+    """get_or_create_products fake: um ID estável por descrição, chamadas registradas"""
+    ids = {}
+    calls = []
+
+    def fake_get_or_create_products(db, items):
+        calls.append(items)
+        return [ids.setdefault(item["description"], uuid4()) for item in items]
+
+    monkeypatch.setattr(receipt_service, "get_or_create_products", fake_get_or_create_products)
+    monkeypatch.setattr(receipt_service, "encrypt_sensitive_data", lambda text: f"enc:{text}")
+    return SimpleNamespace(ids=ids, calls=calls)
+
+
+def test_save_receipts_bulk_dedupes_and_pairs_items(db, products):
+    """Testa dedupe por QR e por access_key no lote e o pareamento item -> produto"""
+    user_id = uuid4()
+    key_a = "35200112345678901234567890123456789012345678"
+    key_b = "35200112345678901234567890123456789012345679"
+    entries = [
+        (_parsed(key_a, ["ARROZ", "FEIJAO"]), f"https://nfce.fazenda.gov.br/consulta?p={key_a}"),
+        (_parsed(key_a, ["ARROZ", "FEIJAO"]), f"https://nfce.fazenda.gov.br/consulta?p={key_a}"),  # mesmo QR
+        (_parsed(key_a, ["ARROZ", "FEIJAO"]), key_a),  # outro QR, mesma access_key
+        (_parsed(key_b, ["CAFE", "ACUCAR", "LEITE"]), key_b),
+    ]
+
+    receipts = save_receipts_bulk(db, user_id, entries)
+
+    assert [receipt.access_key for receipt in receipts] == [key_a, key_b]
+    assert all(receipt.user_id == user_id for receipt in receipts)
+    assert len(products.calls) == 1
+    db.flush.assert_called_once()
+    db.commit.assert_called_once()
+
+    items = [obj for obj in db.added if obj not in receipts]
+    assert [(item.receipt_id, item.description, item.product_id) for item in items] == [
+        (receipts[0].id, "ARROZ", products.ids["ARROZ"]),
+        (receipts[0].id, "FEIJAO", products.ids["FEIJAO"]),
+        (receipts[1].id, "CAFE", products.ids["CAFE"]),
+        (receipts[1].id, "ACUCAR", products.ids["ACUCAR"]),
+        (receipts[1].id, "LEITE", products.ids["LEITE"]),
+    ]
+
+
+def test_save_receipts_bulk_empty(db, products):
+    """Testa lote vazio: nada é gravado"""
+    assert save_receipts_bulk(db, uuid4(), []) == []
+    db.commit.assert_not_called()
+    assert products.calls == []
@@ -0,0 +1,117 @@
+"""
+Testes do cache de sugestões de economia em Redis
+"""
+from datetime import date, timedelta
+from uuid import uuid4
+import pytest
+from app.services import savings_cache
+from app.services.savings_cache import (
+    savings_cache_key,
+    savings_cache_field,
+    get_cached_suggestions,
+    set_cached_suggestions,
+    invalidate_suggestions,
+)
+
+
+class FakePipeline:
+    """Pipeline que aplica os comandos no FakeRedis ao executar"""
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def hset(self, *args):
+        self.commands.append(("hset", args))
+
+    def expire(self, *args):
+        self.commands.append(("expire", args))
+
+    def execute(self):
+        self.client.executed_pipelines += 1
+        for name, args in self.commands:
+            getattr(self.client, name)(*args)
+
+
+class FakeRedis:
+    """Redis em memória (hashes) para testes"""
+
+    def __init__(self):
+        self.store = {}
+        self.ttls = {}
+        self.executed_pipelines = 0
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def hget(self, key, field):
+        return self.store.get(key, {}).get(field)
+
+    def hset(self, key, field, value):
+        self.store.setdefault(key, {})[field] = value
+
+    def expire(self, key, seconds):
+        self.ttls[key] = seconds
+
+    def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+
+class BrokenRedis:
+    """Redis indisponível"""
+
+    def hget(self, *args):
+        raise ConnectionError("redis down")
+
+    pipeline = delete = hget
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    client = FakeRedis()
+    monkeypatch.setattr(savings_cache, "get_sync_redis", lambda: client)
+    return client
+
+
+def test_cache_key_and_field_format():
+    """Testa chave savings:{user_id}:{YYYY-MM-DD} e campo {source}:{limit}"""
+    user_id = uuid4()
+    assert savings_cache_key(user_id, date(2024, 3, 15)) == f"savings:{user_id}:2024-03-15"
+    assert savings_cache_key(user_id) == f"savings:{user_id}:{date.today().isoformat()}"
+    assert savings_cache_field("ai", 5) == "ai:5"
+
+
+def test_set_get_and_invalidate(fake_redis):
+    """Testa que as sugestões são salvas por (fonte, limite) e invalidadas por usuário"""
+    user_id = uuid4()
+    other_user = uuid4()
+    data = [{"current_product": "ARROZ 5KG", "estimated_monthly_savings": 4.5}]
+
+    assert set_cached_suggestions(user_id, "ai", 5, data) is True
+    assert set_cached_suggestions(other_user, "ai", 5, data) is True
+    assert get_cached_suggestions(user_id, "ai", 5) == data
+    assert get_cached_suggestions(user_id, "ai", 3) is None
+    assert get_cached_suggestions(user_id, "recommendation", 5) is None
+    assert fake_redis.ttls[savings_cache_key(user_id)] == savings_cache.CACHE_TTL_SECONDS
+    assert fake_redis.executed_pipelines == 2
+
+    # Chave do dia anterior (ainda dentro do TTL) também é invalidada
+    yesterday_key = savings_cache_key(user_id, date.today() - timedelta(days=1))
+    fake_redis.hset(yesterday_key, "ai:5", "[]")
+
+    invalidate_suggestions({user_id})
+
+    assert yesterday_key not in fake_redis.store
+    assert get_cached_suggestions(user_id, "ai", 5) is None
+    assert get_cached_suggestions(other_user, "ai", 5) == data
+
+
+def test_redis_unavailable_fails_open(monkeypatch):
+    """Testa que falhas do Redis não propagam exceção"""
+    monkeypatch.setattr(savings_cache, "get_sync_redis", lambda: BrokenRedis())
+    user_id = uuid4()
+
+    assert get_cached_suggestions(user_id, "ai", 5) is None
+    assert set_cached_suggestions(user_id, "ai", 5, []) is False
+    invalidate_suggestions({user_id})